@@ -0,0 +1,271 @@
+""" Times git issue's commands and the web app's REST endpoints against generated repositories of increasing size,
+    keeping the results as JSON so that runs can be compared with one another.
+
+    Each repository is generated by synthetic_repo.py with the given number of issues. Every command is run as its
+    own process, just as it would be from a terminal, so the times include starting up and loading the issue
+    branch. The first run of a command is kept apart from the rest, as it also builds the derived caches.
+
+    Usage: python benchmarks/repo_benchmark.py [--sizes 1000,10000,100000] [--output results.json]
+                                               [--baseline previous.json [--tolerance 0.25]]
+
+    With a baseline, any command whose median time has grown by more than the tolerance is reported and the
+    benchmark exits with a non-zero status, so it can be used to guard against regressions. """
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent))
+import synthetic_repo
+
+PACKAGE_ROOT = Path(__file__).parent.parent
+GIT_ISSUE = PACKAGE_ROOT.joinpath("git_issue", "gitissue.py")
+WEB_ROOT = PACKAGE_ROOT.parent.joinpath("issue_web_gui")
+
+# Answers the confirmation prompts of create and edit
+CONFIRMATIONS = "Y\n" * 4
+
+
+class CommandFailedError(Exception):
+    pass
+
+
+def get_environment(*paths: Path, **variables) -> dict:
+    """ The environment to run git issue in, able to import it (and whatever else is in paths) without it having
+        been installed. """
+    env = dict(os.environ, **variables)
+    env["PYTHONPATH"] = os.pathsep.join([str(PACKAGE_ROOT), *[str(p) for p in paths], env.get("PYTHONPATH", "")])
+    return env
+
+
+def run_command(repo: Path, *args) -> float:
+    """ Runs git issue with the given arguments in repo, returning how many seconds it took. """
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, str(GIT_ISSUE), *args], cwd=str(repo), input=CONFIRMATIONS.encode(),
+                            env=get_environment(), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    elapsed = time.perf_counter() - start
+
+    if result.returncode != 0:
+        raise CommandFailedError(f"git issue {' '.join(args)} failed:\n{result.stderr.decode()}")
+
+    return elapsed
+
+
+def summarise(times: [float]) -> dict:
+    """ The first run is reported on its own, as it's the only one to find the derived caches missing. """
+    warm = times[1:] if len(times) > 1 else times
+    return {"runs": times, "first": times[0], "median": statistics.median(warm), "min": min(warm),
+            "max": max(warm)}
+
+
+def time_commands(repo: Path, issues: int, repeat: int) -> dict:
+    issue = f"ISSUE-{max(issues // 2, 1)}"
+    assignee = synthetic_repo.get_contributor(1).email
+    commands = {
+        "create": ["create", "-s", "Benchmark issue", "-d", "Created by the benchmark.", "-a", assignee],
+        "edit": ["edit", "-i", issue, "-s", "Edited by the benchmark"],
+        "show": ["show", "-i", issue],
+        "list": ["list"],
+        "comment": ["comment", "-i", issue, "-c", "Commented by the benchmark."],
+    }
+    results = {}
+
+    for name, args in commands.items():
+        results[name] = summarise([run_command(repo, *args) for i in range(repeat)])
+        print(f"{issues:>8} issues  {name:<24}{results[name]['median'] * 1000:>12.1f} ms")
+
+    return results
+
+
+def time_pull(base: Path, workspace: Path, issues: int, divergent: int, repeat: int) -> dict:
+    """ Times pulling with merging into a clone that has created issues under the same IDs as its remote. A clone
+        can only be pulled into once, so every run is given a new one. """
+    origin = workspace.joinpath("origin.git")
+    times = []
+
+    for i in range(repeat):
+        clone = workspace.joinpath(f"clone-{i}")
+        synthetic_repo.make_divergent_clone(base, origin, clone, issues, divergent)
+        times.append(run_command(clone, "pull", "--with-merge"))
+        shutil.rmtree(str(clone), ignore_errors=True)
+
+    result = summarise(times)
+    print(f"{issues:>8} issues  {'pull --with-merge':<24}{result['median'] * 1000:>12.1f} ms")
+    return result
+
+
+def time_endpoints(repo: Path, issues: int, repeat: int) -> dict:
+    """ The app is started in a process of its own, so that it starts up against repo just as it would when
+        served. Returns {"skipped": reason} should the app's dependencies be missing. """
+    env = get_environment(WEB_ROOT, GIT_ISSUE_REPO=str(repo))
+    result = subprocess.run([sys.executable, __file__, "--endpoints", str(issues), "--repeat", str(repeat)],
+                            cwd=str(repo), env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    if result.returncode != 0:
+        raise CommandFailedError(f"Timing the REST endpoints failed:\n{result.stderr.decode()}")
+
+    results = json.loads(result.stdout.decode().splitlines()[-1])
+    if "skipped" in results:
+        print(f"{issues:>8} issues  REST endpoints skipped: {results['skipped']}")
+        return results
+
+    for name, timing in results.items():
+        print(f"{issues:>8} issues  {name:<24}{timing['median'] * 1000:>12.1f} ms")
+
+    return results
+
+
+def run_endpoints(issues: int, repeat: int):
+    """ Times the REST endpoints through Flask's test client, within the process the benchmark started for them.
+        The results are printed as the last line of output. """
+    try:
+        from issue_web_gui import app
+    except ImportError as e:
+        print(json.dumps({"skipped": str(e)}))
+        return
+
+    issue = f"ISSUE-{max(issues // 2, 1)}"
+    client = app.test_client()
+
+    def edit():
+        current = client.get(f"/api/v1/issues/{issue}").get_json()
+        current["summary"] = "Edited by the benchmark"
+        return client.put(f"/api/v1/issues/{issue}", json=current)
+
+    requests = {
+        "GET /issues": lambda: client.get("/api/v1/issues?page=2&limit=50"),
+        "GET /issues?status": lambda: client.get("/api/v1/issues?status=open&limit=50"),
+        "GET /issues/search": lambda: client.get("/api/v1/issues/search?q=description&limit=50"),
+        "GET /issues/<id>": lambda: client.get(f"/api/v1/issues/{issue}"),
+        "POST /issues": lambda: client.post("/api/v1/issues", json={"summary": "Benchmark issue"}),
+        "PUT /issues/<id>": edit,
+        "GET /issues/<id>/comments": lambda: client.get(f"/api/v1/issues/{issue}/comments"),
+        "POST /issues/<id>/comments": lambda: client.post(f"/api/v1/issues/{issue}/comments",
+                                                          json={"comment": "Commented by the benchmark."}),
+    }
+    results = {}
+
+    for name, request in requests.items():
+        times = []
+
+        for i in range(repeat):
+            start = time.perf_counter()
+            response = request()
+            times.append(time.perf_counter() - start)
+
+            if response.status_code >= 400:
+                raise CommandFailedError(f"{name} failed with {response.status_code}: {response.data}")
+
+        results[name] = summarise(times)
+
+    print(json.dumps(results))
+
+
+def get_metadata(args) -> dict:
+    def describe(*command) -> str or None:
+        try:
+            return subprocess.run(command, cwd=str(PACKAGE_ROOT), stdout=subprocess.PIPE,
+                                  stderr=subprocess.DEVNULL, check=True).stdout.decode().strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {"date": datetime.now().isoformat(), "python": platform.python_version(),
+            "platform": platform.platform(), "git": describe("git", "--version"),
+            "commit": describe("git", "rev-parse", "HEAD"), "sizes": args.sizes, "comments": args.comments,
+            "contributors": args.contributors, "divergent": args.divergent, "repeat": args.repeat}
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float) -> [str]:
+    regressions = []
+
+    for size, operations in results["sizes"].items():
+        for name, timing in operations.items():
+            previous = baseline.get("sizes", {}).get(size, {}).get(name)
+
+            if previous is None or "median" not in previous or "median" not in timing:
+                continue
+
+            if timing["median"] > previous["median"] * (1 + tolerance):
+                regressions.append(f"{name} with {size} issues: {previous['median'] * 1000:.1f} ms -> "
+                                   f"{timing['median'] * 1000:.1f} ms")
+
+    return regressions
+
+
+def run(args) -> int:
+    workspace = Path(args.workspace) if args.workspace else Path(tempfile.mkdtemp(prefix="git-issue-benchmark-"))
+    results = {"metadata": get_metadata(args), "sizes": {}}
+
+    try:
+        for size in args.sizes:
+            directory = workspace.joinpath(str(size))
+            shutil.rmtree(str(directory), ignore_errors=True)
+            base = directory.joinpath("base")
+
+            start = time.perf_counter()
+            synthetic_repo.generate(base, size, args.comments, args.contributors)
+            print(f"Generated {size} issues in {time.perf_counter() - start:.1f} s")
+
+            # The pull is timed first, so the clones are made of the repository as it was generated
+            operations = {"pull --with-merge": time_pull(base, directory, size, args.divergent, args.repeat)}
+            operations.update(time_commands(base, size, args.repeat))
+
+            endpoints = time_endpoints(base, size, args.repeat)
+            if "skipped" in endpoints:
+                results["metadata"]["endpoints_skipped"] = endpoints["skipped"]
+            else:
+                operations.update(endpoints)
+
+            results["sizes"][str(size)] = operations
+    finally:
+        if not args.keep and not args.workspace:
+            shutil.rmtree(str(workspace), ignore_errors=True)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=4))
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        regressions = find_regressions(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+
+        for regression in regressions:
+            print(f"Regression: {regression}")
+
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Times git issue against generated repositories of each size.")
+    parser.add_argument("--sizes", type=lambda s: [int(size) for size in s.split(",")], default=[1000, 10000, 100000],
+                        help="The numbers of issues to generate repositories with, separated by commas.")
+    parser.add_argument("--comments", type=int, default=2, help="The number of comments on each issue.")
+    parser.add_argument("--contributors", type=int, default=10, help="The number of people the issues are "
+                                                                     "spread between.")
+    parser.add_argument("--divergent", type=int, default=10, help="The number of issues created on both sides "
+                                                                  "before pulling.")
+    parser.add_argument("--repeat", type=int, default=5, help="The number of times each command is run.")
+    parser.add_argument("--output", help="The file to write the results to as JSON.")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="How much slower than the baseline a "
+                                                                      "command may be, as a fraction.")
+    parser.add_argument("--workspace", help="Where to generate the repositories. Defaults to a temporary "
+                                            "directory, removed afterwards.")
+    parser.add_argument("--keep", action="store_true", help="Keeps the temporary directory.")
+    parser.add_argument("--endpoints", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.endpoints is not None:
+        run_endpoints(args.endpoints, args.repeat)
+    else:
+        sys.exit(run(args))
@@ -0,0 +1,182 @@
+""" Times how long git issue takes to start up: how long each command spends importing, and how long it takes to
+    reach its first GIT command (as timestamped by GIT_TRACE, leaving out the "git version" GitPython runs to
+    check GIT when it's imported).
+
+    Usage: python benchmarks/startup_benchmark.py [--issues 1000] [--repeat 10] [--budget 100]
+
+    Python's start up and GitPython's import come first whatever git issue does, so they're timed on their own too,
+    as are the commands once they're handed to a server (see "git issue serve"), which skips both.
+    The benchmark fails (exits with a non-zero status) if "show" takes more than the budget, in milliseconds, on top
+    of them to reach its first GIT command, or if a command imports modules it has no need for. """
+import argparse
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent))
+import synthetic_repo
+from repo_benchmark import GIT_ISSUE, get_environment
+
+# Modules each command must not import, as none of them are needed to run it
+FORBIDDEN_IMPORTS = {
+    "--version": ["git", "git_issue.git_manager", "git_issue.issue.handler"],
+    "show": ["git_issue.git_utils.merge_utils", "git_issue.git_utils.sync_utils",
+             "git_issue.git_utils.daemon_utils", "multiprocessing", "concurrent.futures"],
+    "list": ["git_issue.git_utils.merge_utils", "git_issue.git_utils.sync_utils",
+             "git_issue.git_utils.daemon_utils", "multiprocessing", "concurrent.futures"],
+}
+
+
+def parse_importtime(output: str) -> dict:
+    """ Returns the cumulative import time, in seconds, of every module found in -X importtime's output. """
+    modules = {}
+
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative) / 1e6
+
+    return modules
+
+
+def get_total_import_time(output: str) -> float:
+    """ The time spent importing, summed over the modules imported at the top level. """
+    total = 0
+
+    for line in output.splitlines():
+        if line.startswith("import time:") and "cumulative" not in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+
+            # Modules imported by other modules are indented beneath them
+            if not name[1:].startswith(" "):
+                total += int(cumulative) / 1e6
+
+    return total
+
+
+def read_first_git_call(trace_path: Path) -> float or None:
+    """ The time of day, in seconds, of the first GIT command in a GIT_TRACE file. """
+    if not trace_path.exists():
+        return None
+
+    for line in trace_path.read_text().splitlines():
+        if "trace: " in line and not line.endswith("git version"):
+            clock = datetime.strptime(line.split(" ", 1)[0], "%H:%M:%S.%f")
+            return clock.hour * 3600 + clock.minute * 60 + clock.second + clock.microsecond / 1e6
+
+    return None
+
+
+def time_command(repo: Path, args: [str], trace_path: Path) -> (float, float or None):
+    """ Runs the command once, returning its wall time and how long it took to reach its first GIT command. """
+    if trace_path.exists():
+        trace_path.unlink()
+
+    env = get_environment(GIT_TRACE=str(trace_path))
+
+    now = datetime.now()
+    started = now.hour * 3600 + now.minute * 60 + now.second + now.microsecond / 1e6
+    start = time.perf_counter()
+    subprocess.run([sys.executable, str(GIT_ISSUE), *args], cwd=str(repo), env=env, stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL, check=True)
+    elapsed = time.perf_counter() - start
+
+    first_git_call = read_first_git_call(trace_path)
+    return elapsed, (first_git_call - started) % 86400 if first_git_call is not None else None
+
+
+def profile_imports(repo: Path, args: [str]) -> (float, dict):
+    result = subprocess.run([sys.executable, "-X", "importtime", str(GIT_ISSUE), *args], cwd=str(repo),
+                            env=get_environment(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    output = result.stderr.decode()
+    return get_total_import_time(output), parse_importtime(output)
+
+
+def run(issues: int, repeat: int, budget: float) -> int:
+    workspace = Path(tempfile.mkdtemp(prefix="git-issue-startup-"))
+    failures = []
+
+    try:
+        repo = synthetic_repo.generate(workspace.joinpath("repo"), issues)
+        trace_path = workspace.joinpath("trace.txt")
+        commands = {"--version": ["--version"], "show": ["show", "-i", f"ISSUE-{max(issues // 2, 1)}"],
+                    "list": ["list"]}
+
+        # Python's own start up and GitPython's import, which no change to git issue can take away
+        floor = None
+        for name, code in [("python", "pass"), ("import git", "import git")]:
+            times = []
+
+            for i in range(repeat):
+                start = time.perf_counter()
+                subprocess.run([sys.executable, "-c", code], env=get_environment(), check=True)
+                times.append(time.perf_counter() - start)
+
+            floor = statistics.median(times)
+            print(f"{name:<16}{floor * 1000:>10.1f} ms wall")
+
+        for name, args in commands.items():
+            # The first run builds the derived caches, which isn't what's being timed
+            time_command(repo, args, trace_path)
+            runs = [time_command(repo, args, trace_path) for i in range(repeat)]
+            wall = statistics.median(run[0] for run in runs)
+            first_calls = [run[1] for run in runs if run[1] is not None]
+            first_call = statistics.median(first_calls) if first_calls else None
+
+            total_import, modules = profile_imports(repo, args)
+            imported = [module for module in FORBIDDEN_IMPORTS.get(name, []) if module in modules]
+
+            first_call_text = f"{first_call * 1000:>10.1f} ms" if first_call is not None else f"{'none':>13}"
+            print(f"{name:<16}{wall * 1000:>10.1f} ms wall  {first_call_text} to first GIT command  "
+                  f"{total_import * 1000:>8.1f} ms importing (GitPython {modules.get('git', 0) * 1000:.1f} ms)")
+
+            if imported:
+                failures.append(f"{name} imports {', '.join(imported)}")
+
+            if name == "show" and first_call is not None and (first_call - floor) * 1000 > budget:
+                failures.append(f"show took {(first_call - floor) * 1000:.1f} ms on top of importing GitPython to "
+                                f"reach its first GIT command, over the budget of {budget:.0f} ms")
+
+        # The same commands handed to a server kept running for the repository
+        server = subprocess.Popen([sys.executable, str(GIT_ISSUE), "serve"], cwd=str(repo), env=get_environment(),
+                                  stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            # The server says where it's listening once it's ready
+            server.stdout.readline()
+
+            for name, args in commands.items():
+                if name == "--version":
+                    continue
+
+                time_command(repo, args, trace_path)
+                wall = statistics.median(time_command(repo, args, trace_path)[0] for i in range(repeat))
+                print(f"{name + ' (served)':<16}{wall * 1000:>10.1f} ms wall")
+        finally:
+            subprocess.run([sys.executable, str(GIT_ISSUE), "serve", "--stop"], cwd=str(repo), env=get_environment(),
+                           stdout=subprocess.DEVNULL)
+            server.wait(30)
+    finally:
+        shutil.rmtree(str(workspace), ignore_errors=True)
+
+    for failure in failures:
+        print(f"Failed: {failure}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Times how long git issue takes to start up.")
+    parser.add_argument("--issues", type=int, default=1000, help="The number of issues in the repository.")
+    parser.add_argument("--repeat", type=int, default=10, help="The number of times each command is run.")
+    parser.add_argument("--budget", type=float, default=100.0, help="The most milliseconds show may take to "
+                                                                    "reach its first GIT command, on top of "
+                                                                    "starting Python and importing GitPython.")
+    args = parser.parse_args()
+    sys.exit(run(args.issues, args.repeat, args.budget))
@@ -0,0 +1,172 @@
+""" Generates local repositories holding any number of issues, for benchmarking.
+
+    The issue branch is written with "git fast-import", so that a repository of 100,000 issues takes
+    seconds to generate rather than the hours creating them one at a time through git issue would. Every
+    file is produced by the same classes git issue uses, so the repositories can't drift from its format. """
+import subprocess
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.joinpath("..")))
+from git_issue.comment.comment import Comment
+from git_issue.comment.index import Index
+from git_issue.git_manager import GitManager
+from git_issue.gituser import GitUser
+from git_issue.issue.issue import Issue
+from git_issue.issue.tracker import Tracker
+from git_issue.utils.json_utils import JsonConvert
+
+START_DATE = datetime(2018, 1, 1)
+
+
+BENCHMARK_USER = GitUser("Benchmark", "benchmark@example.com")
+
+
+def git(path: Path, *args, input: bytes = None) -> str:
+    return subprocess.run(["git", *args], cwd=str(path), input=input, stdout=subprocess.PIPE,
+                          check=True).stdout.decode().strip()
+
+
+def get_contributor(number: int) -> GitUser:
+    return GitUser(f"Contributor {number}", f"contributor{number}@example.com")
+
+
+class IssueStream(object):
+    """ Writes issues to a fast-import stream, a commit at a time, each made by the next contributor. """
+
+    def __init__(self, ref: str, parent: str = None, contributors: int = 10, comments: int = 2,
+                 issues_per_commit: int = 500, label: str = "issue"):
+        self.ref = ref
+        self.parent = parent
+        self.contributors = contributors
+        self.comments = comments
+        self.issues_per_commit = issues_per_commit
+        self.label = label
+        self.chunks = []
+        self.commits = 0
+
+    def _add_file(self, files: [bytes], path: str, obj):
+        data = JsonConvert.ToJSON(obj).encode()
+        files.append(b"M 100644 inline %s\ndata %d\n%s\n" % (path.encode(), len(data), data))
+
+    def _add_commit(self, files: [bytes], message: str, date: datetime):
+        author = get_contributor(self.commits % self.contributors)
+        timestamp = int(date.timestamp())
+        message = message.encode()
+
+        self.chunks.append(f"commit {self.ref}\n".encode())
+        self.chunks.append(f"author {author.user} <{author.email}> {timestamp} +0000\n".encode())
+        self.chunks.append(f"committer {author.user} <{author.email}> {timestamp} +0000\n".encode())
+        self.chunks.append(b"data %d\n%s\n" % (len(message), message))
+
+        # Only the first commit needs to say where it follows on from, the rest follow the one before. The ^0
+        # makes fast-import read the branch from the repository, rather than treating it as its own
+        if self.commits == 0 and self.parent is not None:
+            self.chunks.append(f"from {self.parent}^0\n".encode())
+
+        self.chunks.extend(files)
+        self.chunks.append(b"\n")
+        self.commits += 1
+
+    def add_issues(self, start: int, count: int, tracker: Tracker) -> [Issue]:
+        issues = []
+        files = []
+
+        for number in range(start, start + count):
+            id = f"{Tracker.ISSUE_IDENTIFIER}-{number}"
+            date = START_DATE + timedelta(minutes=number)
+            reporter = get_contributor(number % self.contributors)
+            assignee = get_contributor((number + 1) % self.contributors)
+
+            issue = Issue(id=id, date=date.isoformat(), summary=f"{self.label} {number} summary",
+                          description=f"The description of {self.label} {number}, which is long enough to "
+                                      f"give the search index some words to work with.",
+                          status=["open", "closed", "in progress"][number % 3],
+                          assignee=assignee, reporter=reporter, subscribers=[reporter, assignee])
+            self._add_file(files, f"{id}/issue.json", issue)
+            tracker.track_or_update_uuid(issue.uuid, id)
+            issues.append(issue)
+
+            index = Index()
+            for c in range(self.comments):
+                comment = Comment(f"Comment {c} on {self.label} {number}", get_contributor(c % self.contributors),
+                                  (date + timedelta(seconds=c + 1)).isoformat())
+                path = f"{id}/comments/{str(comment.uuid)[:6]}.json"
+                self._add_file(files, path, comment)
+                index.add_entry(path, comment)
+
+            if self.comments > 0:
+                self._add_file(files, f"{id}/index.json", index)
+
+            if len(issues) % self.issues_per_commit == 0 or number == start + count - 1:
+                # The tracker is only written with the last commit, as rewriting it each time costs the most
+                if number == start + count - 1:
+                    self._add_file(files, Tracker.FILE_NAME, tracker)
+
+                message = GitManager._generate_commit_message("create", f"{issues[0].id} to {issues[-1].id}")
+                self._add_commit(files, message, date)
+                files = []
+
+        return issues
+
+    def import_into(self, path: Path):
+        git(path, "fast-import", "--quiet", input=b"feature done\n" + b"".join(self.chunks) + b"done\n")
+
+
+def generate(path: Path, issues: int, comments: int = 2, contributors: int = 10,
+             issues_per_commit: int = 500) -> Path:
+    """ Creates a repository at path with a master branch and an issue branch holding the given number of issues,
+        each with the given number of comments. """
+    path.mkdir(parents=True, exist_ok=True)
+    git(path, "init", "--quiet")
+    configure_user(path)
+    path.joinpath("README.md").write_text("A repository generated for benchmarking git issue.\n")
+    git(path, "add", "README.md")
+    git(path, "commit", "--quiet", "-m", "Initial commit")
+
+    stream = IssueStream(f"refs/heads/{GitManager.ISSUE_BRANCH}", None, contributors, comments, issues_per_commit)
+    stream.add_issues(1, issues, Tracker())
+    stream.import_into(path)
+    return path
+
+
+def add_issues(path: Path, ref: str, start: int, count: int, tracker: Tracker, comments: int = 2,
+               contributors: int = 10, label: str = "issue") -> [Issue]:
+    """ Commits count more issues on top of ref, starting at the given number. Two clones given the same start
+        create the same IDs, which is what a pull then has to resolve. """
+    stream = IssueStream(ref, ref, contributors, comments, label=label)
+    created = stream.add_issues(start, count, tracker)
+    stream.import_into(path)
+    return created
+
+
+def configure_user(path: Path):
+    """ Has git issue run in the repository as the same user wherever the benchmarks are run. """
+    git(path, "config", "user.name", BENCHMARK_USER.user)
+    git(path, "config", "user.email", BENCHMARK_USER.email)
+
+
+def read_tracker(path: Path, rev: str) -> Tracker:
+    return JsonConvert.FromJSON(git(path, "show", f"{rev}:{Tracker.FILE_NAME}"), Tracker.FILE_NAME)
+
+
+def make_divergent_clone(source: Path, origin: Path, clone: Path, issues: int, divergent: int,
+                         comments: int = 2, contributors: int = 10) -> Path:
+    """ Clones source into clone, with origin as its remote. Both origin and the clone are then given the same
+        number of new issues, taking the same IDs, so that pulling origin into the clone has create conflicts
+        to resolve. origin is created as a bare clone of source if it doesn't exist yet. """
+    ref = f"refs/heads/{GitManager.ISSUE_BRANCH}"
+
+    if not origin.exists():
+        git(source.parent, "clone", "--quiet", "--bare", str(source), str(origin))
+        add_issues(origin, ref, issues + 1, divergent, read_tracker(origin, ref), comments, contributors,
+                   label="remote issue")
+
+    git(source.parent, "clone", "--quiet", str(source), str(clone))
+    git(clone, "remote", "set-url", "origin", str(origin))
+    configure_user(clone)
+    git(clone, "update-ref", ref, f"refs/remotes/origin/{GitManager.ISSUE_BRANCH}")
+    add_issues(clone, ref, issues + 1, divergent, read_tracker(clone, ref), comments, contributors,
+               label="local issue")
+    return clone
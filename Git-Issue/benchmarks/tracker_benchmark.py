@@ -0,0 +1,52 @@
+""" Times the tracker's bookkeeping with a large number of tracked issues.
+
+    Usage: python benchmarks/tracker_benchmark.py [--count 100000] """
+import argparse
+import sys
+import time
+import uuid as unique_identifier
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.joinpath("..")))
+from git_issue.issue.tracker import Tracker
+from git_issue.utils.json_utils import JsonConvert
+
+
+def timed(name: str, action):
+    start = time.perf_counter()
+    result = action()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<36}{elapsed * 1000:>12.1f} ms")
+    return result
+
+
+def run(count: int):
+    uuids = [unique_identifier.uuid4().int for i in range(count)]
+    ids = [f"{Tracker.ISSUE_IDENTIFIER}-{i + 1}" for i in range(count)]
+    tracker = Tracker()
+
+    def create():
+        for uuid, id in zip(uuids, ids):
+            tracker.track_or_update_uuid(uuid, id)
+
+    def update():
+        for uuid, id in zip(uuids, ids):
+            tracker.track_or_update_uuid(uuid, id)
+
+    print(f"Tracking {count} issues")
+    timed("create", create)
+    timed("update existing", update)
+    timed("look up issue by uuid", lambda: [tracker.get_issue_from_uuid(u) for u in uuids])
+    timed("look up uuid by issue", lambda: [tracker.get_uuid_from_issue(i) for i in ids])
+
+    json = timed("serialise", lambda: JsonConvert.ToJSON(tracker))
+    loaded = timed("deserialise", lambda: JsonConvert.FromJSON(json))
+    timed("first look up after loading", lambda: loaded.get_issue_from_uuid(uuids[-1]))
+
+    assert loaded.issue_count == count and loaded.get_uuid_from_issue(ids[-1]) == uuids[-1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Times the tracker's bookkeeping with many tracked issues.")
+    parser.add_argument("--count", type=int, default=100000, help="The number of issues to track.")
+    run(parser.parse_args().count)
@@ -1,6 +1,6 @@
-from git_issue.gituser import GitUser
+from git_issue.gituser import GitUser, user_schema
 from git_issue.utils import date_utils
-from git_issue.utils.json_utils import JsonConvert
+from git_issue.utils.json_utils import JsonConvert, JsonSchema
 import uuid as unique_identifier
 
 @JsonConvert.register
@@ -19,3 +19,6 @@ class Comment(object):
         self.user = user if user is not None else GitUser()
         self.date = date if date is not None else date_utils.get_date_now()
         self.uuid = uuid if uuid is not None else unique_identifier.uuid4().int
+
+
+JsonConvert.register_schema("comments/*.json", JsonSchema(Comment, {"user": user_schema}, big_ints=True))
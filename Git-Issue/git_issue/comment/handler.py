@@ -5,19 +5,22 @@ from pathlib import Path
 from git_issue.comment.comment import Comment
 from git_issue.comment.index import IndexEntry
 from git_issue.utils.json_utils import JsonConvert
-from git_issue.git_manager import GitManager
+from git_issue.git_manager import GitManager, RepoHandler
+from git_issue.utils.trace_utils import traced
 
 class CommentHandler(object):
     """description of class"""
 
-    def __init__(self, issue_path, issue_id):
+    def __init__(self, issue_path, issue_id, tree=None):
         if issue_path == None:
             raise AttributeError("Cannot create a comment handler without an issue path.")
         # elif not issue_path.exists():
         #     raise AttributeError("Cannot create a comment handler for an issue that doesn't exist.")
 
+        # When given an IssueTree, comments are read from the issue branch rather than the worktree
+        self.tree = tree
         self.folder_path = self._generate_folder_path(issue_id)
-        self.index = index.Index.obtain_index(issue_path)
+        self.index = index.Index.obtain_index(issue_path if tree is None else Path(issue_id), tree)
         self.issue_path = issue_path
         self.issue_id = issue_id
 
@@ -28,8 +31,18 @@ class CommentHandler(object):
         return self.folder_path.joinpath(f"{str(comment_id)[:6]}.json")
 
     def _get_comment(self, entry):
+        if self.tree is not None:
+            comment = self.tree.read_json(entry.path)
+
+            if comment is None:
+                msg = f"An invalid index entry has been found for file \"{entry.path}\"." \
+                      f" Please reconstruct the index for {self.folder_path}"
+                raise index.IndexEntryInvalidError(msg)
+
+            return comment
+
         try:
-            return JsonConvert.FromFile(entry.path)
+            return JsonConvert.FromFile(RepoHandler.get_root().joinpath(entry.path))
         except FileNotFoundError as err:
             msg = f"An invalid index entry has been found for file \"{err.filename}\"." \
                   f" Please reconstruct the index for {self.folder_path}"
@@ -38,16 +51,28 @@ class CommentHandler(object):
     def _get_list_of_comments(self, entries):
         return [self._get_comment(e) for e in entries]
 
+    @traced("add comment")
     def add_comment(self, comment) -> IndexEntry:
         gm = GitManager()
 
+        if not gm.is_worktree_required():
+            def tree_action(writer):
+                self.index = index.Index.obtain_index(Path(self.issue_id), writer)
+                path = self.generate_comment_path(comment.uuid)
+                writer.write_json(path, comment)
+                entry = self.index.add_entry(path, comment)
+                self.index.store_index(self.issue_id, writer)
+                return entry
+
+            return gm.perform_tree_workflow(tree_action, "add_comment", self.issue_id)
+
         def gen_paths():
             return [str(self.generate_comment_path(comment.uuid))]
 
         def action():
             self.index = index.Index.obtain_index(self.issue_path)
             path = self.generate_comment_path(comment.uuid)
-            JsonConvert.ToFile(comment, path)
+            JsonConvert.ToFile(comment, RepoHandler.get_root().joinpath(path))
             entry = self.index.add_entry(path, comment)
             self.index.store_index(self.issue_id)
             return entry
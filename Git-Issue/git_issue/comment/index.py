@@ -1,8 +1,9 @@
+from bisect import bisect_left, bisect_right
 from pathlib import Path
 from typing import List
 
-from git_issue.utils.json_utils import JsonConvert
-from git_issue.git_manager import GitManager
+from git_issue.utils.json_utils import JsonConvert, JsonSchema
+from git_issue.git_manager import GitManager, RepoHandler
 
 
 @JsonConvert.register
@@ -25,33 +26,52 @@ class IndexEntry(object):
 
 @JsonConvert.register
 class Index(object):
-    """This is an index register of all comments for an issue. It keeps track of all files and their creation date."""
+    """This is an index register of all comments for an issue. It keeps track of all files and their creation date.
+
+    The entries are kept in order of their date (entries with the same date stay in the order they were added), which is
+    also the order they are written in. Alongside them the index keeps a map of each path to its entry and a list of the
+    dates, so that looking an entry up is O(1) and finding where a new one goes is a binary search rather than a scan.
+    Neither is ever written, so index.json keeps its format."""
 
     def __init__(self, entries: List[IndexEntry] = None):
-        self.entries = entries if entries is not None else []
+        entries = entries if entries is not None else []
+        # Files written in date order are already sorted, which makes this linear
+        self.entries = sorted(entries, key=self._get_sort_key)
+        self._dates = [self._get_sort_key(e) for e in self.entries]
+        self._by_path = {}
 
-    def has_entry(self, path: Path):
         for entry in self.entries:
-            if entry.path == str(path):
-                return True
+            self._by_path.setdefault(entry.path, entry)
 
-        return False
+    @staticmethod
+    def _get_sort_key(entry: IndexEntry) -> str:
+        return entry.date if entry.date is not None else ""
+
+    def has_entry(self, path: Path):
+        return str(path) in self._by_path
 
     def add_entry(self, comment_path: Path, comment) -> IndexEntry:
         entry = IndexEntry(str(comment_path), comment.date)
-        self.entries.append(entry)
+        key = self._get_sort_key(entry)
+        pos = bisect_right(self._dates, key)
+
+        self.entries.insert(pos, entry)
+        self._dates.insert(pos, key)
+        self._by_path.setdefault(entry.path, entry)
         return entry
 
     def get_entry(self, path: Path) -> IndexEntry:
-        for entry in self.entries:
-            if entry.path == str(path):
-                return entry
-
-        return None
+        return self._by_path.get(str(path))
 
     def get_entries(self) -> [IndexEntry]:
         return self.entries.copy()
 
+    def get_entries_between(self, start: str = None, end: str = None) -> [IndexEntry]:
+        """ Returns the entries dated from start (inclusive) up to end (exclusive). """
+        lo = bisect_left(self._dates, start) if start is not None else 0
+        hi = bisect_left(self._dates, end) if end is not None else len(self._dates)
+        return self.entries[lo:hi]
+
     def generate_range(self, volume: int, start_pos:int = 0):
         pos = start_pos
         offset = volume
@@ -62,9 +82,14 @@ class Index(object):
 
             pos = pos + offset
 
-    def store_index(self, issue_id):
+    def store_index(self, issue_id, writer=None):
         loc = self._generate_index_path(Path(issue_id)) if issue_id is not None else self._path_to_index
-        JsonConvert.ToFile(self, loc)
+
+        if writer is not None:
+            writer.write_json(loc, self)
+            return
+
+        JsonConvert.ToFile(self, RepoHandler.get_root().joinpath(loc))
         gm = GitManager()
         gm.add_to_index([str(loc)])
 
@@ -76,11 +101,16 @@ class Index(object):
         return issue_path
 
     @classmethod
-    def obtain_index(cls, path):
+    def obtain_index(cls, path, tree=None):
         index_path = cls._generate_index_path(path)
+
+        if tree is not None:
+            index = tree.read_json(index_path)
+            return index if index is not None else Index()
         
-        if (index_path.exists()):
-            return JsonConvert.FromFile(index_path)
+        file_path = RepoHandler.get_root().joinpath(index_path)
+        if (file_path.exists()):
+            return JsonConvert.FromFile(file_path)
         else:
             index = Index()
             return index
@@ -96,5 +126,8 @@ class Index(object):
     def __hash__(self):
         return self.entries.__hash__()
 
+JsonConvert.register_schema("index.json", JsonSchema(Index, {"entries": [JsonSchema(IndexEntry)]}))
+
+
 class IndexEntryInvalidError(Exception):
     pass
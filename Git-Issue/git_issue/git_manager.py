@@ -1,11 +1,29 @@
 import git
 import os
 import shutil
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Callable
 
 from git import GitCommandError
 
+from git_issue.utils.trace_utils import Tracer
+
+
+class _StartingDirectory(object):
+    """ The directory the program was started in, read when it's first asked for rather than when this module is
+        imported. """
+
+    def __init__(self):
+        self.path = None
+
+    def __get__(self, obj, owner) -> str:
+        if self.path is None:
+            self.path = os.getcwd()
+
+        return self.path
+
 
 class GitManager(object):
     """ This class behaves as an interface between the front of the program and GIT.
@@ -13,7 +31,32 @@ class GitManager(object):
         It's purpose is to also keep the front end cli separate from any backend interactions. """
 
     ISSUE_BRANCH = "issue"
-    ORIGINAL_BRANCH = os.getcwd()
+    ORIGINAL_BRANCH = _StartingDirectory()
+    SYNC_HEAD_FILE = "ISSUE_SYNC_HEAD"
+
+    # When set, the issue worktree is created once and reused by every workflow instead of being
+    # removed afterwards. Each load brings the worktree up to date with the tip of the issue branch.
+    keep_loaded = False
+
+    # The number of paths handed to a single "git add", keeping well within command line limits
+    ADD_CHUNK_SIZE = 1000
+
+    # Holds the batch currently collecting writes for each thread, if any. See GitManager.batch
+    _local = threading.local()
+
+    # How many times a worktree-free write is retried after losing a race to update the issue branch
+    MAX_TREE_WRITE_ATTEMPTS = 5
+
+    # When set, perform_tree_workflow hands its actions to this rather than committing them itself. It must
+    # offer perform(action, commit_type, commit_id), returning the action's result along with the commit it
+    # was made in, and is_writer_thread() (e.g. issue_web_gui's WriteQueue)
+    tree_writer = None
+
+    # When set, writes always go straight to the issue branch through perform_tree_workflow, even while a
+    # worktree is loaded (e.g. one kept loaded by the CLI). A program handling many writes at once (e.g. the
+    # web app) sets this, as writes through the worktree are neither serialised nor protected against a
+    # concurrent update of the branch. A kept worktree catches up with the branch the next time it's loaded
+    tree_writes_only = False
 
     BRANCH_NOT_DETECTED_MSG = "Cannot find issue branch. I can create one automatically for you, however "\
               "the current working branch will need changed until. The branch will be changed back to the current"\
@@ -28,6 +71,18 @@ class GitManager(object):
                   "The process of creating the issue branch may result in loss of work if the branch is dirty.\n"\
                   "Please try again when the branch is in a clean state. Program will now terminate."\
 
+    def __init__(self):
+        # The commit made by the last workflow run through this manager, if it made one
+        self.last_commit_sha = None
+
+    @classmethod
+    def _get_batch(cls):
+        return getattr(GitManager._local, "batch", None)
+
+    @classmethod
+    def _set_batch(cls, batch):
+        GitManager._local.batch = batch
+
     def _is_issue_branch_loaded(self, repo):
         git_dir = Path(repo.git_dir)
         worktree_path = git_dir.joinpath(f"worktrees/{self.ISSUE_BRANCH}")
@@ -103,13 +158,25 @@ class GitManager(object):
         path = os.path.normpath(issue_path)
 
         if (self._is_issue_branch_loaded(repo)):
-            if (Path.cwd().parts[-1] != self.ISSUE_BRANCH):
-                os.chdir(path)
+            if (RepoHandler.get_root().parts[-1] != self.ISSUE_BRANCH):
+                RepoHandler.change_root(path)
+
+            if self.keep_loaded:
+                self._sync_issue_worktree()
             return
 
 
-        has_remote = len(repo.remotes) > 0 and hasattr(repo.refs, self.ISSUE_BRANCH)
         has_local_branch = hasattr(repo.refs, self.ISSUE_BRANCH)
+        has_remote = self._has_remote_issue_branch(repo)
+
+        # A clone that only fetched some branches (e.g. --single-branch) won't know of the remote's issue branch
+        if not has_local_branch and not has_remote and hasattr(repo.remotes, "origin"):
+            try:
+                self.fetch_issue_branch()
+                has_remote = self._has_remote_issue_branch(repo)
+            except GitCommandError:
+                pass
+
         if not has_local_branch and not has_remote:
             self._create_new_issue_branch(repo)
 
@@ -149,32 +216,85 @@ class GitManager(object):
             repo.git.worktree("add", path, self.ISSUE_BRANCH)
 
         if os.path.exists(path):
-            os.chdir(path)
+            RepoHandler.change_root(path)
+
+            if self.keep_loaded:
+                self._record_synced_head(self.obtain_repo())
 
         else:
             raise git.CommandError("Failed to add a work tree for branch {} at path {}"
                                    .format(self.ISSUE_BRANCH, path))
 
-    def unload_issue_branch(self):
+    def _has_remote_issue_branch(self, repo) -> bool:
+        return any(ref.path == self.get_remote_ref() for ref in repo.remotes.origin.refs) \
+            if hasattr(repo.remotes, "origin") else False
+
+    def _record_synced_head(self, worktree):
+        git_dir = Path(worktree.git_dir)
+
+        if git_dir.match(f"*worktrees/{self.ISSUE_BRANCH}"):
+            git_dir.joinpath(self.SYNC_HEAD_FILE).write_text(worktree.head.commit.hexsha)
+
+    def _sync_issue_worktree(self):
+        """ Brings a kept worktree up to date with the issue branch. The commit the worktree was last
+            synced to is recorded in its git directory, so nothing is run unless the branch has moved
+            since then (e.g. from a pull or another process). Only the files that differ between the
+            two commits are rewritten. """
+        worktree = self.obtain_repo()
+        git_dir = Path(worktree.git_dir)
+
+        if not git_dir.match(f"*worktrees/{self.ISSUE_BRANCH}"):
+            return
+
+        # Never throw away a merge that's in the middle of being resolved
+        if git_dir.joinpath("MERGE_HEAD").exists():
+            return
+
+        head = worktree.head.commit.hexsha
+        sync_file = git_dir.joinpath(self.SYNC_HEAD_FILE)
+        synced = sync_file.read_text().strip() if sync_file.exists() else None
+
+        if synced == head:
+            return
+
+        if synced is not None:
+            try:
+                worktree.git.read_tree("-m", "-u", synced, head)
+                synced = head
+            except GitCommandError:
+                pass
+
+        # Fall back to a full reset when the worktree can't be moved along from a known commit
+        if synced != head:
+            worktree.git.reset("--hard", head)
+
+        sync_file.write_text(head)
+
+    def unload_issue_branch(self, force=False):
         repo = self.obtain_repo()
 
         if (not self._is_issue_branch_loaded(repo)):
             return
 
+        # A batch still needs the worktree to hold its writes until it's committed
+        if (self.keep_loaded or self._get_batch() is not None) and not force:
+            return
+
         # working directory should be that of the /issue branch produced by load_issue_branch
         working_dir = Path(repo.working_dir)
         if (working_dir.parts[-1] != self.ISSUE_BRANCH):
             issue_path = working_dir.joinpath(self.ISSUE_BRANCH)
 
             if issue_path.exists():
-                os.chdir(issue_path)
+                RepoHandler.change_root(issue_path)
                 repo = self.obtain_repo()
             else:
                 return
 
         path = os.path.normpath(repo.working_dir)
 
-        os.chdir("..")
+        RepoHandler.change_root(Path(path).parent)
+        RepoHandler.forget_repo(path)
         shutil.rmtree(path)
 
         repo = self.obtain_repo()
@@ -184,33 +304,110 @@ class GitManager(object):
         repo = self.obtain_repo()
         print("Pulling from issue branch.")
         try:
-            repo.git.pull("origin", self.ISSUE_BRANCH)
+            self.fetch_issue_branch()
+            repo.git.merge("--no-edit", self.get_remote_ref())
         except git.exc.GitCommandError as e:
             print("Failed to pull from issue branch. See error below.")
             print(e)            
 
+    def get_remote_ref(self, remote: str = "origin") -> str:
+        return f"refs/remotes/{remote}/{self.ISSUE_BRANCH}"
+
+    def fetch_issue_branch(self, remote: str = "origin", partial: bool = False, repo=None):
+        """ Fetches the remote's issue branch and nothing else, whatever the remote is set up to fetch, so that
+            syncing issues never transfers the history of the code.
+
+            If partial, only commits and trees are fetched. GIT then remembers the remote as one that blobs were
+            left behind on, fetches each blob when it's first read (see IssueTree.prefetch for fetching many
+            at once) and keeps leaving them behind on later fetches. """
+        repo = repo if repo is not None else self.obtain_repo()
+        filter = ["--filter=blob:none"] if partial else []
+        repo.git.fetch(*filter, remote, f"+refs/heads/{self.ISSUE_BRANCH}:{self.get_remote_ref(remote)}")
+
     def add_to_index(self, paths: [str]):
+        if self._get_batch() is not None:
+            self._get_batch().add_paths(paths)
+            return
+
         repo = self.obtain_repo()
-        for path in paths:
-            repo.git.add(path)
+        for pos in range(0, len(paths), self.ADD_CHUNK_SIZE):
+            repo.git.add("--", *paths[pos:pos + self.ADD_CHUNK_SIZE])
 
     def push(self):
         repo = self.obtain_repo()
         print("Pushing to issue branch")
         repo.remote().push(self.ISSUE_BRANCH)
 
-    def commit(self, cmd=None, id: str = None, new_branch=False):
+    @staticmethod
+    def _generate_commit_message(cmd=None, id: str = None):
         commit_message = f"Action {cmd} performed"
 
         if id != None:
             commit_message = f"{commit_message} on issue: {id}"
 
+        return commit_message
+
+    def commit(self, cmd=None, id: str = None, new_branch=False):
+        # Batched writes are committed together once the batch closes
+        if self._get_batch() is not None and not new_branch:
+            return
+
+        commit_message = self._generate_commit_message(cmd, id)
         repo = self.obtain_repo()
 
         if new_branch:
             repo.index.commit(commit_message, parent_commits=None)
         else:
             repo.git.commit("-m", commit_message)
+            self.last_commit_sha = repo.head.commit.hexsha
+
+            if self.keep_loaded:
+                self._record_synced_head(repo)
+
+    @contextmanager
+    def batch(self, cmd: str = "batch"):
+        """
+            Groups every write made inside the block into a single commit:
+
+                with GitManager().batch("import"):
+                    for issue in issues:
+                        handler.store_issue(issue, "create", generate_id=True, store_tracker=True)
+
+            The issue worktree is loaded once for the whole batch. Paths given to add_to_index are
+            collected rather than staged, then staged together and committed once the block exits.
+            If the block raises, everything written to the worktree is discarded and nothing is
+            committed. Nested batches are folded into the outermost one.
+        """
+        if self._get_batch() is not None:
+            yield self._get_batch()
+            return
+
+        self.set_up_branch()
+        batch = WriteBatch(cmd)
+        self._set_batch(batch)
+
+        try:
+            yield batch
+        except BaseException:
+            self._set_batch(None)
+            self._discard_changes()
+            self.unload_issue_branch()
+            raise
+
+        self._set_batch(None)
+
+        if len(batch.paths) > 0:
+            self.load_issue_branch()
+            self.add_to_index(batch.get_paths())
+            self.commit(cmd)
+
+        self.unload_issue_branch()
+
+    def _discard_changes(self):
+        self.load_issue_branch()
+        repo = self.obtain_repo()
+        repo.git.reset("--hard")
+        repo.git.clean("-fdq")
 
     def commit_and_push(self, cmd, id):
         repo = self.obtain_repo()
@@ -238,7 +435,7 @@ class GitManager(object):
                     add changes to index;
                     commit changes;
 
-                Unload issue worktree;
+                Unload issue worktree, unless it is being kept loaded;
 
                 If should_push:
                     push origin/issue;
@@ -250,30 +447,200 @@ class GitManager(object):
             it doesn't know what. The same goes for generating the index path;
             it knows we need paths but we specify how to get them.
         """
-        self.set_up_branch()
+        with Tracer.span("git workflow", commit_type=commit_type):
+            with Tracer.span("load issue branch"):
+                self.set_up_branch()
 
-        result = action()
+            with Tracer.span("action"):
+                result = action()
 
-        if should_push and generate_index_paths is not None:
-            paths = generate_index_paths()
-            self.add_to_index(paths)
-            self.commit(commit_type, commit_id)
+            if should_push and generate_index_paths is not None:
+                with Tracer.span("commit"):
+                    paths = generate_index_paths()
+                    self.add_to_index(paths)
+                    self.commit(commit_type, commit_id)
 
-        if should_unload:
-           self.unload_issue_branch()
+            if should_unload and not self.keep_loaded:
+                with Tracer.span("unload issue branch"):
+                    self.unload_issue_branch()
 
         #if should_push:
         #    self.push()
 
         return result
 
+    def is_worktree_required(self) -> bool:
+        """ Writes go through the issue worktree whenever one is in use, i.e. a batch is open, the worktree is
+            loaded (kept loaded, or holding a merge that's being resolved) or the issue branch is checked out
+            in the current repository. Updating the branch from under any of these would leave them stale. """
+        if self.tree_writes_only:
+            return False
+
+        if self._get_batch() is not None:
+            return True
+
+        repo = self.obtain_repo()
+
+        if self._is_issue_branch_loaded(repo):
+            return True
+
+        try:
+            return repo.active_branch.name == self.ISSUE_BRANCH
+        except TypeError:
+            # Detached HEAD
+            return False
+
+    def perform_tree_workflow(self,
+                              action: Callable[[object], object or None],
+                              commit_type: str = None,
+                              commit_id: Callable[[], str] or str = None):
+        """
+            The worktree-free counterpart to perform_git_workflow:
+                Read the tip of the issue branch from the object database;
+                Perform action, giving it an IssueTreeWriter to read from and write to;
+                Commit whatever the action wrote and move the branch on to it.
+
+            Nothing is checked out and no index is used, so the cost depends on the number of changed files
+            rather than the size of the issue tree. If the branch moves while the action runs (another writer
+            got there first), the action is run again against the new tip, as what it wrote may depend on
+            what it read (e.g. the next issue ID). commit_id may be a callable for IDs that are only known
+            once the action has run.
+        """
+        from git_issue.git_utils.tree_utils import IssueTreeWriter, TreeUpdateConflictError
+
+        tree_writer = GitManager.tree_writer
+        if tree_writer is not None and not tree_writer.is_writer_thread():
+            with Tracer.span("queued write", commit_type=commit_type):
+                result, self.last_commit_sha = tree_writer.perform(action, commit_type, commit_id)
+            return result
+
+        with Tracer.span("tree workflow", commit_type=commit_type):
+            for attempt in range(self.MAX_TREE_WRITE_ATTEMPTS):
+                writer = IssueTreeWriter(self.obtain_repo())
+
+                with Tracer.span("action"):
+                    result = action(writer)
+                id = commit_id() if callable(commit_id) else commit_id
+
+                try:
+                    with Tracer.span("commit"):
+                        self.last_commit_sha = writer.commit_changes(self._generate_commit_message(commit_type, id))
+                    return result
+                except TreeUpdateConflictError:
+                    if attempt == self.MAX_TREE_WRITE_ATTEMPTS - 1:
+                        raise
+
     @staticmethod
     def obtain_repo():
         return RepoHandler.obtain_repo()
 
 
+class WriteBatch(object):
+    """ The writes collected by GitManager.batch that are waiting to be committed. """
+
+    def __init__(self, cmd: str = None):
+        self.cmd = cmd
+        self.paths = {}
+
+    def add_paths(self, paths: [str]):
+        # A dict keeps the order paths were written in while dropping repeats, e.g. the tracker
+        for path in paths:
+            self.paths[str(path)] = None
+
+    def get_paths(self) -> [str]:
+        return list(self.paths.keys())
+
+
 class RepoHandler(object):
+    """ Finds the repository (or the issue worktree) to work in.
 
-    @staticmethod
-    def obtain_repo():
-        return git.Repo(str(Path.cwd()), search_parent_directories=True)
+        By default that's the one containing the current directory, and moving into the issue worktree changes the
+        current directory. As the current directory is shared by the whole process, a multi-threaded program (e.g. the
+        web app) sets a root instead, with set_root for every thread or with using_root for one. Moving into the
+        worktree then only moves the calling thread's root, and each thread opens its own Repo for each root as
+        GitPython's aren't safe to share between threads. """
+
+    CACHE_DIR = "git-issue"
+
+    # The root used by threads that haven't been given their own. None means the current directory is used
+    default_root = None
+    _local = threading.local()
+
+    @classmethod
+    def set_root(cls, root):
+        cls.default_root = os.path.normpath(str(root)) if root is not None else None
+
+    @classmethod
+    @contextmanager
+    def using_root(cls, root):
+        """ Works in the given root for the rest of the block, in the calling thread only. """
+        previous = getattr(cls._local, "root", None)
+        cls._local.root = os.path.normpath(str(root))
+
+        try:
+            yield
+        finally:
+            cls._local.root = previous
+
+    @classmethod
+    def _get_explicit_root(cls) -> str or None:
+        root = getattr(cls._local, "root", None)
+        return root if root is not None else cls.default_root
+
+    @classmethod
+    def get_root(cls) -> Path:
+        """ The directory paths are resolved against: the thread's root if it has one, otherwise the current one. """
+        root = cls._get_explicit_root()
+        return Path(root) if root is not None else Path.cwd()
+
+    @classmethod
+    def change_root(cls, path):
+        """ Moves into another directory, e.g. the issue worktree, in the same way the root was given. """
+        if cls._get_explicit_root() is None:
+            os.chdir(path)
+        else:
+            cls._local.root = os.path.normpath(str(path))
+
+    @classmethod
+    def forget_repo(cls, root):
+        repos = getattr(cls._local, "repos", None)
+
+        if repos is not None:
+            repo = repos.pop(os.path.normpath(str(root)), None)
+            if repo is not None:
+                repo.close()
+
+    @classmethod
+    def release_repos(cls):
+        """ Closes the Repos opened by the calling thread, along with the GIT processes they keep running. A
+            thread that's about to end (e.g. one serving a single web request) calls this, as nothing else
+            would close them. """
+        repos = getattr(cls._local, "repos", None)
+        cls._local.repos = {}
+
+        for repo in (repos or {}).values():
+            repo.close()
+
+    @classmethod
+    def obtain_repo(cls):
+        root = cls._get_explicit_root()
+
+        if root is None:
+            return git.Repo(str(Path.cwd()), search_parent_directories=True)
+
+        repos = getattr(cls._local, "repos", None)
+        if repos is None:
+            repos = cls._local.repos = {}
+
+        if root not in repos:
+            repos[root] = git.Repo(root, search_parent_directories=True)
+
+        return repos[root]
+
+    @classmethod
+    def obtain_cache_dir(cls, repo=None) -> Path:
+        """ Local, never committed, data lives in GIT's own directory so that it's shared by every worktree. """
+        repo = repo if repo is not None else cls.obtain_repo()
+        path = Path(repo.common_dir).joinpath(cls.CACHE_DIR)
+        path.mkdir(parents=True, exist_ok=True)
+        return path
@@ -0,0 +1,113 @@
+import json
+import os
+from threading import Lock
+
+from git import Repo, GitCommandError
+
+from git_issue.git_manager import RepoHandler
+from git_issue.utils.trace_utils import Tracer
+
+
+class ContributorDirectory(object):
+    """ Maps the email of everyone who has authored a commit to their name, so that a user can be found by
+        email without going through the whole history with "git shortlog" each time.
+
+        The directory is stored in GIT's directory, so it's shared by every worktree, the CLI and the web app.
+        It remembers the commits it was built up to, and catching up only logs the commits that aren't
+        reachable from any of them. Names are found with the same mailmap rules as shortlog. """
+
+    FILE_NAME = "contributors.json"
+    VERSION = 1
+    # How many of the commits it was built up to are remembered. Forgetting one only costs re-reading history
+    MAX_TIPS = 20
+
+    _directories = {}
+    _directories_lock = Lock()
+
+    def __init__(self, repo: Repo = None):
+        self.repo = repo if repo is not None else RepoHandler.obtain_repo()
+        self.path = RepoHandler.obtain_cache_dir(self.repo).joinpath(self.FILE_NAME)
+        self.tips = []
+        self.names = {}
+        self._lock = Lock()
+
+    @classmethod
+    def obtain(cls, repo: Repo = None):
+        """ Returns the repository's directory, caught up with its HEAD. """
+        repo = repo if repo is not None else RepoHandler.obtain_repo()
+
+        with cls._directories_lock:
+            key = repo.common_dir
+            if key not in cls._directories:
+                directory = ContributorDirectory(repo)
+                directory.load()
+                cls._directories[key] = directory
+
+            directory = cls._directories[key]
+
+        directory.refresh(repo)
+        return directory
+
+    def load(self):
+        try:
+            with Tracer.span("json read", "json", path=self.path), open(self.path, 'r') as file:
+                data = json.load(file)
+        except (IOError, ValueError):
+            return
+
+        if data.get("version") != self.VERSION:
+            return
+
+        self.tips = data.get("tips", [])
+        self.names = {email: set(names) for email, names in data.get("names", {}).items()}
+
+    def store(self):
+        data = {"version": self.VERSION, "tips": self.tips,
+                "names": {email: sorted(names) for email, names in self.names.items()}}
+
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with Tracer.span("json write", "json", path=self.path), open(tmp_path, 'w') as file:
+            json.dump(data, file, separators=(",", ":"))
+        os.replace(str(tmp_path), str(self.path))
+
+    @staticmethod
+    def _get_head(repo: Repo) -> str or None:
+        try:
+            return repo.head.commit.hexsha
+        except ValueError:
+            # Nothing has been committed yet
+            return None
+
+    def refresh(self, repo: Repo = None) -> bool:
+        """ Adds the authors of any commits that haven't been seen yet. Returns True if any commits were read. """
+        repo = repo if repo is not None else self.repo
+        head = self._get_head(repo)
+
+        if head is None or head in self.tips:
+            return False
+
+        with self._lock:
+            # Another process may have caught up in the meantime
+            self.load()
+            if head in self.tips:
+                return False
+
+            try:
+                log = repo.git.log("--format=%aN%x00%aE", "--ignore-missing", head, "--not", *self.tips)
+            except GitCommandError:
+                log = repo.git.log("--format=%aN%x00%aE", head)
+
+            for line in log.splitlines():
+                name, _, email = line.partition("\x00")
+                self.names.setdefault(email, set()).add(name)
+
+            self.tips = (self.tips + [head])[-self.MAX_TIPS:]
+            self.store()
+
+        return True
+
+    def get_name(self, email: str) -> str or None:
+        names = self.names.get(email)
+
+        # Like shortlog, the first name in order wins if someone has committed under several
+        return min(names) if names else None
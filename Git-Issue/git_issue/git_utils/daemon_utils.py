@@ -0,0 +1,274 @@
+import threading
+import time
+from pathlib import Path
+
+from git import Repo, GitCommandError
+
+from git_issue.git_manager import GitManager, RepoHandler
+from git_issue.git_utils.merge_utils import GitMerge, ManualMergeConflictsError
+from git_issue.git_utils.sync_utils import GitSynchronizer
+import git_issue.issue.handler as issue_handler
+
+
+class SyncMetrics(object):
+    """ How far the issue branch is behind or ahead of its remote, and what the daemon has done to keep up. """
+
+    def __init__(self):
+        self.fetches = 0
+        self.pushes = 0
+        self.fast_forwards = 0
+        self.merges = 0
+        # Merges left for a person to resolve in the issue worktree
+        self.conflicts = 0
+        self.failures = 0
+        # Commits the local branch has that the remote doesn't, and the other way around, as of the last fetch
+        self.ahead = 0
+        self.behind = 0
+        # When the last fetch and push succeeded, as seconds since the epoch
+        self.last_fetch = None
+        self.last_push = None
+        # How long the oldest unpushed commit has been waiting, as of the last pass
+        self.push_lag = 0.0
+
+    def get_fetch_lag(self, now: float = None) -> float or None:
+        """ How many seconds it has been since the remote was last fetched. """
+        if self.last_fetch is None:
+            return None
+
+        now = now if now is not None else time.time()
+        return now - self.last_fetch
+
+    def to_dict(self) -> dict:
+        return {"fetches": self.fetches, "pushes": self.pushes, "fast_forwards": self.fast_forwards,
+                "merges": self.merges, "conflicts": self.conflicts, "failures": self.failures, "ahead": self.ahead, "behind": self.behind,
+                "push_lag": self.push_lag, "fetch_lag": self.get_fetch_lag()}
+
+
+class SyncDaemon(object):
+    """
+        Keeps the issue branch in step with its remote in the background.
+
+        The remote's issue branch is fetched every fetch_interval seconds. If only the remote has moved on, the
+        local branch is fast-forwarded to it. Only if both have moved on is it merged, and only a merge with
+        conflicts is handed to GitSynchronizer.merge to be resolved. If some of those conflicts need a person to
+        resolve them, they're left in the issue worktree and syncing stops until the merge has been finished (e.g.
+        with the merge command) or aborted.
+
+        Local commits are pushed once the branch has been left alone for push_delay seconds, so that a burst of
+        commits is pushed once rather than one at a time. A steady stream of commits is still pushed at least
+        every max_push_delay seconds.
+
+        Only the issue branch is fetched, leaving its blobs behind on the remote if partial (see
+        GitManager.fetch_issue_branch).
+    """
+
+    def __init__(self, repo: Repo = None, remote: str = "origin", fetch_interval: float = 60.0,
+                 push_delay: float = 5.0, max_push_delay: float = 60.0, poll_interval: float = 1.0,
+                 partial: bool = False, clock=time.monotonic):
+        self.repo = repo if repo is not None else RepoHandler.obtain_repo()
+        self.remote = remote
+        self.fetch_interval = fetch_interval
+        self.push_delay = push_delay
+        self.max_push_delay = max_push_delay
+        self.poll_interval = poll_interval
+        self.partial = partial
+        self.clock = clock
+        self.metrics = SyncMetrics()
+
+        self.local_ref = f"refs/heads/{GitManager.ISSUE_BRANCH}"
+        self.remote_ref = GitManager().get_remote_ref(remote)
+
+        self._next_fetch = None
+        self._last_local = None
+        self._local_changed = None
+        self._unpushed_since = None
+        self.conflicted = False
+
+    def _get_sha(self, ref: str) -> str or None:
+        try:
+            return self.repo.git.rev_parse("--verify", "--quiet", f"{ref}^{{commit}}")
+        except GitCommandError:
+            return None
+
+    def _is_ancestor(self, ancestor: str, descendant: str) -> bool:
+        try:
+            self.repo.git.merge_base("--is-ancestor", ancestor, descendant)
+            return True
+        except GitCommandError:
+            return False
+
+    def _count_divergence(self, local: str or None, remote: str or None) -> (int, int):
+        """ Returns how many commits the local branch is ahead and behind the remote's. """
+        if local is None:
+            return 0, int(self.repo.git.rev_list("--count", remote)) if remote is not None else 0
+
+        if remote is None:
+            return int(self.repo.git.rev_list("--count", local)), 0
+
+        ahead, behind = self.repo.git.rev_list("--left-right", "--count", f"{local}...{remote}").split()
+        return int(ahead), int(behind)
+
+    def fetch(self) -> bool:
+        try:
+            GitManager().fetch_issue_branch(self.remote, self.partial, self.repo)
+        except GitCommandError as e:
+            # The remote has no issue branch until the first push
+            if "couldn't find remote ref" in e.stderr:
+                return True
+
+            self.metrics.failures += 1
+            print(f"Failed to fetch the remote issue branch: {e.stderr.strip()}")
+            return False
+
+        self.metrics.fetches += 1
+        self.metrics.last_fetch = time.time()
+        return True
+
+    def integrate(self) -> str or None:
+        """ Brings the remote's commits into the local branch. Returns what was done: "fast-forward", "merge",
+            "conflict" if the merge was left for a person to resolve, or None if there was nothing to bring in. """
+        local = self._get_sha(self.local_ref)
+        remote = self._get_sha(self.remote_ref)
+
+        if remote is None or local == remote or (local is not None and self._is_ancestor(remote, local)):
+            return None
+
+        if local is None or self._is_ancestor(local, remote):
+            self._fast_forward(local, remote)
+            self.metrics.fast_forwards += 1
+            return "fast-forward"
+
+        try:
+            self._merge(remote)
+        except ManualMergeConflictsError:
+            self.conflicted = True
+            self.metrics.conflicts += 1
+            print(f"Stopped syncing with {self.remote} until the merge is resolved in the issue worktree.")
+            return "conflict"
+
+        self.metrics.merges += 1
+        return "merge"
+
+    def _fast_forward(self, local: str or None, remote: str):
+        gm = GitManager()
+
+        # Moving the branch from under a worktree that's in use would leave it stale
+        if local is not None and gm.is_worktree_required():
+            gm.perform_git_workflow(lambda: RepoHandler.obtain_repo().git.merge("--ff-only", remote))
+        else:
+            self.repo.git.update_ref("-m", f"sync: fast-forward to {self.remote}", self.local_ref, remote,
+                                     local if local is not None else "")
+
+        print(f"Fast-forwarded the issue branch to {remote[:7]}.")
+
+    def _merge(self, remote: str):
+        def action():
+            repo = RepoHandler.obtain_repo()
+
+            try:
+                repo.git.merge("--no-edit", "-m", f"Merge {self.remote}'s issue branch", remote)
+            except GitCommandError:
+                merger = GitMerge(repo)
+
+                if not merger.has_conflicts():
+                    raise
+
+                GitSynchronizer().merge(merger)
+
+        root = RepoHandler.get_root()
+
+        try:
+            GitManager().perform_git_workflow(action)
+        except ManualMergeConflictsError:
+            # The worktree is left loaded with the conflicts, but the daemon carries on from where it was
+            RepoHandler.change_root(root)
+            raise
+
+        issue_handler.refresh_derived_caches(self.repo)
+        print(f"Merged {self.remote}'s issue branch.")
+
+    def _is_merge_unresolved(self) -> bool:
+        """ Whether a merge is still in progress in the issue worktree, or in the repository itself if the issue
+            branch is checked out there. """
+        git_dir = Path(self.repo.git_dir)
+        worktree_dir = git_dir.joinpath("worktrees", GitManager.ISSUE_BRANCH)
+
+        return worktree_dir.joinpath("MERGE_HEAD").exists() or git_dir.joinpath("MERGE_HEAD").exists()
+
+    def push(self) -> bool:
+        local = self._get_sha(self.local_ref)
+
+        try:
+            self.repo.git.push(self.remote, f"{local}:{self.local_ref}")
+        except GitCommandError as e:
+            self.metrics.failures += 1
+            print(f"Failed to push the issue branch: {e.stderr.strip()}")
+            return False
+
+        # GIT only moves the remote's ref if the remote is set up to fetch the issue branch, which a single branch
+        # clone isn't. Left behind, it would have the branch counted as ahead and pushed again until the next fetch
+        self.repo.git.update_ref("-m", f"sync: pushed to {self.remote}", self.remote_ref, local)
+
+        self.metrics.pushes += 1
+        self.metrics.last_push = time.time()
+        print(f"Pushed {self.metrics.ahead} commit(s) to {self.remote}.")
+        return True
+
+    def _is_push_due(self, now: float) -> bool:
+        return now - self._local_changed >= self.push_delay or now - self._unpushed_since >= self.max_push_delay
+
+    def step(self, now: float = None):
+        """ Makes a single pass: fetches and integrates if a fetch is due, then pushes if a push is due. """
+        now = now if now is not None else self.clock()
+
+        if self.conflicted:
+            if self._is_merge_unresolved():
+                return
+
+            self.conflicted = False
+            self._next_fetch = now
+            print(f"The merge has been resolved. Resumed syncing with {self.remote}.")
+
+        if self._next_fetch is None or now >= self._next_fetch:
+            self._next_fetch = now + self.fetch_interval
+
+            if self.fetch() and self.integrate() == "conflict":
+                return
+
+        local = self._get_sha(self.local_ref)
+        if local != self._last_local:
+            self._last_local = local
+            self._local_changed = now
+
+        self.metrics.ahead, self.metrics.behind = self._count_divergence(local, self._get_sha(self.remote_ref))
+
+        if self.metrics.ahead == 0:
+            self._unpushed_since = None
+            self.metrics.push_lag = 0.0
+            return
+
+        if self._unpushed_since is None:
+            self._unpushed_since = now
+        self.metrics.push_lag = now - self._unpushed_since
+
+        if self._is_push_due(now):
+            if self.push():
+                self._unpushed_since = None
+                self.metrics.ahead = 0
+                self.metrics.push_lag = 0.0
+            else:
+                # The remote has probably moved on, so it's fetched again before the next push
+                self._next_fetch = now
+
+    def run(self, stop: threading.Event = None):
+        """ Syncs until stopped. """
+        stop = stop if stop is not None else threading.Event()
+
+        while not stop.is_set():
+            try:
+                self.step()
+            except GitCommandError as e:
+                self.metrics.failures += 1
+                print(f"Failed to sync the issue branch: {e.stderr.strip()}")
+
+            stop.wait(self.poll_interval)
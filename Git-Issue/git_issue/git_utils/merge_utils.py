@@ -1,17 +1,20 @@
+import heapq
+import time
 from copy import deepcopy
 
 from enum import Enum
 from abc import ABC, abstractmethod
 
 from git import Repo
-from json import JSONDecodeError
 from pathlib import Path
-from typing import List
+from typing import Callable, List
 
-from git_issue.git_manager import GitManager
+from git_issue.git_manager import GitManager, RepoHandler
+from git_issue.git_utils.tree_utils import IssueTree, read_blobs
 from git_issue.utils.json_utils import JsonConvert
 import git_issue.issue as issue
 from git_issue.issue.issue import Issue
+from git_issue.issue.derived_cache import issue_sort_key
 from git_issue.issue.handler import IssueHandler
 from git_issue.issue.tracker import Tracker, UUIDTrack
 from git_issue.comment.index import Index
@@ -103,7 +106,7 @@ class CommentIndexResolutionTool(ResolutionTool):
         self.path = path
 
     def resolve(self):
-        JsonConvert.ToFile(self.index, Path(self.path))
+        JsonConvert.ToFile(self.index, RepoHandler.get_root().joinpath(self.path))
         gm = GitManager()
         repo = gm.obtain_repo()
         repo.git.add(self.path)
@@ -128,6 +131,71 @@ class DivergenceResolutionTool(ResolutionTool):
         for path in paths:
             repo.git.add(path)
 
+class IssueSnapshot(object):
+    """
+        A read-only view of the issues being merged, taken once for a whole resolution rather than loading the
+        issue worktree for every ID that's looked at.
+
+        Inside the issue worktree it's taken from the index, which holds the merged result of every file that
+        merged cleanly (and any resolutions added so far). Elsewhere it's taken from the tip of the issue branch.
+        The existing IDs are held in a set, while an issue itself is only read and decoded when it's asked for.
+        An unresolved file reads as None.
+    """
+
+    def __init__(self, ids: set, read: Callable[[str], Issue or None]):
+        self.ids = ids
+        self._read = read
+        self._issues = {}
+
+    @classmethod
+    def from_index(cls, repo: Repo):
+        ids = set()
+        blobs = {}
+
+        for entry in repo.git.ls_files("-s", "-z").split("\0"):
+            if entry == "":
+                continue
+
+            info, path = entry.split("\t", 1)
+            mode, sha, stage = info.split()
+            parts = path.split("/")
+
+            if len(parts) == 2 and parts[1] == "issue.json":
+                ids.add(parts[0])
+
+                if stage == "0":
+                    blobs[parts[0]] = sha
+
+        def read(id):
+            sha = blobs.get(id)
+            data = repo.odb.stream(bytes.fromhex(sha)).read().decode() if sha is not None else None
+            return JsonConvert.FromJSON(data, f"{id}/issue.json") if data is not None else None
+
+        return cls(ids, read)
+
+    @classmethod
+    def from_tree(cls, tree: IssueTree):
+        return cls(set(tree.list_dirs(f"{Tracker.ISSUE_IDENTIFIER}-*")), lambda id: tree.read_json(f"{id}/issue.json"))
+
+    @classmethod
+    def obtain(cls):
+        gm = GitManager()
+
+        if gm.is_inside_branch():
+            return cls.from_index(gm.obtain_repo())
+
+        return cls.from_tree(IssueTree())
+
+    def exists(self, id: str) -> bool:
+        return id in self.ids
+
+    def get_issue(self, id: str) -> Issue or None:
+        if id not in self._issues:
+            self._issues[id] = self._read(id) if id in self.ids else None
+
+        return deepcopy(self._issues[id])
+
+
 class ConflictResolver(ABC):
 
     @abstractmethod
@@ -144,6 +212,7 @@ class CreateConflictResolver(ConflictResolver):
     def __init__(self):
         self.conflicts: [ConflictInfo] = []
         self.tracker: Tracker = None
+        self.snapshot: IssueSnapshot = None
 
     def generate_resolution(self):
         """
@@ -168,7 +237,8 @@ class CreateConflictResolver(ConflictResolver):
 
         complete = False
         handler = IssueHandler(tracker)
-        ids = [issue.id for issue in conflicts]
+        snapshot = self.snapshot if self.snapshot is not None else IssueSnapshot.obtain()
+        ids = set(issue.id for issue in conflicts)
 
         while not complete:
             to_add = []
@@ -180,21 +250,20 @@ class CreateConflictResolver(ConflictResolver):
 
 
                 if next_id not in ids:
-                    if handler.does_issue_exist(next_id):
-                        missing = handler.get_issue_from_issue_id(next_id)
+                    if snapshot.exists(next_id):
+                        missing = snapshot.get_issue(next_id)
                         to_add.append(missing)
 
-                    ids.append(next_id)
+                    ids.add(next_id)
 
             for issue in to_add:
                 conflicts.append(issue)
-                ids.append(issue.id)
+                ids.add(issue.id)
 
             complete = len(to_add) == 0
 
         conflicts.sort(key=lambda x: x.date)
-        sorted_ids = list(set(ids))
-        sorted_ids.sort()
+        sorted_ids = sorted(ids, key=issue_sort_key)
 
         assert len(sorted_ids) >= len(conflicts)
 
@@ -214,13 +283,16 @@ class CommentIndexConflictResolver(ConflictResolver):
         self.conflict_info: ConflictInfo = None
 
     def generate_resolution(self):
+        # Each side's entries are already in date order, so they only need merging rather than sorting
         entries = []
+        seen = set()
 
-        for conflict in self.conflict_info.conflicts:
-            entries += conflict.entries
+        for entry in heapq.merge(*[conflict.entries for conflict in self.conflict_info.conflicts],
+                                 key=lambda x: x.date if x.date is not None else ""):
+            if entry not in seen:
+                seen.add(entry)
+                entries.append(entry)
 
-        entries = list(set(entries)) # remove duplicates by converting to set and back to list
-        entries.sort(key=lambda x: x.date)
         index = Index(entries)
 
         return CommentIndexResolutionTool(index, self.conflict_info.path)
@@ -232,6 +304,7 @@ class DivergenceConflictResolver(ConflictResolver):
         self.diverged_issues = []
         self.resolved_conflicts: [Issue] = []
         self.resolved_tracker: Tracker
+        self.snapshot: IssueSnapshot = None
 
     def _get_edit_resolution(self, diverged: Issue, current: Issue) -> Issue:
         print(f"Issue with ID {diverged.id} and UUID {diverged.uuid} has been changed to {current.id} in a previous "
@@ -293,22 +366,12 @@ class DivergenceConflictResolver(ConflictResolver):
             if found: # Remove the found issue from the list so we don't need to examine it again
                 del diverged_issues[diverged_index]
 
-        handler = IssueHandler(self.resolved_tracker)
+        snapshot = self.snapshot if self.snapshot is not None else IssueSnapshot.obtain()
 
         for stage_2, stage_3 in diverged_issues:
-            loaded_stage_2 = None
-            loaded_stage_3 = None
-
-            # If it fails then it means the JSON is garbled with Git merge stuff. That or it's just messed up...
-            # Either way, it's a fail.
-            try:
-                loaded_stage_2 = handler.get_issue_from_uuid(stage_2.uuid)
-            except JSONDecodeError:
-                pass
-            try:
-                loaded_stage_3 = handler.get_issue_from_uuid(stage_3.uuid)
-            except JSONDecodeError:
-                pass
+            # An issue whose file is still unresolved reads as None
+            loaded_stage_2 = snapshot.get_issue(self.resolved_tracker.get_issue_from_uuid(stage_2.uuid))
+            loaded_stage_3 = snapshot.get_issue(self.resolved_tracker.get_issue_from_uuid(stage_3.uuid))
 
             if loaded_stage_2 is not None and loaded_stage_2.id != stage_2.id:
                 matching_issues.append((stage_2, loaded_stage_2))
@@ -338,6 +401,8 @@ class GitMerge(object):
 
     def __init__(self, repo: Repo):
         self.repo = repo
+        # How long each phase of parsing the unmerged conflicts took, in seconds
+        self.timings = {}
 
     def _get_conflicts_of_type(self, type: ConflictType, conflicts: [ConflictInfo] = None):
         if conflicts is None or conflicts == []:
@@ -346,24 +411,58 @@ class GitMerge(object):
         return [conflict for conflict in conflicts if conflict.type is type]
 
     def has_conflicts(self) -> bool:
-        return self.repo.index.unmerged_blobs() != {}
+        return self.repo.git.ls_files("-u") != ""
+
+    def _list_unmerged_stages(self) -> [(str, [str])]:
+        """ The blob at each stage of every unmerged file, in the order of the index. Asking GIT for only the
+            unmerged entries is much quicker than having GitPython read the whole index. """
+        stages = {}
+
+        for entry in self.repo.git.ls_files("-u", "-z").split("\0"):
+            if entry == "":
+                continue
+
+            info, path = entry.split("\t", 1)
+            mode, sha, stage = info.split()
+
+            if stage != "0":
+                stages.setdefault(path, []).append(sha)
+
+        return list(stages.items())
 
     def parse_unmerged_conflicts(self) -> [ConflictInfo]:
-        unmerged_blobs = self.repo.index.unmerged_blobs()
+        """ Reads each stage of every unmerged file. The blobs are read through a single "git cat-file --batch"
+            and each distinct blob is decoded once. The time taken by each phase is kept in timings. """
+        start = time.perf_counter()
+        stages = self._list_unmerged_stages()
+        self.timings["index"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        data = read_blobs(self.repo, [sha for path, shas in stages for sha in shas])
+        self.timings["read"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        keys = list(dict.fromkeys((sha, path) for path, shas in stages for sha in shas))
+        # Decoded here rather than in worker processes, as sending the objects back to this one would cost
+        # about as much as decoding them
+        decoded = {(sha, path): JsonConvert.FromJSON(data[sha].decode(), path) for sha, path in keys}
+        self.timings["decode"] = time.perf_counter() - start
+
+        start = time.perf_counter()
         unmerged: [ConflictInfo] = []
 
-        for unmerged_file in unmerged_blobs:
+        for path, shas in stages:
             conflicts = []
 
-            for (stage, blob) in unmerged_blobs[unmerged_file]:
-                if stage != 0:
-                    data = blob.data_stream.read().decode()
-                    obj = JsonConvert.FromJSON(data)
+            for sha in shas:
+                obj = decoded[(sha, path)]
 
-                    conflicts.append(obj)
+                # The same blob may be at several stages, but each stage is resolved as its own object
+                conflicts.append(obj if all(o is not obj for o in conflicts) else deepcopy(obj))
 
-            unmerged.append(ConflictInfo(unmerged_file, conflicts))
+            unmerged.append(ConflictInfo(path, conflicts))
 
+        self.timings["classify"] = time.perf_counter() - start
         return unmerged
 
     def produce_create_resolver(self, conflicts: [ConflictInfo] = None) -> ConflictResolver:
@@ -374,10 +473,12 @@ class GitMerge(object):
         # uuids = []
 
         tracking = []
+        seen = set()
         for conflict in trackers:
             for tracker in conflict.conflicts:
                 for track in tracker.tracked_uuids:
-                    if track not in tracking:
+                    if track not in seen:
+                        seen.add(track)
                         tracking.append(track)
 
         # for info in resolver.conflicts:
@@ -429,3 +530,13 @@ class DivergenceMatchMissingError(Exception):
         super(Exception, self).__init__(message)
         self.stage_2 = stage_2
         self.stage_3 = stage_3
+
+
+class ManualMergeConflictsError(Exception):
+    """ Raised once everything that could be resolved automatically has been, leaving conflicts for a person to
+        resolve in the issue worktree. """
+
+    def __init__(self, conflicts: [ConflictInfo]):
+        paths = "\n".join(f"\t{conflict.path}" for conflict in conflicts)
+        super(Exception, self).__init__(f"Conflicts left to resolve by hand:\n{paths}")
+        self.conflicts = conflicts
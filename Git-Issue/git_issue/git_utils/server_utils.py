@@ -0,0 +1,330 @@
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+
+# The client side of this module runs before every command, so it imports as little as it can: a command handed
+# to a server never loads GitPython. Whatever only the server needs is imported when it's used.
+
+# Bumped whenever requests or responses change, so that a client never talks to a server started from older code
+PROTOCOL_VERSION = 1
+
+SOCKET_NAME = "server.sock"
+
+# The longest path a Unix domain socket may be bound to on most systems
+MAX_SOCKET_PATH = 100
+
+# GitManager.ISSUE_BRANCH, which isn't imported from there as that would load GitPython
+ISSUE_BRANCH = "issue"
+
+
+def find_common_dir(path: Path = None) -> Path or None:
+    """ Finds GIT's directory for the repository containing path, without running GIT. For a worktree, that's
+        the directory shared by all of the repository's worktrees. """
+    if "GIT_DIR" in os.environ:
+        git_dir = Path(os.environ["GIT_DIR"]).resolve()
+        return _get_common_dir(git_dir)
+
+    path = Path(path if path is not None else os.getcwd()).resolve()
+
+    for directory in [path, *path.parents]:
+        dot_git = directory.joinpath(".git")
+
+        if dot_git.is_dir():
+            return dot_git
+
+        # Worktrees and submodules have a file pointing to their GIT directory instead
+        if dot_git.is_file():
+            text = dot_git.read_text().strip()
+
+            if text.startswith("gitdir:"):
+                return _get_common_dir(directory.joinpath(text[len("gitdir:"):].strip()).resolve())
+
+    return None
+
+
+def _get_common_dir(git_dir: Path) -> Path:
+    commondir = git_dir.joinpath("commondir")
+
+    if commondir.is_file():
+        return git_dir.joinpath(commondir.read_text().strip()).resolve()
+
+    return git_dir
+
+
+def get_socket_path(common_dir: Path) -> Path:
+    """ The socket a repository's server listens on. It's kept with the repository's other local data (see
+        RepoHandler.obtain_cache_dir), unless that path is too long to bind to, in which case it's kept in the
+        temporary directory under a name given by the repository's path. """
+    path = Path(common_dir).joinpath("git-issue", SOCKET_NAME)
+
+    if len(os.fsencode(str(path))) <= MAX_SOCKET_PATH:
+        return path
+
+    import hashlib
+    import tempfile
+
+    digest = hashlib.sha1(os.fsencode(str(common_dir))).hexdigest()[:16]
+    return Path(tempfile.gettempdir()).joinpath(f"git-issue-{os.getuid()}-{digest}.sock")
+
+
+def needs_confirmation(common_dir: Path) -> bool:
+    """ Whether loading the issue branch would ask for confirmation, which only a command run in its own process
+        can do: the branch has to be created, or a folder is in the way of its worktree. """
+    common_dir = Path(common_dir)
+    has_branch = common_dir.joinpath("refs", "heads", ISSUE_BRANCH).is_file()
+
+    if not has_branch:
+        try:
+            packed = common_dir.joinpath("packed-refs").read_text()
+        except IOError:
+            packed = ""
+
+        has_branch = any(line.endswith(f" refs/heads/{ISSUE_BRANCH}") for line in packed.splitlines())
+
+    if not has_branch:
+        return True
+
+    folder = common_dir.parent.joinpath(ISSUE_BRANCH)
+    return folder.exists() and not common_dir.joinpath("worktrees", ISSUE_BRANCH).exists()
+
+
+class ServerDisconnectedError(Exception):
+    """ Raised when the server closes the connection after being sent a request, without answering it. What was
+        asked of it may or may not have been done. """
+
+    def __init__(self, socket_path: Path):
+        super(Exception, self).__init__(f"The server at {socket_path} stopped answering.")
+        self.socket_path = socket_path
+
+
+def _send(connection: socket.socket, message: dict):
+    connection.sendall(json.dumps(message).encode() + b"\n")
+
+
+def _receive(connection: socket.socket) -> dict or None:
+    with connection.makefile("rb") as file:
+        line = file.readline()
+
+    return json.loads(line.decode()) if line else None
+
+
+class IssueClient(object):
+    """ Hands commands to the server running for a repository, if there is one. """
+
+    def __init__(self, socket_path: Path):
+        self.socket_path = socket_path
+
+    @classmethod
+    def find(cls, path: Path = None):
+        """ Returns a client for the server of the repository containing path, or None if no server has been
+            started for it or the command has to ask for confirmation first (see needs_confirmation). Setting
+            GIT_ISSUE_NO_SERVER keeps every command in its own process. """
+        if os.environ.get("GIT_ISSUE_NO_SERVER"):
+            return None
+
+        common_dir = find_common_dir(path)
+        if common_dir is None or needs_confirmation(common_dir):
+            return None
+
+        socket_path = get_socket_path(common_dir)
+        return cls(socket_path) if socket_path.exists() else None
+
+    def request(self, message: dict) -> dict or None:
+        """ Sends a request, returning the server's response, or None if no server is answering (e.g. it was
+            stopped without removing its socket) or it didn't understand the request. Raises
+            ServerDisconnectedError if the server went away once the request was sent, as it may have acted on
+            it. """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            try:
+                connection.connect(str(self.socket_path))
+            except (ConnectionRefusedError, FileNotFoundError):
+                return None
+
+            try:
+                _send(connection, dict(message, version=PROTOCOL_VERSION))
+                connection.shutdown(socket.SHUT_WR)
+                response = _receive(connection)
+            except (ConnectionResetError, BrokenPipeError, ValueError):
+                response = None
+
+        if response is None:
+            raise ServerDisconnectedError(self.socket_path)
+
+        # A server from another version of git issue doesn't run the request
+        if response.get("status") is None:
+            return None
+
+        return response
+
+    def run(self, argv: [str], stdin: str = "") -> int or None:
+        """ Runs a command in the server, writing out what it printed. Returns the command's exit status, or None
+            if the command couldn't be handed over and must be run in this process instead. A command the server
+            stopped in the middle of isn't run again, as it may already have made its changes. """
+        try:
+            response = self.request({"argv": argv, "cwd": os.getcwd(), "stdin": stdin})
+        except ServerDisconnectedError as e:
+            print(f"{e} The command may not have finished; check its changes before running it again.",
+                  file=sys.stderr)
+            return 1
+
+        if response is None:
+            return None
+
+        sys.stdout.write(response["stdout"])
+        sys.stdout.flush()
+        sys.stderr.write(response["stderr"])
+        sys.stderr.flush()
+        return response["status"]
+
+    def stop(self) -> bool:
+        """ Asks the server to stop. Returns False if no server was answering. """
+        try:
+            return self.request({"stop": True}) is not None
+        except ServerDisconnectedError:
+            return False
+
+
+class IssueServer(object):
+    """
+        Runs commands for the git issue CLI in one long-lived process, so that each command skips starting Python,
+        loading GitPython and finding the repository, and finds the derived caches, the tree cache and the
+        indexes already in memory.
+
+        The server listens on a Unix domain socket kept in the repository's GIT directory. Each request holds the
+        command's arguments, the directory it was run in and whatever is to be read from its standard input. The
+        command's output and exit status are sent back once it finishes. Commands are run one at a time, as
+        they print through the process's own stdout, and always against the repository the server was started
+        in, as the web app does (see RepoHandler.set_root), so that each keeps reusing its Repo.
+    """
+
+    def __init__(self, run, root: Path = None, idle_timeout: float = None):
+        """ run runs a command, given its arguments, in this process. The server stops once idle_timeout seconds
+            have passed without a request, if it's given. """
+        from git_issue.git_manager import RepoHandler
+
+        self.run_command = run
+        self.root = Path(root) if root is not None else Path(RepoHandler.obtain_repo().working_tree_dir)
+        self.idle_timeout = idle_timeout
+        self.socket_path = get_socket_path(find_common_dir(self.root))
+        self.commands_run = 0
+        self._socket = None
+        self._stopping = False
+
+    def is_running(self) -> bool:
+        """ Whether a server is already answering on this repository's socket. """
+        try:
+            return IssueClient(self.socket_path).request({"ping": True}) is not None
+        except ServerDisconnectedError:
+            return False
+
+    def start(self):
+        """ Binds the socket, replacing one left behind by a server that's no longer running. """
+        if self.socket_path.exists():
+            if self.is_running():
+                raise RuntimeError(f"A server is already running for {self.root}.")
+
+            self.socket_path.unlink()
+
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(str(self.socket_path))
+        # Only the repository's owner may run commands through the server
+        os.chmod(str(self.socket_path), 0o600)
+        self._socket.listen()
+        self._socket.settimeout(self.idle_timeout)
+        return self
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+            if self.socket_path.exists():
+                self.socket_path.unlink()
+
+    def serve(self):
+        """ Answers requests until asked to stop or left idle for too long. """
+        if self._socket is None:
+            self.start()
+
+        try:
+            while not self._stopping:
+                try:
+                    connection, _ = self._socket.accept()
+                except socket.timeout:
+                    break
+
+                with connection:
+                    connection.settimeout(None)
+                    self.handle(connection)
+        finally:
+            self.close()
+
+    def handle(self, connection: socket.socket):
+        try:
+            request = _receive(connection)
+        except (OSError, ValueError):
+            return
+
+        if request is None:
+            return
+
+        if request.get("version") != PROTOCOL_VERSION:
+            response = {"status": None, "error": f"The server speaks version {PROTOCOL_VERSION} of its protocol."}
+        elif request.get("stop"):
+            self._stopping = True
+            response = {"status": 0}
+        elif request.get("ping"):
+            response = {"status": 0}
+        else:
+            response = self.execute(request["argv"], request.get("cwd"), request.get("stdin", ""))
+
+        try:
+            _send(connection, response)
+        except OSError:
+            # The client gave up waiting
+            pass
+
+    def execute(self, argv: [str], cwd: str = None, stdin: str = "") -> dict:
+        """ Runs a command as if it had been run from cwd, capturing what it prints. """
+        import contextlib
+        import io
+        import traceback
+        from git_issue.git_manager import GitManager, RepoHandler
+
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        status = 0
+        original_stdin = sys.stdin
+        original_cwd = os.getcwd()
+        keep_loaded = GitManager.keep_loaded
+
+        try:
+            # Relative paths given to the command (e.g. --profile-trace) are read from where it was run
+            if cwd is not None and os.path.isdir(cwd):
+                os.chdir(cwd)
+
+            sys.stdin = io.StringIO(stdin)
+
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr), \
+                    RepoHandler.using_root(self.root):
+                try:
+                    self.run_command(argv)
+                except SystemExit as e:
+                    if isinstance(e.code, int):
+                        status = e.code
+                    elif e.code is not None:
+                        print(e.code, file=sys.stderr)
+                        status = 1
+                except Exception:
+                    traceback.print_exc()
+                    status = 1
+        finally:
+            sys.stdin = original_stdin
+            os.chdir(original_cwd)
+            GitManager.keep_loaded = keep_loaded
+
+        self.commands_run += 1
+        return {"status": status, "stdout": stdout.getvalue(), "stderr": stderr.getvalue()}
@@ -3,8 +3,9 @@ from git import GitCommandError
 
 from git_issue.git_manager import GitManager
 from git_issue.git_manager import RepoHandler
-from git_issue.git_utils.merge_utils import GitMerge, CreateConflictResolver
+from git_issue.git_utils.merge_utils import GitMerge, CreateConflictResolver, ManualMergeConflictsError
 from git_issue.issue.tracker import Tracker
+import git_issue.issue.handler as issue_handler
 
 
 class GitSynchronizer(object):
@@ -21,10 +22,12 @@ class GitSynchronizer(object):
             print("Failed to push to remote issue branch. Refer to the error below for more details")
             print(e.stderr)
 
-    def pull(self, merge_on_failure=False):
+    def pull(self, merge_on_failure=False, remote="origin", partial=False):
         try:
             print("Pulling from remote branch.")
-            self.repo.git.pull()
+            gm = GitManager()
+            gm.fetch_issue_branch(remote, partial)
+            self.repo.git.merge("--no-edit", gm.get_remote_ref(remote))
             print("Successfully pulled from remote branch.")
         except GitCommandError as e:
             merger = GitMerge(self.repo)
@@ -36,6 +39,8 @@ class GitSynchronizer(object):
                 print(e.stderr)
 
     def merge(self, merger):
+        """ Resolves what conflicts it can and commits the merge. If any are left for a person to resolve, they're
+            left in the worktree and ManualMergeConflictsError is raised. """
         print("Beginning merge process")
         conflicts = merger.parse_unmerged_conflicts()
         create_resolver = merger.produce_create_resolver(conflicts)
@@ -59,6 +64,7 @@ class GitSynchronizer(object):
 
         if manual_conflicts == []:
             self.repo.git.commit("-m", "merge conflict resolution")
+            issue_handler.refresh_derived_caches(self.repo)
             print("Merge successful. All files have been merged.")
         else:
             print("I wasn't able to resolve all the conflicts. This typically happens when something's been edited "
@@ -68,7 +74,6 @@ class GitSynchronizer(object):
             for conflict in manual_conflicts:
                 print(f"\t{conflict.path}")
 
-            gm = GitManager()
-            if gm.is_worktree():
-                print("Exiting program to prevent branch unloading. This would cause loss of resolved conflicts.")
-                exit()
+            # Raised rather than returned so that the workflow running the merge stops before it unloads the
+            # worktree, which would lose the conflicts resolved so far
+            raise ManualMergeConflictsError(manual_conflicts)
@@ -0,0 +1,492 @@
+import subprocess
+from fnmatch import fnmatch
+from io import BytesIO
+from pathlib import PurePosixPath
+from threading import Lock
+from typing import Callable
+
+from git import Repo, BadName, GitCommandError
+from git.objects.fun import tree_to_stream
+from gitdb import IStream
+
+from git_issue.git_manager import GitManager, RepoHandler
+from git_issue.utils.json_utils import JsonConvert
+from git_issue.utils.trace_utils import Tracer
+
+
+class IssueTree(object):
+    """ A read-only view of the issue branch that is resolved straight from GIT's object database.
+
+        Blobs are read through GitPython's object database, which streams them from a single
+        long-running "git cat-file --batch" process. This means that reading issues never adds a
+        worktree, never changes the current directory and never writes to the disk. Note that only
+        committed changes are visible; anything sitting in a loaded worktree is not.
+
+        What is read is kept in the repository's TreeCache, so reading the same commit again costs
+        neither GIT reads nor JSON parsing. """
+
+    # The number of blobs asked for by a single fetch, keeping well within command line limits
+    PREFETCH_CHUNK_SIZE = 1000
+
+    def __init__(self, repo: Repo = None, ref: str = None):
+        self.repo = repo if repo is not None else RepoHandler.obtain_repo()
+        self.ref = ref if ref is not None else GitManager.ISSUE_BRANCH
+        self.resolved_rev = None
+        self.commit = self._resolve_commit()
+        self.tree = self.commit.tree if self.commit is not None else None
+        self._entries = None
+        self.cache = TreeCache.obtain_cache(self.repo)
+        self.cache.validate(self._get_commit_sha())
+
+    def _get_commit_sha(self) -> str or None:
+        return self.commit.hexsha if self.commit is not None else None
+
+    def _resolve_commit(self):
+        # A fresh clone may only know about the remote's issue branch
+        for rev in [self.ref, f"origin/{self.ref}"]:
+            try:
+                commit = self.repo.commit(rev)
+                self.resolved_rev = rev
+                return commit
+            except (BadName, ValueError):
+                continue
+
+        return None
+
+    def _get_entries(self) -> dict:
+        """ The top level of the issue branch can hold thousands of issue folders, so the entries are
+            mapped by name once rather than scanning the tree for every look up. """
+        if self._entries is None:
+            self._entries = self.cache.get_entries(self._get_commit_sha())
+
+        if self._entries is None:
+            self._entries = {obj.name: obj for obj in self.tree} if self.tree is not None else {}
+            self.cache.store_entries(self._get_commit_sha(), self._entries)
+
+        return self._entries
+
+    @staticmethod
+    def _split_path(path) -> tuple:
+        return PurePosixPath(str(path).replace("\\", "/")).parts
+
+    def _get_object(self, path):
+        parts = self._split_path(path)
+
+        if len(parts) == 0:
+            return None
+
+        key = "/".join(parts)
+        found, obj = self.cache.get_path(self._get_commit_sha(), key)
+        if found:
+            return obj
+
+        obj = self._find_object(parts)
+        self.cache.store_path(self._get_commit_sha(), key, obj)
+
+        return obj
+
+    def _find_object(self, parts: tuple):
+        obj = self._get_entries().get(parts[0])
+
+        try:
+            for part in parts[1:]:
+                if obj is None or obj.type != "tree":
+                    return None
+                obj = self._own(obj)[part]
+        except KeyError:
+            return None
+
+        return obj
+
+    def _own(self, obj):
+        """ Objects in the cache may have been found by another thread, through its own Repo. They're only read
+            through this tree's Repo, as GitPython's object streams can't be shared between threads. """
+        if obj.repo is self.repo:
+            return obj
+
+        return type(obj)(self.repo, obj.binsha, obj.mode, obj.path)
+
+    def exists(self, path) -> bool:
+        return self._get_object(path) is not None
+
+    def read(self, path) -> str or None:
+        obj = self._get_object(path)
+
+        if obj is None or obj.type != "blob":
+            return None
+
+        return self._own(obj).data_stream.read().decode()
+
+    def read_json(self, path):
+        obj = self._get_object(path)
+
+        if obj is None or obj.type != "blob":
+            return None
+
+        def load():
+            with Tracer.span("json read", "json", path=path):
+                return JsonConvert.FromJSON(self._own(obj).data_stream.read().decode(), path)
+
+        return self.cache.get_object(obj.hexsha, load)
+
+    def list_dirs(self, pattern: str = "*") -> [str]:
+        return [name for name, obj in self._get_entries().items() if obj.type == "tree" and fnmatch(name, pattern)]
+
+    def _get_promisor_remote(self) -> str or None:
+        """ The remote that a partial fetch left blobs behind on, if any. """
+        config = self.repo.config_reader("repository")
+
+        for section in config.sections():
+            if section.startswith('remote "') and config.get_value(section, "promisor", False) is True:
+                return section[len('remote "'):-1]
+
+        return None
+
+    def prefetch(self, paths: [str]):
+        """ Fetches the blobs of the given files that a partial fetch left behind on the remote. GIT would fetch
+            each of them as it's first read, which is a round trip to the remote per file, so this is called
+            before reading many files at once. Does nothing unless the repository is a partial clone. """
+        if self.commit is None:
+            return
+
+        remote = self._get_promisor_remote()
+        if remote is None:
+            return
+
+        # Blobs can't be asked about on their own, so the missing ones are found by listing the whole tree
+        listing = self.repo.git.rev_list("--objects", "--no-walk", "--missing=print", self.commit.hexsha)
+        missing = set(line[1:] for line in listing.splitlines() if line.startswith("?"))
+
+        if len(missing) == 0:
+            return
+
+        wanted = []
+        for path in paths:
+            obj = self._get_object(path)
+
+            if obj is not None and obj.hexsha in missing:
+                wanted.append(obj.hexsha)
+                missing.discard(obj.hexsha)
+
+        for pos in range(0, len(wanted), self.PREFETCH_CHUNK_SIZE):
+            self.repo.git.fetch("--no-tags", "--no-write-fetch-head", "--recurse-submodules=no", "--filter=blob:none",
+                                remote, *wanted[pos:pos + self.PREFETCH_CHUNK_SIZE])
+
+
+class IssueTreeWriter(IssueTree):
+    """ Commits changes to the issue branch using only GIT's object database, without a worktree or an index.
+
+        Written files are held in memory (and are visible to this writer's reads) until commit_changes is
+        called. Blobs are stored for the changed files and new trees are built only along the changed
+        paths, reusing every untouched tree and blob of the branch tip. The commit is made with
+        "git commit-tree" and the branch is moved with a compare-and-swap "git update-ref", so a
+        writer that lost a race with another one fails rather than overwriting its work. """
+
+    FILE_MODE = 0o100644
+    TREE_MODE = 0o040000
+
+    def __init__(self, repo: Repo = None, ref: str = None):
+        super().__init__(repo, ref)
+        self.changes = {}
+
+    def _normalise_path(self, path) -> str:
+        return "/".join(self._split_path(path))
+
+    def write(self, path, data: str):
+        self.changes[self._normalise_path(path)] = data
+
+    def write_json(self, path, obj):
+        with Tracer.span("json write", "json", path=path):
+            self.write(path, JsonConvert.ToJSON(obj))
+
+    def remove(self, path):
+        self.changes[self._normalise_path(path)] = None
+
+    def read(self, path) -> str or None:
+        path = self._normalise_path(path)
+
+        if path in self.changes:
+            return self.changes[path]
+
+        return super().read(path)
+
+    def read_json(self, path):
+        path = self._normalise_path(path)
+
+        if path in self.changes:
+            data = self.changes[path]
+            return JsonConvert.FromJSON(data, path) if data is not None else None
+
+        return super().read_json(path)
+
+    def exists(self, path) -> bool:
+        path = self._normalise_path(path)
+
+        if path in self.changes:
+            return self.changes[path] is not None
+
+        # A folder exists if anything has been written within it
+        for changed, data in self.changes.items():
+            if data is not None and changed.startswith(f"{path}/"):
+                return True
+
+        return super().exists(path)
+
+    def list_dirs(self, pattern: str = "*") -> [str]:
+        dirs = set(super().list_dirs(pattern))
+
+        for changed, data in self.changes.items():
+            parts = self._split_path(changed)
+            if data is not None and len(parts) > 1 and fnmatch(parts[0], pattern):
+                dirs.add(parts[0])
+
+        return list(dirs)
+
+    def _store(self, type: bytes, data: bytes) -> bytes:
+        return self.repo.odb.store(IStream(type, len(data), BytesIO(data))).binsha
+
+    def _group_changes(self) -> dict:
+        """ Nests the flat path -> data changes into a dict per folder, e.g. {"ISSUE-1": {"issue.json": data}} """
+        grouped = {}
+
+        for path, data in self.changes.items():
+            parts = self._split_path(path)
+            level = grouped
+
+            for part in parts[:-1]:
+                level = level.setdefault(part, {})
+
+            level[parts[-1]] = data
+
+        return grouped
+
+    def _write_tree(self, entries: dict, changes: dict) -> bytes or None:
+        """ Writes a tree made of the given entries (name -> tree object) with the changes applied.
+            Returns the binary sha of the new tree, or None if the tree is left empty. """
+        tree = {name: (obj.binsha, obj.mode, obj) for name, obj in entries.items()}
+
+        for name, change in changes.items():
+            if isinstance(change, dict):
+                current = tree.get(name)
+                sub_entries = {o.name: o for o in self._own(current[2])} \
+                    if current and current[2].type == "tree" else {}
+                binsha = self._write_tree(sub_entries, change)
+
+                if binsha is None:
+                    tree.pop(name, None)
+                else:
+                    tree[name] = (binsha, self.TREE_MODE, None)
+
+            elif change is None:
+                tree.pop(name, None)
+
+            else:
+                tree[name] = (self._store(b"blob", change.encode()), self.FILE_MODE, None)
+
+        if len(tree) == 0:
+            return None
+
+        # GIT orders tree entries as if the names of sub-trees ended with a slash
+        def sort_key(item):
+            name, (binsha, mode, obj) = item
+            return name.encode() + (b"/" if mode == self.TREE_MODE else b"")
+
+        stream = BytesIO()
+        tree_to_stream([(binsha, mode, name) for name, (binsha, mode, obj) in sorted(tree.items(), key=sort_key)],
+                       stream.write)
+        return self._store(b"tree", stream.getvalue())
+
+    def commit_changes(self, message: str) -> str or None:
+        """ Commits the pending changes on top of the commit this writer was created from.
+
+            Returns the new commit's sha, or None if there was nothing to commit. Raises
+            TreeUpdateConflictError if the branch has moved since the writer was created. """
+        if len(self.changes) == 0:
+            return None
+
+        with Tracer.span("write trees", files=len(self.changes)):
+            binsha = self._write_tree(self._get_entries(), self._group_changes())
+        tree_sha = binsha.hex() if binsha is not None else self._store(b"tree", b"").hex()
+
+        if self.tree is not None and tree_sha == self.tree.hexsha:
+            return None
+
+        parents = ["-p", self.commit.hexsha] if self.commit is not None else []
+        commit_sha = self.repo.git.commit_tree(tree_sha, *parents, "-m", message)
+
+        # The local branch must still be where it was read from. If the tree came from the remote's
+        # branch then the local branch must still not exist
+        ref = self.ref if self.ref.startswith("refs/") else f"refs/heads/{self.ref}"
+        expected = self.commit.hexsha if self.resolved_rev == self.ref else ""
+
+        try:
+            self.repo.git.update_ref("-m", message, ref, commit_sha, expected)
+        except GitCommandError as e:
+            raise TreeUpdateConflictError(f"{ref} was updated by someone else while writing to it.") from e
+
+        self.changes = {}
+        self.commit = self.repo.commit(commit_sha)
+        self.tree = self.commit.tree
+        self.resolved_rev = self.ref
+        self._entries = None
+        self.cache.validate(commit_sha)
+        return commit_sha
+
+
+class TreeCache(object):
+    """ Holds what has been read from one commit of the issue branch: its top level entries, the objects
+        found at each path and the objects parsed from each blob. Parsed objects are keyed by blob sha and
+        each caller is handed its own copy, two levels deep: the object, its lists and dicts, and the objects
+        held in its lists (e.g. a tracker's UUIDTracks) are copied, so all of those may be changed. Anything
+        deeper, or held directly in a field (e.g. an issue's assignee), is shared and is replaced rather than
+        changed in place.
+
+        There is one cache per repository (shared by its worktrees). Everything in it is dropped as soon
+        as the issue branch is seen to have moved on to another commit. """
+
+    _caches = {}
+    _caches_lock = Lock()
+
+    def __init__(self):
+        self.commit_sha = None
+        self.entries = None
+        self.paths = {}
+        self.objects = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+
+    @classmethod
+    def obtain_cache(cls, repo: Repo):
+        with cls._caches_lock:
+            key = repo.common_dir
+            if key not in cls._caches:
+                cls._caches[key] = TreeCache()
+
+            return cls._caches[key]
+
+    @classmethod
+    def get_statistics(cls) -> (int, int):
+        """ The hits and misses of every repository's cache put together. """
+        with cls._caches_lock:
+            caches = list(cls._caches.values())
+
+        return sum(cache.hits for cache in caches), sum(cache.misses for cache in caches)
+
+    def validate(self, commit_sha: str or None):
+        with self._lock:
+            if commit_sha == self.commit_sha:
+                return
+
+            self.commit_sha = commit_sha
+            self.entries = None
+            self.paths = {}
+            self.objects = {}
+
+    def get_entries(self, commit_sha: str or None) -> dict or None:
+        """ The top level entries of the given commit, if they're cached. """
+        with self._lock:
+            return self.entries if commit_sha == self.commit_sha else None
+
+    def store_entries(self, commit_sha: str or None, entries: dict):
+        """ Caches the top level entries of the given commit. They're dropped if another thread has moved the
+            cache on to another commit since they were read. """
+        with self._lock:
+            if commit_sha == self.commit_sha:
+                self.entries = entries
+
+    def get_path(self, commit_sha: str or None, path: str) -> (bool, object):
+        """ Returns whether the object at the path of the given commit is cached, along with the object (which
+            is None if there's nothing at the path). """
+        with self._lock:
+            if commit_sha != self.commit_sha or path not in self.paths:
+                return False, None
+
+            return True, self.paths[path]
+
+    def store_path(self, commit_sha: str or None, path: str, obj):
+        with self._lock:
+            if commit_sha == self.commit_sha:
+                self.paths[path] = obj
+
+    def get_object(self, sha: str, load: Callable[[], object]):
+        """ Returns a copy of the object parsed from the blob, parsing it with load if it isn't cached. The
+            blob is parsed under the lock, so that threads asking for the same blob at once parse it once. """
+        with self._lock:
+            obj = self.objects.get(sha)
+
+            if obj is None:
+                self.misses += 1
+                obj = load()
+                self.objects[sha] = obj
+            else:
+                self.hits += 1
+
+        return self._copy(obj)
+
+    @staticmethod
+    def _copy_shallow(obj):
+        # Parsed objects are plain classes, so this skips the protocol copy.copy goes through, which is most of
+        # what a copy costs
+        if not hasattr(obj, "__dict__"):
+            return obj
+
+        copied = object.__new__(type(obj))
+        copied.__dict__ = obj.__dict__.copy()
+        return copied
+
+    @classmethod
+    def _copy(cls, obj):
+        # A copy.deepcopy costs more than parsing the blob again, which would leave nothing to gain from caching
+        if type(obj) is list:
+            return [cls._copy_shallow(o) for o in obj]
+
+        if not hasattr(obj, "__dict__"):
+            return obj
+
+        obj = cls._copy_shallow(obj)
+        for name, value in obj.__dict__.items():
+            if type(value) is list:
+                obj.__dict__[name] = [cls._copy_shallow(o) for o in value]
+            elif type(value) is dict:
+                obj.__dict__[name] = dict(value)
+
+        return obj
+
+
+def read_blobs(repo: Repo, shas: [str]) -> dict:
+    """ Reads many blobs through a single "git cat-file --batch", writing every sha to it at once rather than
+        waiting on each blob in turn. Returns the data of each blob by its sha, leaving out any that are missing. """
+    shas = list(dict.fromkeys(shas))
+    if len(shas) == 0:
+        return {}
+
+    with Tracer.span("git cat-file", "git", command_line="git cat-file --batch", blobs=len(shas)):
+        process = subprocess.run(["git", f"--git-dir={repo.git_dir}", "cat-file", "--batch"],
+                                 input="\n".join(shas).encode() + b"\n", stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE)
+    if process.returncode != 0:
+        raise GitCommandError(["git", "cat-file", "--batch"], process.returncode, process.stderr)
+
+    output = process.stdout
+    blobs = {}
+    pos = 0
+
+    while pos < len(output):
+        end = output.index(b"\n", pos)
+        header = output[pos:end].split()
+        pos = end + 1
+
+        if len(header) < 3:
+            # "<sha> missing"
+            continue
+
+        size = int(header[2])
+        blobs[header[0].decode()] = output[pos:pos + size]
+        pos += size + 1
+
+    return blobs
+
+
+class TreeUpdateConflictError(Exception):
+    pass
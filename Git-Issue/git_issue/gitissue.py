@@ -2,23 +2,15 @@
 
 import sys
 
-
 sys.path.append(f"{__file__}/../..")
 
-from git_issue.git_utils.merge_utils import GitMerge
-
 import argparse
-import git_issue.issue.handler as issue_handler
-from git_issue.issue.handler import IssueHandler
-from git_issue.git_manager import GitManager
-from git_issue.issue.issue import Issue
-from git_issue.gituser import GitUser
-from git_issue.comment.comment import Comment
-from git_issue.comment.handler import CommentHandler
 
-# Arguments start here
-from git_issue.git_utils.sync_utils import GitSynchronizer
+# Each command imports what it needs when it's run, so that e.g. "show" never loads the merging and syncing
+# code, and "--help" doesn't even load GitPython
+from git_issue.utils.trace_utils import Tracer
 
+# Arguments start here
 parser = argparse.ArgumentParser(prog='git issue')
 
 
@@ -29,8 +21,16 @@ class DisplayVersion(argparse.Action):
 
 
 parser.add_argument('--version', help='Displays the version of this program.', action=DisplayVersion, nargs='?')
+parser.add_argument('--keep-loaded', help='Keeps the issue worktree loaded after the command so that later '
+                                          'commands given this flag can reuse it. Remove it with the "unload" command.',
+                    action='store_true')
+parser.add_argument('--profile', help='Prints where the command spent its time, as a tree of the GIT commands, '
+                                      'JSON reads and writes and workflow phases it went through.',
+                    action='store_true')
+parser.add_argument('--profile-trace', metavar='FILE', help='Writes where the command spent its time to FILE as '
+                                                            'Chrome trace events, for chrome://tracing or Perfetto.')
 
-subparser = parser.add_subparsers()
+subparser = parser.add_subparsers(dest='command')
 
 # Sub-parsers defined here
 createParser = subparser.add_parser('create', help='Create a new issue.')
@@ -39,13 +39,19 @@ commentParser = subparser.add_parser('comment', help='Add a comment an existing
 showParser = subparser.add_parser('show', help="""Show the information for a given issue.
         If no issue is given, a list of issues will be shown as if you called the "list" command.""")
 listParser = subparser.add_parser('list', help='List known issues.')
+searchParser = subparser.add_parser('search', help='Lists the issues whose summary, description or comments '
+                                                   'contain every word of the query.')
 # subscribeParser = subparser.add_parser('subscribe', help='Subscribe to an existing issue.')
 # unsubscribeParser = subparser.add_parser('unsubscribe', help='Unsubscribe from an existing issue.')
 
 # Synchronisation parsers
 pushParser = subparser.add_parser('push', help='Push the issue branch to its remote.')
 pullParser = subparser.add_parser('pull', help='Pull from remote issue branch.')
+syncParser = subparser.add_parser('sync', help='Brings in the remote\'s issue branch and pushes local changes to it.')
 mergeParser = subparser.add_parser('merge', help='Attempts to resolve any merge conflicts that have arose.')
+unloadParser = subparser.add_parser('unload', help='Removes an issue worktree that has been kept loaded.')
+serveParser = subparser.add_parser('serve', help='Keeps git issue running for this repository, so that later '
+                                                 'commands are run by it rather than starting from scratch.')
 
 # status shorthands
 openIssueParser = subparser.add_parser('open', help='Sets the status of the given issue to "Open"')
@@ -58,6 +64,8 @@ inProgressParser.add_argument("issue", nargs=1)
 
 
 def confirm_operation(issue, operation):
+    from git_issue.issue.handler import IssueHandler
+
     print("Operation will result in the following issue:\n")
     handler = IssueHandler()
     handler.display_issue(issue)
@@ -76,6 +84,10 @@ def confirm_operation(issue, operation):
 
 # Default methods for sub-parsers. These methods will be called when the keyword for the sub-parser is given.
 def create(args):
+    from git_issue.gituser import GitUser
+    from git_issue.issue.handler import IssueHandler
+    from git_issue.issue.issue import Issue
+
     issue = Issue()
     issue.summary = args.summary
     issue.description = args.description
@@ -84,7 +96,7 @@ def create(args):
     issue.subscribers.append(GitUser())
 
     def operation():
-        handler = GitManager().perform_git_workflow(lambda: IssueHandler())
+        handler = IssueHandler()
         new_issue = handler.store_issue(issue, "creation", True, True)
         print(f"ID of newly created issue: {new_issue.id}")
 
@@ -92,15 +104,17 @@ def create(args):
 
 
 def edit(args):
-    handler = GitManager().perform_git_workflow(lambda: IssueHandler())
-    if not handler.does_issue_exist(args.issue):
+    import git_issue.issue.handler as issue_handler
+    from git_issue.gituser import GitUser
+    from git_issue.issue.handler import IssueHandler
+
+    issue = issue_handler.get_issue(args.issue)
+
+    if issue is None:
         print("Error: Issue does not exist")
         return
 
-    issue = handler.get_issue_from_issue_id(args.issue)
-
-    if (issue == None):
-        print("There was a problem ")
+    handler = IssueHandler()
 
     print("Issue before editing:")
     handler.display_issue(issue)
@@ -116,13 +130,16 @@ def edit(args):
 
 
 def change_status(issue_id, status):
-    handler = GitManager().perform_git_workflow(lambda: IssueHandler())
+    import git_issue.issue.handler as issue_handler
+    from git_issue.issue.handler import IssueHandler
+
+    issue = issue_handler.get_issue(issue_id)
 
-    if not handler.does_issue_exist(issue_id):
+    if issue is None:
         print("Error: Issue does not exist")
         return
 
-    issue = handler.get_issue_from_issue_id(issue_id)
+    handler = IssueHandler()
     original_status = issue.status
     issue.status = status
     handler.store_issue(issue, "edit")
@@ -130,39 +147,74 @@ def change_status(issue_id, status):
 
 
 def comment(args):
-    ih = GitManager().perform_git_workflow(lambda: IssueHandler())
-    handler = GitManager().perform_git_workflow(lambda: CommentHandler(ih.get_issue_folder_path(args.issue), args.issue))
+    from pathlib import Path
+    import git_issue.issue.handler as issue_handler
+    from git_issue.comment.comment import Comment
+    from git_issue.comment.handler import CommentHandler
+
+    if not issue_handler.does_issue_exist(args.issue):
+        print("Error: Issue does not exist")
+        return
 
     if args.comment:
+        handler = CommentHandler(Path(args.issue), args.issue)
         c = Comment(args.comment)
         handler.add_comment(c)
     else:
-        comments = GitManager().perform_git_workflow(lambda: handler.get_comment_range(10000, 0))
+        comments = issue_handler.get_comment_range(args.issue, 10000, 0)
         for c in comments:
             print(f"Email: {c.user.email}\tDate: {c.date}\n\t{c.comment}\n")
 
 def show(args):
+    import git_issue.issue.handler as issue_handler
+
     if args.issue is not None:
-        handler = GitManager().perform_git_workflow(lambda: IssueHandler())
-        issue = handler.get_issue_from_issue_id(args.issue)
+        issue = issue_handler.get_issue(args.issue)
 
         if issue == None:
             print(f"Issue with ID {args.issue} was not found.")
         else:
-            handler.display_issue(issue)
+            issue.display()
     else:
         list(args)
 
 
 def list(args):
-    handler = GitManager().perform_git_workflow(lambda: IssueHandler())
-    issues = issue_handler.get_all_issues()
+    import git_issue.issue.handler as issue_handler
+    from git_issue.gituser import GitUser
+
+    # "show" falls back to listing without any of the filters
+    assignee = GitUser().email if getattr(args, "mine", False) else getattr(args, "assignee", None)
+    filters = [getattr(args, "status", None), assignee, getattr(args, "reporter", None),
+               getattr(args, "subscriber", None)]
+
+    if not getattr(args, "full", False):
+        for summary in issue_handler.get_issue_summaries(*filters):
+            summary.display()
+        return
+
+    if any(f is not None for f in filters):
+        issues = issue_handler.find_issues(*filters)
+    else:
+        issues = issue_handler.get_all_issues()
+
     for i in issues:
-        handler.display_issue(i)
+        i.display()
+        print()
+
+
+def search(args):
+    import git_issue.issue.handler as issue_handler
+
+    for i in issue_handler.search_issues(" ".join(args.query)):
+        i.display()
         print()
 
 
 def push(args):
+    from git_issue.git_manager import GitManager
+    from git_issue.git_utils.sync_utils import GitSynchronizer
+
     def action():
         sync = GitSynchronizer()
         sync.push()
@@ -172,21 +224,104 @@ def push(args):
 
 
 def pull(args):
+    from git_issue.git_manager import GitManager
+    from git_issue.git_utils.merge_utils import ManualMergeConflictsError
+    from git_issue.git_utils.sync_utils import GitSynchronizer
+
     def action():
         sync = GitSynchronizer()
-        sync.pull(args.with_merge)
+        sync.pull(args.with_merge, partial=args.partial)
         sync = None
     gm = GitManager()
-    gm.perform_git_workflow(action)
+
+    try:
+        gm.perform_git_workflow(action)
+    except ManualMergeConflictsError:
+        report_manual_conflicts()
 
 def merge(args):
+    from git_issue.git_manager import GitManager
+    from git_issue.git_utils.merge_utils import GitMerge, ManualMergeConflictsError
+    from git_issue.git_utils.sync_utils import GitSynchronizer
+
     def action():
         sync = GitSynchronizer()
         sync.merge(GitMerge(sync.repo))
         sync = None
     gm = GitManager()
-    gm.perform_git_workflow(action)
 
+    try:
+        gm.perform_git_workflow(action)
+    except ManualMergeConflictsError:
+        report_manual_conflicts()
+
+
+def report_manual_conflicts():
+    from git_issue.git_manager import GitManager
+
+    if GitManager.is_worktree():
+        print("The issue worktree has been left loaded so that the conflicts resolved so far aren't lost. Run the "
+              "\"merge\" command again once the rest are resolved.")
+
+
+def sync(args):
+    from git_issue.git_utils.daemon_utils import SyncDaemon
+
+    daemon = SyncDaemon(remote=args.remote, fetch_interval=args.fetch_interval, push_delay=args.push_delay,
+                        max_push_delay=args.max_push_delay, partial=args.partial)
+
+    if not args.daemon:
+        # A single pass pushes straight away rather than waiting for more commits
+        daemon.push_delay = 0
+        daemon.step()
+        return
+
+    print(f"Syncing the issue branch with {args.remote}. Press Ctrl+C to stop.")
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        pass
+
+    for name, value in daemon.metrics.to_dict().items():
+        print(f"{name}:\t{value}")
+
+
+def unload(args):
+    from git_issue.git_manager import GitManager
+
+    GitManager().unload_issue_branch(force=True)
+
+
+def serve(args):
+    from git_issue.git_utils.server_utils import IssueClient, IssueServer
+
+    if args.stop:
+        client = IssueClient.find()
+
+        if client is None or not client.stop():
+            print("No server is running for this repository.")
+        else:
+            print("Server stopped.")
+        return
+
+    server = IssueServer(lambda argv: run(parser.parse_args(argv)), idle_timeout=args.idle_timeout)
+
+    try:
+        server.start()
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        return
+
+    print(f"Serving git issue for {server.root} on {server.socket_path}. Press Ctrl+C to stop.")
+    sys.stdout.flush()
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+    print(f"Served {server.commands_run} command(s).")
 
 
 def subscribe(args):
@@ -220,8 +355,19 @@ commentParser.set_defaults(func=comment)
 showParser.add_argument('--issue', '-i', help='Displays the given issue.')
 showParser.set_defaults(func=show)
 
+listParser.add_argument('--status', help='Only lists issues with the given status.')
+listParser.add_argument('--assignee', '-a', help='Only lists issues assigned to the given email.')
+listParser.add_argument('--reporter', '-r', help='Only lists issues reported by the given email.')
+listParser.add_argument('--subscriber', help='Only lists issues the given email is subscribed to.')
+listParser.add_argument('--mine', help='Only lists issues assigned to you.', action='store_true')
+listParser.add_argument('--full', help='Shows every detail of each issue rather than one line per issue.',
+                        action='store_true')
 listParser.set_defaults(func=list)
 
+searchParser.add_argument('query', nargs='+', help='The words to search for. End a word with "*" to match any word '
+                                                   'starting with it.')
+searchParser.set_defaults(func=search)
+
 # subscribeParser.add_argument('--issue', '-i', help='The issue to subscribe to.', required=True)
 # subscribeParser.set_defaults(func=subscribe)
 #
@@ -232,14 +378,108 @@ openIssueParser.set_defaults(func=lambda x: change_status(x.issue[0], "Open"))
 closeIssueParser.set_defaults(func=lambda x: change_status(x.issue[0], "Closed"))
 inProgressParser.set_defaults(func=lambda x: change_status(x.issue[0], "In Progress"))
 
+partial_help = 'Leaves the contents of issues on the remote until they\'re read, which later pulls keep doing.'
 pullParser.add_argument('--with-merge', '-m', help='Attempt to resolve merge conflicts that arise', action='store_true')
+pullParser.add_argument('--partial', help=partial_help, action='store_true')
 pullParser.set_defaults(func=pull)
 pushParser.set_defaults(func=push)
+syncParser.add_argument('--daemon', help='Keeps syncing in the background until stopped.', action='store_true')
+syncParser.add_argument('--remote', help='The remote to sync with. Defaults to origin.', default='origin')
+syncParser.add_argument('--fetch-interval', help='Seconds between fetches of the remote. Defaults to 60.',
+                        type=float, default=60.0)
+syncParser.add_argument('--push-delay', help='Seconds the issue branch must be left unchanged before it\'s pushed. '
+                                             'Defaults to 5.', type=float, default=5.0)
+syncParser.add_argument('--max-push-delay', help='The most seconds a commit waits to be pushed. Defaults to 60.',
+                        type=float, default=60.0)
+syncParser.add_argument('--partial', help=partial_help, action='store_true')
+syncParser.set_defaults(func=sync)
 mergeParser.set_defaults(func=merge)
+unloadParser.set_defaults(func=unload)
+serveParser.add_argument('--idle-timeout', help='Stops the server once it has gone this many seconds without a '
+                                                'command. By default it runs until stopped.', type=float)
+serveParser.add_argument('--stop', help='Stops the server running for this repository.', action='store_true')
+serveParser.set_defaults(func=serve)
+
+# Commands always run in their own process: ones that run for a long time or may need the terminal (e.g. for
+# GIT to ask for credentials), and the ones looking after the server or the kept-loaded worktree themselves
+LOCAL_COMMANDS = ["serve", "sync", "push", "pull", "merge", "unload"]
+
+# Commands that ask for confirmation. They're only handed to a server when their answers are piped in
+INTERACTIVE_COMMANDS = ["create", "edit"]
+
+def report_profile(args, spans):
+    from git_issue.utils.trace_utils import format_profile, write_chrome_trace
+
+    if args.profile:
+        print(f"\nProfile of git issue {args.command}:", file=sys.stderr)
+        print(format_profile(spans), file=sys.stderr)
 
-args = parser.parse_args()
-if hasattr(args, "func"):
-    args.func(args)
-else:
-    print("Command not recognised. Try --help or -h to view a list of accepted commands.")
+    if args.profile_trace is not None:
+        write_chrome_trace(spans, args.profile_trace)
+        print(f"Trace written to {args.profile_trace}", file=sys.stderr)
+
+
+def forward(args, argv) -> int or None:
+    """ Hands the command to the repository's server, if one is running. Returns the command's exit status, or
+        None if it must be run in this process. """
+    if args.command is None or args.command in LOCAL_COMMANDS or args.keep_loaded:
+        return None
+
+    from git_issue.git_utils.server_utils import IssueClient
+
+    client = IssueClient.find()
+    if client is None:
+        return None
+
+    stdin = ""
+    if args.command in INTERACTIVE_COMMANDS:
+        if sys.stdin is None or sys.stdin.isatty():
+            return None
+        stdin = sys.stdin.read()
+
+    status = client.run(argv, stdin)
+
+    # The answers have been read, so if no server took the command they're put back for it to read here instead
+    if status is None and args.command in INTERACTIVE_COMMANDS:
+        import io
+        sys.stdin = io.StringIO(stdin)
+
+    return status
+
+
+def run(args):
+    """ Runs the command in this process. """
+    profiling = args.profile or args.profile_trace is not None
+
+    if args.keep_loaded:
+        from git_issue.git_manager import GitManager
+        GitManager.keep_loaded = True
+
+    if profiling:
+        Tracer.start_recording()
+
+    if hasattr(args, "func"):
+        try:
+            with Tracer.span(f"git issue {args.command}", "command"):
+                args.func(args)
+        finally:
+            if profiling:
+                report_profile(args, Tracer.stop_recording())
+    else:
+        print("Command not recognised. Try --help or -h to view a list of accepted commands.")
+
+
+def main(argv=None):
+    argv = argv if argv is not None else sys.argv[1:]
+    args = parser.parse_args(argv)
+
+    status = forward(args, argv)
+    if status is not None:
+        sys.exit(status)
+
+    run(args)
 # Arguments end here
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,69 @@
-from git_issue.git_manager import GitManager
-from git_issue.utils.json_utils import JsonConvert
+from pathlib import Path
+from threading import Lock
+
+from git.config import get_config_path
+
+from git_issue.git_manager import GitManager, RepoHandler
+from git_issue.git_utils.contributor_utils import ContributorDirectory
+from git_issue.utils.json_utils import JsonConvert, JsonSchema
 import os
 
+
+class IdentityCache(object):
+    """ Remembers the current user's name and email for each directory they've been asked for from, so GIT's
+        config is only read the first time. Afterwards the config files are just checked for changes (by their
+        modification times), and are read again if any of them has changed. """
+
+    _identities = {}
+    _lock = Lock()
+
+    @staticmethod
+    def _get_config_paths(repo) -> [str]:
+        levels = [get_config_path(level) for level in ("system", "user", "global")]
+        return levels + [os.path.join(repo.common_dir, "config"), os.path.join(repo.git_dir, "config.worktree")]
+
+    @staticmethod
+    def _get_stamp(paths: [str]) -> tuple:
+        stamp = []
+
+        for path in paths:
+            try:
+                stamp.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                stamp.append(None)
+
+        return tuple(stamp)
+
+    @classmethod
+    def obtain_identity(cls, repo=None) -> (str, str):
+        """ Returns the current user's (name, email). """
+        key = repo.git_dir if repo is not None else str(RepoHandler.get_root())
+        identity = cls._identities.get(key)
+
+        if identity is not None:
+            paths, stamp, name, email = identity
+            if cls._get_stamp(paths) == stamp:
+                return name, email
+
+        repo = repo if repo is not None else GitManager.obtain_repo()
+        paths = cls._get_config_paths(repo)
+        stamp = cls._get_stamp(paths)
+
+        reader = repo.config_reader()
+        name = reader.get_value("user", "name")
+        email = reader.get_value("user", "email")
+
+        with cls._lock:
+            cls._identities[key] = (paths, stamp, name, email)
+
+        return name, email
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._identities = {}
+
+
 @JsonConvert.register
 class GitUser(object):
     """description of class"""
@@ -22,31 +84,16 @@ class GitUser(object):
             self.email = email
 
     def _get_current_user(self, repo=None):
-        repo = GitManager.obtain_repo()
-
-        reader = repo.config_reader()
-        self.user = reader.get_value("user", "name")
-        self.email = reader.get_value("user", "email")
+        self.user, self.email = IdentityCache.obtain_identity(repo)
 
     @staticmethod
     def from_email(email):
-        repo = GitManager.obtain_repo()
-        
-        #repo.git.shortlog(se)...
-
-        """ To get all contributors we need to query git's CLI directly and
-            analyse the shortlog. The command "git shortlog -se" will give all
-            contributors names and email addresses in the format of:
-            1\tUser <email>\n - and repeats like this until the end."""
-        shortlog = repo.git.shortlog("-se")
-        if shortlog != "":
-            for line in shortlog.split("\n"):
-                str = line.split("\t")[1]
-                temp = str.split(" <")
-                if (temp[1].replace(">", "") == email):
-                    return GitUser(temp[0], email)
-
-        return None
+        """ Finds a contributor's name from the email they have committed with, using the repository's
+            contributor directory rather than analysing "git shortlog -se" each time. """
+        directory = ContributorDirectory.obtain(GitManager.obtain_repo())
+        name = directory.get_name(email)
+
+        return GitUser(name, email) if name is not None else None
 
     def __eq__(self, o: object) -> bool:
         if type(o) is not GitUser:
@@ -56,3 +103,5 @@ class GitUser(object):
 
         return self.email == o.email
 
+
+user_schema = JsonSchema(GitUser)
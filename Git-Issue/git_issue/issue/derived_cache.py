@@ -0,0 +1,348 @@
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from copy import copy
+from threading import Lock
+
+from git import Repo, GitCommandError
+
+from git_issue.git_manager import RepoHandler
+from git_issue.git_utils.tree_utils import IssueTree
+from git_issue.issue.tracker import Tracker
+from git_issue.utils.trace_utils import Tracer
+
+
+def issue_sort_key(id: str):
+    """ Orders issue IDs by their number, so ISSUE-10 comes after ISSUE-9 rather than ISSUE-1. """
+    prefix, _, number = str(id).rpartition("-")
+    return (prefix, int(number)) if number.isdigit() else (str(id), -1)
+
+
+class DerivedCache(ABC):
+    """
+        A local cache of something derived from the issues on the issue branch, e.g. an index on their status.
+        It's stored as JSON in GIT's directory, so it is shared by every worktree and is never committed or merged.
+
+        The cache remembers the commit it was built from. Catching up with the issue branch only reads the
+        issues that changed between that commit and the tip (found with "git diff-tree"), so the cost depends
+        on how much has changed rather than how many issues there are. A full rebuild only happens the
+        first time, or if the old commit can no longer be found.
+
+        Writes made by this process move the cache on without reading anything back from the branch (see
+        record_issues). Rather than rewriting the whole file, the entries of the issues that changed are appended
+        to a journal kept next to it, which is replayed on top of the file when it's loaded. Once the journal
+        holds JOURNAL_LIMIT writes the whole cache is stored again and the journal emptied.
+
+        Subclasses say what's kept per issue through _clear, _add_issue and _remove_issue, what's stored through
+        _to_dict and _from_dict, and what's journalled for one issue through _get_entry and _add_entry. Caches
+        kept in memory copy what a write changes through _copy_data. Caches that aren't kept as JSON override
+        load, store and store_changes instead.
+    """
+
+    NAME = None
+    VERSION = 1
+    # Whether the cache is kept in memory between uses, so that it's only read back from the disk once the
+    # issue branch has moved on
+    KEEP_IN_MEMORY = True
+    # How many writes are journalled before the whole cache is stored again
+    JOURNAL_LIMIT = 500
+
+    _locks = {}
+    _locks_lock = Lock()
+    _instances = {}
+
+    # How often obtain found the cache already in memory and up to date, counted for each kind of cache
+    hits = 0
+    misses = 0
+
+    def __init__(self, repo: Repo = None):
+        self.repo = repo if repo is not None else RepoHandler.obtain_repo()
+        self.path = RepoHandler.obtain_cache_dir(self.repo).joinpath(f"{self.NAME}.json")
+        self.commit_sha = None
+        self._journalled = 0
+        self._clear()
+
+    @abstractmethod
+    def _clear(self):
+        pass
+
+    @abstractmethod
+    def _add_issue(self, issue):
+        pass
+
+    @abstractmethod
+    def _remove_issue(self, id: str):
+        pass
+
+    def _to_dict(self) -> dict:
+        """ What is stored by the default JSON storage. """
+        return {}
+
+    def _from_dict(self, data: dict):
+        """ Restores what _to_dict gave to the default JSON storage. """
+        pass
+
+    def _get_entry(self, id: str):
+        """ What is journalled for the issue, or None if the cache holds nothing for it. """
+        raise NotImplementedError()
+
+    def _add_entry(self, id: str, entry):
+        """ Restores what _get_entry gave for an issue that isn't in the cache. """
+        raise NotImplementedError()
+
+    def _copy_data(self):
+        """ Replaces whatever _add_issue and _remove_issue change with copies of it, once the cache has been
+            copied by _copy. """
+        pass
+
+    def _copy(self):
+        """ A copy of the cache that can be moved on without changing this one, which may still be in use. """
+        cache = copy(self)
+        cache._copy_data()
+        return cache
+
+    def _get_journal_path(self):
+        return self.path.with_name(f"{self.path.name}.log")
+
+    @classmethod
+    def _get_key(cls, repo: Repo) -> str:
+        return f"{repo.common_dir}:{cls.NAME}"
+
+    @classmethod
+    def _obtain_lock(cls, repo: Repo) -> Lock:
+        with cls._locks_lock:
+            return cls._locks.setdefault(cls._get_key(repo), Lock())
+
+    @classmethod
+    @contextmanager
+    def _hold_lock(cls, repo: Repo):
+        """ Holds the cache's lock, tracing how long it took to get it. """
+        lock = cls._obtain_lock(repo)
+        start = time.perf_counter()
+        lock.acquire()
+        Tracer.record("wait for lock", "lock", start, time.perf_counter(), lock=cls.NAME)
+
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def load(self):
+        try:
+            with Tracer.span("json read", "json", path=self.path), open(self.path, 'r') as file:
+                data = json.load(file)
+        except (IOError, ValueError):
+            return
+
+        if data.get("version") != self.VERSION:
+            return
+
+        self.commit_sha = data.get("commit")
+        self._from_dict(data.get("data", {}))
+        self._replay_journal()
+
+    def _replay_journal(self):
+        """ Applies the journalled writes that follow on from the commit that was loaded. Writes made on top of
+            any other commit (e.g. ones journalled before the whole cache was last stored) are skipped. """
+        try:
+            with open(self._get_journal_path(), 'r') as file:
+                lines = file.readlines()
+        except IOError:
+            return
+
+        for line in lines:
+            try:
+                write = json.loads(line)
+            except ValueError:
+                # A write that was cut short
+                continue
+
+            self._journalled += 1
+
+            if write.get("parent") != self.commit_sha:
+                continue
+
+            for id in write.get("removed", []):
+                self._remove_issue(id)
+
+            for id, entry in write.get("entries", []):
+                self._remove_issue(id)
+                self._add_entry(id, entry)
+
+            self.commit_sha = write.get("commit")
+
+    def store_changes(self, parent_sha: str, ids: [str]):
+        """ Stores the move from the parent commit to the cache's commit, which changed the given issues. """
+        if self._journalled >= self.JOURNAL_LIMIT:
+            self.store()
+            return
+
+        entries = []
+        removed = []
+
+        for id in ids:
+            entry = self._get_entry(id)
+
+            if entry is None:
+                removed.append(id)
+            else:
+                entries.append([id, entry])
+
+        write = {"parent": parent_sha, "commit": self.commit_sha, "entries": entries, "removed": removed}
+
+        # Each write is a single line appended in one go, so a reader sees all of it or (if it was cut short)
+        # a line it skips
+        with Tracer.span("json write", "json", path=self._get_journal_path()), \
+                open(self._get_journal_path(), 'a') as file:
+            file.write(json.dumps(write, separators=(",", ":")) + "\n")
+
+        self._journalled += 1
+
+    def store(self):
+        data = {"version": self.VERSION, "commit": self.commit_sha, "data": self._to_dict()}
+
+        # Written to the side and moved into place, so that a reader never sees half a file
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with Tracer.span("json write", "json", path=self.path), open(tmp_path, 'w') as file:
+            json.dump(data, file, separators=(",", ":"))
+        os.replace(str(tmp_path), str(self.path))
+
+        # Everything journalled is now in the file
+        try:
+            os.remove(str(self._get_journal_path()))
+        except OSError:
+            pass
+
+        self._journalled = 0
+
+    def _get_changed_paths(self, tree: IssueTree) -> [str] or None:
+        """ The paths changed since the cache was built, or None if it needs rebuilding. """
+        if self.commit_sha is None:
+            return None
+
+        try:
+            paths = self.repo.git.diff_tree("-r", "--name-only", "--no-renames", self.commit_sha, tree.commit.hexsha)
+        except GitCommandError:
+            return None
+
+        return paths.splitlines()
+
+    def _apply_changes(self, tree: IssueTree, paths: [str]):
+        ids = set()
+
+        for path in paths:
+            parts = path.split("/")
+            if len(parts) == 2 and parts[1] == "issue.json":
+                ids.add(parts[0])
+
+        tree.prefetch([f"{id}/issue.json" for id in ids])
+
+        for id in ids:
+            self._remove_issue(id)
+            issue = tree.read_json(f"{id}/issue.json")
+
+            if issue is not None:
+                self._add_issue(issue)
+
+    def _rebuild(self, tree: IssueTree):
+        self._clear()
+
+        ids = tree.list_dirs(f"{Tracker.ISSUE_IDENTIFIER}-*")
+        tree.prefetch([f"{id}/issue.json" for id in ids])
+
+        for id in ids:
+            issue = tree.read_json(f"{id}/issue.json")
+
+            if issue is not None:
+                self._add_issue(issue)
+
+    def refresh(self, tree: IssueTree = None) -> bool:
+        """ Brings the cache up to date with the issue branch. Returns True if anything had to change. """
+        tree = tree if tree is not None else IssueTree(self.repo)
+        tip = tree.commit.hexsha if tree.commit is not None else None
+
+        if tip == self.commit_sha:
+            return False
+
+        with Tracer.span(f"refresh {self.NAME}"):
+            if tip is None:
+                self._clear()
+            else:
+                paths = self._get_changed_paths(tree)
+
+                if paths is None:
+                    self._rebuild(tree)
+                else:
+                    self._apply_changes(tree, paths)
+
+            self.commit_sha = tip
+            self.store()
+        return True
+
+    @classmethod
+    def obtain(cls, repo: Repo = None, tree: IssueTree = None):
+        """ Loads the cache and brings it up to date with the issue branch.
+
+            A cache kept in memory is returned as it is while the branch hasn't moved. Otherwise a new one is
+            loaded and caught up rather than changing the one in memory, which may still be in use. """
+        tree = tree if tree is not None else IssueTree(repo)
+        tip = tree.commit.hexsha if tree.commit is not None else None
+        key = cls._get_key(tree.repo)
+
+        with cls._hold_lock(tree.repo):
+            cache = cls._instances.get(key)
+            if cache is not None and cache.commit_sha == tip:
+                cls.hits += 1
+                return cache
+
+            cls.misses += 1
+
+            cache = cls(tree.repo)
+            cache.load()
+            cache.refresh(tree)
+
+            if cls.KEEP_IN_MEMORY:
+                cls._instances[key] = cache
+
+        return cache
+
+    @classmethod
+    def record_issues(cls, issues: list, commit_sha: str, repo: Repo = None):
+        """ Applies issues that have just been committed in the given commit, without reading anything back
+            from the branch. This is only done if the cache was up to date with the commit's parent; otherwise
+            the cache is left to catch up the next time it's obtained.
+
+            A cache in memory that's up to date with the parent is copied and moved on, and only the changed
+            issues are journalled, so a write costs nothing like loading and storing the whole cache. """
+        repo = repo if repo is not None else RepoHandler.obtain_repo()
+        commit = repo.commit(commit_sha)
+        parents = [parent.hexsha for parent in commit.parents]
+
+        if len(parents) != 1:
+            return
+
+        key = cls._get_key(repo)
+
+        with cls._hold_lock(repo):
+            cache = cls._instances.get(key)
+
+            if cache is not None and cache.commit_sha == parents[0]:
+                cache = cache._copy()
+            else:
+                cache = cls(repo)
+                cache.load()
+
+                if cache.commit_sha != parents[0]:
+                    return
+
+            for issue in issues:
+                cache._remove_issue(issue.id)
+                cache._add_issue(issue)
+
+            cache.commit_sha = commit.hexsha
+            cache.store_changes(parents[0], [issue.id for issue in issues])
+
+            if cls.KEEP_IN_MEMORY:
+                cls._instances[key] = cache
@@ -1,9 +1,20 @@
 from pathlib import Path
-from git_issue.git_manager import GitManager
+from git_issue.git_manager import GitManager, RepoHandler
 from git_issue.issue.issue import Issue
 from git_issue.utils.json_utils import JsonConvert
 from git_issue.issue.tracker import Tracker
 from git_issue.comment.handler import CommentHandler
+from git_issue.git_utils.tree_utils import IssueTree
+from git_issue.issue.secondary_index import SecondaryIndex
+from git_issue.issue.search_index import SearchIndex
+from git_issue.issue.issue_manifest import IssueManifest
+from git_issue.issue.issue_summaries import IssueSummaries
+from git_issue.utils.trace_utils import traced
+
+
+# The local caches kept in step with the issue branch as issues are stored. The search index isn't one of them, as
+# it's only caught up when searching
+DERIVED_CACHES = [SecondaryIndex, IssueManifest, IssueSummaries]
 
 
 class IssueHandler(object):
@@ -21,7 +32,7 @@ class IssueHandler(object):
 
     @staticmethod
     def _generate_issue_folder_path(id):
-        dir = Path.cwd()
+        dir = RepoHandler.get_root()
 
         gm = GitManager()
         if dir.parts[-1] != "issue" and gm.is_worktree():
@@ -30,7 +41,7 @@ class IssueHandler(object):
         return dir.joinpath(id)
 
     def _generate_issue_file_path(self, id):
-        return Path.cwd().joinpath(f"{self._generate_issue_folder_path(id)}/issue.json")
+        return RepoHandler.get_root().joinpath(f"{self._generate_issue_folder_path(id)}/issue.json")
 
     def get_issue_path(self, issue: Issue):
         return self._generate_issue_file_path(issue.id)
@@ -38,7 +49,23 @@ class IssueHandler(object):
     def get_issue_folder_path(self, id):
         return self._generate_issue_folder_path(id)
 
+    @traced("store issue")
     def store_issue(self, issue, cmd, generate_id=False, store_tracker=False):
+        gm = GitManager()
+
+        if gm.is_worktree_required():
+            stored = self._store_issue_in_worktree(gm, issue, cmd, generate_id, store_tracker)
+        else:
+            stored = self._store_issue_in_tree(gm, issue, cmd, generate_id, store_tracker)
+
+        # Keep the local indexes in step with the commit that was just made, so they needn't look it up
+        if gm.last_commit_sha is not None:
+            for cache in DERIVED_CACHES:
+                cache.record_issues([stored], gm.last_commit_sha)
+
+        return stored
+
+    def _store_issue_in_worktree(self, gm, issue, cmd, generate_id, store_tracker):
         def gen_paths():
             return [str(self._generate_issue_file_path(issue.id))]
     
@@ -54,9 +81,28 @@ class IssueHandler(object):
 
             return issue
 
-        gm = GitManager()
         return gm.perform_git_workflow(action, True, gen_paths, cmd, issue.id)
 
+    def _store_issue_in_tree(self, gm, issue, cmd, generate_id, store_tracker):
+        def action(writer):
+            # The tracker is read from the same commit that's written on top of, so that an ID is never
+            # handed out twice should another writer move the branch on first
+            if generate_id or store_tracker:
+                self.tracker = Tracker.obtain_tracker(writer)
+
+            if generate_id:
+                issue.id = self.generate_issue_id()
+
+            writer.write_json(_generate_issue_tree_path(issue.id), issue)
+            self.tracker.track_or_update_uuid(issue.uuid, issue.id)
+
+            if store_tracker:
+                self.tracker.store_tracker(writer)
+
+            return issue
+
+        return gm.perform_tree_workflow(action, cmd, lambda: issue.id)
+
     def get_issue_from_uuid(self, uuid):
         id = self.tracker.get_issue_from_uuid(uuid)
         return self.get_issue_from_issue_id(id)
@@ -119,22 +165,40 @@ class IssueHandler(object):
 
         return exists
 
-    def get_issue_range(self, page: int = 1, limit: int = 10):
-        gm = GitManager()
+    @traced("get issue range")
+    def get_issue_range(self, page: int = 1, limit: int = 10, by_date: bool = False):
+        start_pos = (page - 1) * limit
+        end = start_pos + limit
 
-        def action():
-            start_pos = (page - 1) * limit
-            end = start_pos + limit
+        tree = IssueTree()
+        manifest = IssueManifest.obtain(tree=tree)
+        range = manifest.get_range(start_pos, end, by_date)
+        return [tree.read_json(_generate_issue_tree_path(i)) for i in range], manifest.get_count()
 
-            path = Path.cwd()
-            dirs = [d for d in path.iterdir() if d.is_dir() and d.match("ISSUE-*")]
-            range = dirs[start_pos: end]
-            return [JsonConvert.FromFile(_generate_issue_file_path(i.parts[-1])) for i in range], len(dirs)
+    @traced("find issue range")
+    def find_issue_range(self, page: int = 1, limit: int = 10, status: str = None, assignee: str = None,
+                         reporter: str = None, subscriber: str = None):
+        start_pos = (page - 1) * limit
+        end = start_pos + limit
+
+        tree = IssueTree()
+        ids = SecondaryIndex.obtain(tree=tree).find(status, assignee, reporter, subscriber)
+        range = ids[start_pos: end]
+        return [tree.read_json(_generate_issue_tree_path(i)) for i in range], len(ids)
+
+    @traced("search issue range")
+    def search_issue_range(self, query: str, page: int = 1, limit: int = 10):
+        start_pos = (page - 1) * limit
+        end = start_pos + limit
+
+        tree = IssueTree()
+        ids = search_issue_ids(query, tree)
+        range = ids[start_pos: end]
+        return [tree.read_json(_generate_issue_tree_path(i)) for i in range], len(ids)
 
-        return gm.perform_git_workflow(action)
 
 def _generate_issue_folder_path(id):
-    dir = Path.cwd()
+    dir = RepoHandler.get_root()
 
     gm = GitManager()
     if dir.parts[-1] != "issue" and gm.is_worktree():
@@ -144,7 +208,7 @@ def _generate_issue_folder_path(id):
 
 
 def _generate_issue_file_path(id):
-    return Path.cwd().joinpath(f"{_generate_issue_folder_path(id)}/issue.json")
+    return RepoHandler.get_root().joinpath(f"{_generate_issue_folder_path(id)}/issue.json")
 
 
 def generate_issue_id():
@@ -152,34 +216,80 @@ def generate_issue_id():
     return "{}-{}".format(tracker.ISSUE_IDENTIFIER, (tracker.issue_count + 1))
 
 
+def _generate_issue_tree_path(id):
+    return f"{id}/issue.json"
+
+
+@traced("does issue exist")
 def does_issue_exist(id):
-    gm = GitManager()
-    return gm.perform_git_workflow(lambda : _generate_issue_file_path(id).exists())
+    return IssueTree().exists(_generate_issue_tree_path(id))
 
 
+@traced("get issue")
 def get_issue(id):
-    gm = GitManager()
-    try:    
-        return gm.perform_git_workflow(lambda: JsonConvert.FromFile(_generate_issue_file_path(id)))
-    except IOError:
-        return None
+    return IssueTree().read_json(_generate_issue_tree_path(id))
 
 
+@traced("get all issues")
 def get_all_issues():
-    gm = GitManager()
+    tree = IssueTree()
+    paths = [_generate_issue_tree_path(i) for i in IssueManifest.obtain(tree=tree).ids]
+    tree.prefetch(paths)
+    issues = [tree.read_json(path) for path in paths]
+    return [issue for issue in issues if issue is not None]
 
-    def action():
-        path = Path.cwd()
-        dirs = [d for d in path.iterdir() if d.is_dir() and d.match("ISSUE-*")]
-        return [JsonConvert.FromFile(_generate_issue_file_path(i.parts[-1])) for i in dirs]
 
-    return gm.perform_git_workflow(action)
+@traced("find issues")
+def find_issues(status: str = None, assignee: str = None, reporter: str = None, subscriber: str = None):
+    """ Returns the issues matching all of the given values, using the local secondary index. """
+    tree = IssueTree()
+    index = SecondaryIndex.obtain(tree=tree)
+    paths = [_generate_issue_tree_path(i) for i in index.find(status, assignee, reporter, subscriber)]
+    tree.prefetch(paths)
+    issues = [tree.read_json(path) for path in paths]
+    return [issue for issue in issues if issue is not None]
 
-def get_comment_range(issue_id, range: int, start_pos: int = 0):
-    gm = GitManager()
 
-    def action():
-        handler = CommentHandler(_generate_issue_folder_path(issue_id), issue_id)
-        return handler.get_comment_range(range, start_pos)
+@traced("get issue summaries")
+def get_issue_summaries(status: str = None, assignee: str = None, reporter: str = None, subscriber: str = None):
+    """ Returns the list view of the issues matching all of the given values, or of every issue, in order. Only the
+        local caches are read, not the issues themselves. """
+    tree = IssueTree()
+
+    if any(f is not None for f in [status, assignee, reporter, subscriber]):
+        ids = SecondaryIndex.obtain(tree=tree).find(status, assignee, reporter, subscriber)
+    else:
+        ids = IssueManifest.obtain(tree=tree).ids
 
-    return gm.perform_git_workflow(action)
\ No newline at end of file
+    return IssueSummaries.obtain(tree=tree).get_summaries(ids)
+
+
+def refresh_derived_caches(repo=None):
+    """ Catches the local caches up with the issue branch, e.g. after a merge has been committed. """
+    tree = IssueTree(repo)
+
+    for cache in DERIVED_CACHES:
+        cache.obtain(tree=tree)
+
+
+def search_issue_ids(query: str, tree: IssueTree = None) -> [str]:
+    """ Returns the IDs of the issues matching the query, best matches first, using the local search index. """
+    index = SearchIndex.obtain(tree=tree)
+
+    try:
+        return index.search(query)
+    finally:
+        index.close()
+
+
+@traced("search issues")
+def search_issues(query: str):
+    tree = IssueTree()
+    issues = [tree.read_json(_generate_issue_tree_path(i)) for i in search_issue_ids(query, tree)]
+    return [issue for issue in issues if issue is not None]
+
+
+@traced("get comment range")
+def get_comment_range(issue_id, range: int, start_pos: int = 0):
+    handler = CommentHandler(Path(issue_id), issue_id, IssueTree())
+    return handler.get_comment_range(range, start_pos)
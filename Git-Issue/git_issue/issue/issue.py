@@ -1,6 +1,6 @@
 from uuid import uuid4
-from git_issue.gituser import GitUser
-from git_issue.utils.json_utils import JsonConvert
+from git_issue.gituser import GitUser, user_schema
+from git_issue.utils.json_utils import JsonConvert, JsonSchema
 from git_issue.utils import date_utils
 
 
@@ -56,4 +56,10 @@ class Issue(object):
             self.subscribers == o.subscribers
 
 
+JsonConvert.register_schema("issue.json", JsonSchema(Issue, {
+    "assignee": user_schema,
+    "reporter": user_schema,
+    "subscribers": [user_schema]
+}, big_ints=True))
+
 status_indicators = ["open", "closed", "in progress"]
\ No newline at end of file
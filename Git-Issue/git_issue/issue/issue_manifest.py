@@ -0,0 +1,79 @@
+from bisect import bisect_left
+
+from git_issue.issue.derived_cache import DerivedCache, issue_sort_key
+
+
+class IssueManifest(DerivedCache):
+    """
+        The IDs of every issue in order of their number, along with the date each was created. Pages of issues
+        are sliced straight out of it, so they're stable and sorted, and cost the same however many issues
+        there are.
+
+        The IDs are stored in order, so loading the manifest never has to sort them.
+    """
+
+    NAME = "issue_manifest"
+
+    def _clear(self):
+        self.ids = []
+        self.dates = {}
+        self._keys = []
+        self._ids_by_date = None
+
+    def _add_issue(self, issue):
+        self._add_entry(issue.id, [issue.date])
+
+    def _remove_issue(self, id: str):
+        if id not in self.dates:
+            return
+
+        pos = bisect_left(self._keys, issue_sort_key(id))
+
+        del self.ids[pos]
+        del self._keys[pos]
+        del self.dates[id]
+        self._ids_by_date = None
+
+    def _to_dict(self) -> dict:
+        return {"issues": [[id, self.dates[id]] for id in self.ids]}
+
+    def _from_dict(self, data: dict):
+        for id, date in data.get("issues", []):
+            self.ids.append(id)
+            self._keys.append(issue_sort_key(id))
+            self.dates[id] = date
+
+    def _get_entry(self, id: str):
+        # Wrapped, as an issue may have no date
+        return [self.dates[id]] if id in self.dates else None
+
+    def _add_entry(self, id: str, entry):
+        if id in self.dates:
+            self._remove_issue(id)
+
+        key = issue_sort_key(id)
+        pos = bisect_left(self._keys, key)
+
+        self.ids.insert(pos, id)
+        self._keys.insert(pos, key)
+        self.dates[id] = entry[0]
+        self._ids_by_date = None
+
+    def _copy_data(self):
+        self.ids = list(self.ids)
+        self._keys = list(self._keys)
+        self.dates = dict(self.dates)
+
+    def get_count(self) -> int:
+        return len(self.ids)
+
+    def get_range(self, start_pos: int, end: int, by_date: bool = False) -> [str]:
+        """ Returns the IDs between the two positions, in order of their number or of their creation date. """
+        if not by_date:
+            return self.ids[start_pos:end]
+
+        # Sorting by date is only done when asked for, and then kept until the manifest changes
+        if self._ids_by_date is None:
+            self._ids_by_date = sorted(self.ids, key=lambda id: self.dates[id] or "")
+
+        return self._ids_by_date[start_pos:end]
@@ -0,0 +1,82 @@
+from git_issue.gituser import GitUser
+from git_issue.issue.derived_cache import DerivedCache, issue_sort_key
+
+
+class IssueSummary(object):
+    """ What's shown of an issue when listing it: its ID, summary, status, assignee and date. """
+
+    def __init__(self, id: str = None, summary: str = None, status: str = None, assignee: GitUser = None,
+                 date: str = None):
+        self.id = id
+        self.summary = summary
+        self.status = status
+        self.assignee = assignee
+        self.date = date
+
+    @classmethod
+    def from_issue(cls, issue):
+        return cls(issue.id, issue.summary, issue.status, issue.assignee, issue.date)
+
+    def display(self):
+        assignee = f"{self.assignee.user} <{self.assignee.email}>" if self.assignee is not None else "Unassigned"
+        print(f"{self.id}\t{self.status}\t{assignee}\t{self.summary}")
+
+
+class IssueSummaries(DerivedCache):
+    """
+        The list view of every issue kept in one compact file, so that listing issues is a single read rather
+        than opening and decoding every issue along with its description and subscribers.
+
+        Each issue is stored as a row of [id, summary, status, assignee's name, assignee's email, date].
+    """
+
+    NAME = "issue_summaries"
+
+    def _clear(self):
+        self.rows = {}
+
+    @staticmethod
+    def _to_row(issue) -> list:
+        assignee = issue.assignee
+        user = getattr(assignee, "user", None) if assignee is not None else None
+        email = getattr(assignee, "email", None) if assignee is not None else None
+        return [issue.id, issue.summary, issue.status, user, email, issue.date]
+
+    @staticmethod
+    def _from_row(row: list) -> IssueSummary:
+        id, summary, status, user, email, date = row
+        # Both parts are given so that building the user never has to look anything up
+        assignee = GitUser(user if user is not None else "", email) if email is not None else None
+        return IssueSummary(id, summary, status, assignee, date)
+
+    def _add_issue(self, issue):
+        self._add_entry(issue.id, self._to_row(issue))
+
+    def _remove_issue(self, id: str):
+        self.rows.pop(id, None)
+
+    def _to_dict(self) -> dict:
+        return {"rows": [self.rows[id] for id in sorted(self.rows, key=issue_sort_key)]}
+
+    def _from_dict(self, data: dict):
+        for row in data.get("rows", []):
+            self.rows[row[0]] = row
+
+    def _get_entry(self, id: str):
+        return self.rows.get(id)
+
+    def _add_entry(self, id: str, row: list):
+        self.rows[id] = row
+
+    def _copy_data(self):
+        # Rows are replaced rather than changed
+        self.rows = dict(self.rows)
+
+    def get_summary(self, id: str) -> IssueSummary or None:
+        row = self.rows.get(id)
+        return self._from_row(row) if row is not None else None
+
+    def get_summaries(self, ids: [str] = None) -> [IssueSummary]:
+        """ Returns the summaries of the given issues, or of every issue in order, skipping any that are unknown. """
+        ids = ids if ids is not None else sorted(self.rows, key=issue_sort_key)
+        return [self._from_row(self.rows[id]) for id in ids if id in self.rows]
@@ -0,0 +1,254 @@
+import sqlite3
+from pathlib import Path
+
+from git_issue.comment.index import Index
+from git_issue.git_utils.tree_utils import IssueTree
+from git_issue.issue.derived_cache import DerivedCache
+from git_issue.issue.tracker import Tracker
+
+
+class SearchIndex(DerivedCache):
+    """
+        A full-text index over the summary and description of every issue and the text of every comment.
+
+        Unlike the other derived caches it's kept in an SQLite database (using its FTS5 extension) rather than
+        JSON, so that it never has to be loaded as a whole. Issues and comments are each indexed as their own
+        rows, which means that changing an issue doesn't re-index its comments and adding a comment doesn't
+        re-index the issue.
+
+        Searching finds the issues whose summary and description, or one of whose comments, contain every word
+        of the query, best matches first. A word ending in "*" matches any word starting with it. If the installed
+        SQLite was built without FTS5, the index falls back to plain tables searched with LIKE. Which of the two
+        the database was built with is recorded in it, and it's built again from scratch if it doesn't match
+        what the SQLite opening it can do (e.g. it was built by another Python).
+    """
+
+    NAME = "search"
+    VERSION = 1
+    # The database is queried where it is, and its connection is closed after each search
+    KEEP_IN_MEMORY = False
+
+    # How much more a match in the summary or description counts for than a match in a comment
+    SUMMARY_WEIGHT = 10.0
+    DESCRIPTION_WEIGHT = 5.0
+
+    # Whether the installed SQLite has FTS5, found out the first time an index is opened
+    _fts_available = None
+
+    def __init__(self, repo=None):
+        self.connection = None
+        self.has_fts = True
+        super().__init__(repo)
+        self.path = self.path.with_suffix(".sqlite")
+
+    def _execute(self, sql: str, params=()):
+        return self.connection.execute(sql, params)
+
+    @classmethod
+    def _is_fts_available(cls) -> bool:
+        if cls._fts_available is None:
+            connection = sqlite3.connect(":memory:")
+
+            try:
+                connection.execute("CREATE VIRTUAL TABLE probe USING fts5(text)")
+                cls._fts_available = True
+            except sqlite3.OperationalError:
+                cls._fts_available = False
+            finally:
+                connection.close()
+
+        return cls._fts_available
+
+    def _connect(self):
+        self.connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _has_table(self, name: str) -> bool:
+        return self._execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone() is not None
+
+    def _open(self):
+        """ Connects to the database, starting a new one if it was built for the other kind of text tables. Those
+            can't be told apart by creating the tables, which does nothing if they exist, and FTS5 tables can't
+            even be dropped by an SQLite without FTS5. """
+        mode = "fts5" if self._is_fts_available() else "like"
+        self._connect()
+
+        built = self._get_meta("mode")
+        if built != mode and (built is not None or self._has_table("issue_text")):
+            self.close()
+            self.path.unlink()
+            self._connect()
+
+        self.has_fts = mode == "fts5"
+        self._create_tables()
+        self._set_meta("mode", mode)
+        self.connection.commit()
+
+    def _create_tables(self):
+        self._execute("CREATE TABLE IF NOT EXISTS issue_rows (rowid INTEGER PRIMARY KEY, issue TEXT UNIQUE)")
+        self._execute("CREATE TABLE IF NOT EXISTS comment_rows (rowid INTEGER PRIMARY KEY, issue TEXT, path TEXT UNIQUE)")
+        self._execute("CREATE INDEX IF NOT EXISTS comment_rows_issue ON comment_rows (issue)")
+
+        if self.has_fts:
+            self._execute("CREATE VIRTUAL TABLE IF NOT EXISTS issue_text USING fts5(summary, description)")
+            self._execute("CREATE VIRTUAL TABLE IF NOT EXISTS comment_text USING fts5(comment)")
+        else:
+            self._execute("CREATE TABLE IF NOT EXISTS issue_text (rowid INTEGER PRIMARY KEY, summary TEXT, description TEXT)")
+            self._execute("CREATE TABLE IF NOT EXISTS comment_text (rowid INTEGER PRIMARY KEY, comment TEXT)")
+
+    def _get_meta(self, key: str) -> str or None:
+        row = self._execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _set_meta(self, key: str, value):
+        self._execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def load(self):
+        if self.connection is None:
+            self._open()
+
+        if self._get_meta("version") != str(self.VERSION):
+            self._clear()
+            self._set_meta("version", str(self.VERSION))
+            self.commit_sha = None
+        else:
+            self.commit_sha = self._get_meta("commit")
+
+    def store(self):
+        self._set_meta("commit", self.commit_sha)
+        self.connection.commit()
+
+    def store_changes(self, parent_sha: str, ids: [str]):
+        # Only the changed rows were written, so storing is already incremental
+        self.store()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def _clear(self):
+        if self.connection is None:
+            return
+
+        for table in ["issue_rows", "comment_rows", "issue_text", "comment_text"]:
+            self._execute(f"DELETE FROM {table}")
+
+    def _add_issue(self, issue):
+        cursor = self._execute("INSERT INTO issue_rows (issue) VALUES (?)", (issue.id,))
+        self._execute("INSERT INTO issue_text (rowid, summary, description) VALUES (?, ?, ?)",
+                      (cursor.lastrowid, issue.summary or "", issue.description or ""))
+
+    def _remove_issue(self, id: str):
+        row = self._execute("SELECT rowid FROM issue_rows WHERE issue = ?", (id,)).fetchone()
+
+        if row is not None:
+            self._execute("DELETE FROM issue_text WHERE rowid = ?", row)
+            self._execute("DELETE FROM issue_rows WHERE rowid = ?", row)
+
+    def _add_comment(self, issue_id: str, path: str, comment):
+        cursor = self._execute("INSERT INTO comment_rows (issue, path) VALUES (?, ?)", (issue_id, path))
+        self._execute("INSERT INTO comment_text (rowid, comment) VALUES (?, ?)",
+                      (cursor.lastrowid, getattr(comment, "comment", None) or ""))
+
+    def _remove_comment(self, path: str):
+        row = self._execute("SELECT rowid FROM comment_rows WHERE path = ?", (path,)).fetchone()
+
+        if row is not None:
+            self._execute("DELETE FROM comment_text WHERE rowid = ?", row)
+            self._execute("DELETE FROM comment_rows WHERE rowid = ?", row)
+
+    @staticmethod
+    def _is_comment_path(parts: [str]) -> bool:
+        return len(parts) == 3 and parts[1] == "comments" and parts[2].endswith(".json")
+
+    def _apply_changes(self, tree: IssueTree, paths: [str]):
+        super()._apply_changes(tree, paths)
+
+        paths = [path for path in paths if self._is_comment_path(path.split("/"))]
+        tree.prefetch(paths)
+
+        for path in paths:
+            self._remove_comment(path)
+            comment = tree.read_json(path)
+
+            if comment is not None:
+                self._add_comment(path.split("/")[0], path, comment)
+
+    def _rebuild(self, tree: IssueTree):
+        super()._rebuild(tree)
+
+        ids = tree.list_dirs(f"{Tracker.ISSUE_IDENTIFIER}-*")
+        tree.prefetch([f"{id}/index.json" for id in ids])
+
+        paths = {}
+        for id in ids:
+            paths[id] = sorted(set(entry.path.replace("\\", "/")
+                                   for entry in Index.obtain_index(Path(id), tree).get_entries()))
+
+        tree.prefetch([path for id in ids for path in paths[id]])
+
+        for id in ids:
+            for path in paths[id]:
+                comment = tree.read_json(path)
+
+                if comment is not None:
+                    self._add_comment(id, path, comment)
+
+    @staticmethod
+    def _get_terms(query: str) -> [str]:
+        return [term for term in query.split() if term.strip("*") != ""]
+
+    def _build_match(self, terms: [str]) -> str:
+        """ Quotes every word, so that nothing the user types is taken as FTS5 syntax. """
+        match = []
+
+        for term in terms:
+            prefix = term.endswith("*")
+            quoted = '"{}"'.format(term.rstrip("*").replace('"', '""'))
+            match.append(f"{quoted}*" if prefix else quoted)
+
+        return " ".join(match)
+
+    def _search_fts(self, terms: [str]) -> [str]:
+        match = self._build_match(terms)
+        sql = f"""
+            SELECT issue FROM (
+                SELECT r.issue AS issue, bm25(issue_text, {self.SUMMARY_WEIGHT}, {self.DESCRIPTION_WEIGHT}) AS rank
+                FROM issue_text JOIN issue_rows r ON r.rowid = issue_text.rowid
+                WHERE issue_text MATCH ?
+                UNION ALL
+                SELECT r.issue AS issue, bm25(comment_text) AS rank
+                FROM comment_text JOIN comment_rows r ON r.rowid = comment_text.rowid
+                WHERE comment_text MATCH ? AND r.issue IN (SELECT issue FROM issue_rows)
+            ) GROUP BY issue ORDER BY min(rank), issue
+        """
+        return [row[0] for row in self._execute(sql, (match, match))]
+
+    def _search_like(self, terms: [str]) -> [str]:
+        """ Without FTS5 there's no ranking, and the words may be spread across the issue and its comments. """
+        conditions = []
+        params = []
+
+        for term in terms:
+            pattern = "%{}%".format(term.rstrip("*").replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_"))
+            conditions.append("""
+                (r.rowid IN (SELECT rowid FROM issue_text WHERE summary LIKE ? ESCAPE '\\' OR description LIKE ? ESCAPE '\\')
+                 OR r.issue IN (SELECT c.issue FROM comment_rows c JOIN comment_text t ON t.rowid = c.rowid
+                                WHERE t.comment LIKE ? ESCAPE '\\'))""")
+            params.extend([pattern, pattern, pattern])
+
+        sql = f"SELECT r.issue FROM issue_rows r WHERE {' AND '.join(conditions)}"
+        return sorted(row[0] for row in self._execute(sql, params))
+
+    def search(self, query: str) -> [str]:
+        """ Returns the IDs of the issues matching the query, best matches first. """
+        terms = self._get_terms(query or "")
+
+        if len(terms) == 0:
+            return []
+
+        if self.has_fts:
+            return self._search_fts(terms)
+
+        return self._search_like(terms)
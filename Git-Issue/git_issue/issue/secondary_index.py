@@ -0,0 +1,99 @@
+from git_issue.issue.derived_cache import DerivedCache, issue_sort_key
+
+
+class SecondaryIndex(DerivedCache):
+    """
+        Maps the values of commonly filtered issue fields to the IDs of the issues that have them, so that
+        questions such as "which open issues are assigned to me" are answered without loading every issue.
+
+        The indexed fields are the status, the assignee's email, the reporter's email and each subscriber's
+        email. Values are compared case-insensitively.
+    """
+
+    NAME = "secondary_index"
+    FIELDS = ["status", "assignee", "reporter", "subscriber"]
+
+    def _clear(self):
+        self.fields = {field: {} for field in self.FIELDS}
+        self.issues = {}
+
+    @staticmethod
+    def _normalise(value) -> str or None:
+        return str(value).strip().lower() if value is not None else None
+
+    @classmethod
+    def _get_email(cls, user) -> str or None:
+        return cls._normalise(getattr(user, "email", None))
+
+    def _get_values(self, issue) -> dict:
+        subscribers = [self._get_email(s) for s in issue.subscribers] if issue.subscribers is not None else []
+
+        values = {
+            "status": [self._normalise(issue.status)],
+            "assignee": [self._get_email(issue.assignee)],
+            "reporter": [self._get_email(issue.reporter)],
+            "subscriber": subscribers
+        }
+
+        return {field: sorted(set(v for v in vals if v is not None)) for field, vals in values.items()}
+
+    def _add_issue(self, issue):
+        self._add_entry(issue.id, self._get_values(issue))
+
+    def _remove_issue(self, id: str):
+        values = self.issues.pop(id, None)
+
+        if values is None:
+            return
+
+        for field, field_values in values.items():
+            for value in field_values:
+                ids = self.fields[field].get(value)
+
+                if ids is not None:
+                    ids.discard(id)
+                    if len(ids) == 0:
+                        del self.fields[field][value]
+
+    def _to_dict(self) -> dict:
+        return {"issues": self.issues}
+
+    def _from_dict(self, data: dict):
+        # Only the per-issue values are stored; the value -> IDs maps are rebuilt from them
+        for id, values in data.get("issues", {}).items():
+            self._add_entry(id, values)
+
+    def _get_entry(self, id: str):
+        return self.issues.get(id)
+
+    def _add_entry(self, id: str, values: dict):
+        self.issues[id] = values
+
+        for field, field_values in values.items():
+            for value in field_values:
+                self.fields[field].setdefault(value, set()).add(id)
+
+    def _copy_data(self):
+        # Each issue's values are replaced rather than changed, so only the maps holding them are copied
+        self.issues = dict(self.issues)
+        self.fields = {field: {value: set(ids) for value, ids in values.items()} for field, values in self.fields.items()}
+
+    def get_values(self, field: str) -> [str]:
+        return sorted(self.fields[field].keys())
+
+    def find(self, status: str = None, assignee: str = None, reporter: str = None, subscriber: str = None) -> [str]:
+        """ Returns the IDs, in order, of the issues matching every one of the given values. """
+        criteria = {"status": status, "assignee": assignee, "reporter": reporter, "subscriber": subscriber}
+        result = None
+
+        for field, value in criteria.items():
+            if value is None:
+                continue
+
+            ids = self.fields[field].get(self._normalise(value), set())
+            result = set(ids) if result is None else result & ids
+
+        if result is None:
+            result = self.issues.keys()
+
+        return sorted(result, key=issue_sort_key)
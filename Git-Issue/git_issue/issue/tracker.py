@@ -1,6 +1,6 @@
 from pathlib import Path
-from git_issue.utils.json_utils import JsonConvert
-from git_issue.git_manager import GitManager
+from git_issue.utils.json_utils import JsonConvert, JsonSchema
+from git_issue.git_manager import GitManager, RepoHandler
 
 @JsonConvert.register
 class UUIDTrack(object):
@@ -24,6 +24,7 @@ class Tracker(object):
     """All non-user tracked settings (i.e program-defined variables) are contained here."""
 
     ISSUE_IDENTIFIER = "ISSUE"
+    FILE_NAME = "tracker.json"
 
     def __init__(self, issue_count=0, tracked_uuids:[UUIDTrack]=None):
         self.issue_count = issue_count
@@ -32,40 +33,87 @@ class Tracker(object):
     def increment_issue_count(self):
         self.issue_count += 1
 
+    def _obtain_lookups(self) -> (dict, dict):
+        """ Maps each uuid, and each issue ID, to its UUIDTrack so that neither has to be found by scanning
+            tracked_uuids. The maps are built the first time they're needed and are kept up to date by the
+            tracker's own methods. They're built again if tracked_uuids was replaced or resized elsewhere. """
+        if getattr(self, "_lookup_source", None) is not self.tracked_uuids \
+                or self._lookup_size != len(self.tracked_uuids):
+            self._by_uuid = {}
+            self._by_issue = {}
+
+            # The first of any duplicates wins, as it would when scanning the list
+            for tracked in self.tracked_uuids:
+                self._by_uuid.setdefault(tracked.uuid, tracked)
+                self._by_issue.setdefault(tracked.issue, tracked)
+
+            self._lookup_source = self.tracked_uuids
+            self._lookup_size = len(self.tracked_uuids)
+
+        return self._by_uuid, self._by_issue
+
     def track_or_update_uuid(self, uuid, issue):
-        for tracked in self.tracked_uuids:
-            if tracked.uuid == uuid:
-                tracked.issue = issue
-                return
+        by_uuid, by_issue = self._obtain_lookups()
+        tracked = by_uuid.get(uuid)
+
+        if tracked is not None:
+            if by_issue.get(tracked.issue) is tracked:
+                del by_issue[tracked.issue]
+
+            tracked.issue = issue
+            by_issue.setdefault(issue, tracked)
+            return
 
         self.increment_issue_count()
-        self.tracked_uuids.append(UUIDTrack(uuid, issue))
+        tracked = UUIDTrack(uuid, issue)
+        self.tracked_uuids.append(tracked)
+        by_uuid[uuid] = tracked
+        by_issue.setdefault(issue, tracked)
+        self._lookup_size += 1
 
     def get_issue_from_uuid(self, uuid):
-        for tracked in self.tracked_uuids:
-            if tracked.uuid == uuid:
-                return tracked.issue
+        tracked = self._obtain_lookups()[0].get(uuid)
+        return tracked.issue if tracked is not None else None
 
-        return None
+    def get_uuid_from_issue(self, issue):
+        tracked = self._obtain_lookups()[1].get(issue)
+
+        # UUIDTracks are shared with copies of the tracker, so one may have been moved to another issue
+        if tracked is not None and tracked.issue != issue:
+            self._lookup_source = None
+            tracked = self._obtain_lookups()[1].get(issue)
+
+        return tracked.uuid if tracked is not None else None
+
+    def store_tracker(self, writer=None):
+        if writer is not None:
+            writer.write_json(self.FILE_NAME, self)
+            return
 
-    def store_tracker(self):
         JsonConvert.ToFile(self, Tracker.get_path())
         gm = GitManager()
         gm.add_to_index([str(Tracker.get_path())])
 
     @classmethod
     def get_path(cls):
-        return Path.cwd().joinpath("tracker.json")
+        return RepoHandler.get_root().joinpath(cls.FILE_NAME)
 
     @classmethod
-    def obtain_tracker(cls):
+    def obtain_tracker(cls, tree=None):
         tracker = None    
         path = cls.get_path()
 
+        if tree is not None:
+            tracker = tree.read_json(cls.FILE_NAME)
+            return tracker if tracker is not None else Tracker()
+
         if path.exists():
             tracker = JsonConvert.FromFile(path)
         else:
-            tracker = Tracker()
+            # Outside of the worktree the tracker is read from the tip of the issue branch
+            from git_issue.git_utils.tree_utils import IssueTree
+            tracker = IssueTree().read_json(cls.FILE_NAME)
+            tracker = tracker if tracker is not None else Tracker()
 
         return tracker
 
@@ -75,3 +123,5 @@ class Tracker(object):
 
         return False
 
+
+JsonConvert.register_schema(Tracker.FILE_NAME, JsonSchema(Tracker, {"tracked_uuids": [JsonSchema(UUIDTrack)]}, big_ints=True))
@@ -1,4 +1,39 @@
 import json
+from fnmatch import fnmatchcase
+
+from git_issue.utils.trace_utils import Tracer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JsonSchema(object):
+    """ Describes how one kind of file is decoded straight into its class: which fields hold other classes
+        (a list of one schema meaning a list of them) and whether it holds integers too big for 64 bits,
+        such as uuids. Anything not named as a field is passed to the class as it was decoded. """
+
+    def __init__(self, cls, fields: dict = None, big_ints: bool = False):
+        self.cls = cls
+        self.fields = fields if fields is not None else {}
+        self.big_ints = big_ints
+        self._fields = [(name, field[0], True) if type(field) is list else (name, field, False)
+                        for name, field in self.fields.items()]
+
+    def decode(self, data: dict):
+        """ Builds the object from freshly parsed JSON, which is changed in the process. """
+        if data is None:
+            return None
+
+        for name, field, many in self._fields:
+            value = data.get(name)
+
+            if value is not None:
+                data[name] = [field.decode(v) for v in value] if many else field.decode(value)
+
+        return self.cls(**data)
+
  
 class JsonConvert(object):
     """ This class is not of my own design or creation. The code was sourced from a blogger known as @theCake.
@@ -6,34 +41,107 @@ class JsonConvert(object):
         The code can be found at: https://blog.mosthege.net/2016/11/12/json-deserialization-of-nested-objects/ """
 
     mappings = {}
-     
+    # Classes registered since the mappings were last built. A class is only mapped (which means creating one of
+    # it to find its keys) once an object has to be matched, rather than when it's defined
+    unmapped = []
+    # The class found for each set of keys, so that the mappings are only searched once per shape of object
+    mapped_keys = {}
+    # (file pattern, schema) pairs. A file matching one of the patterns is decoded with its schema rather than
+    # having every object in it matched against the mappings
+    file_schemas = []
+    # Use orjson, when it's installed, to parse files that can't hold integers it would lose precision on
+    use_fast_backend = orjson is not None
+
     @classmethod
     def class_mapper(clsself, d):
-        for keys, cls in clsself.mappings.items():
-            if keys.issuperset(d.keys()):   # are all required arguments present?
-                return cls(**d)
-        else:
-            # Raise exception instead of silently returning None
-            raise ValueError('Unable to find a matching class for object: {!s}'.format(d))
+        keys = frozenset(d.keys())
+        cls = clsself.mapped_keys.get(keys)
+
+        if cls is None:
+            clsself._map_registered()
+
+            for mapping_keys, mapping_cls in clsself.mappings.items():
+                if mapping_keys.issuperset(keys):   # are all required arguments present?
+                    cls = mapping_cls
+                    break
+            else:
+                # Raise exception instead of silently returning None
+                raise ValueError('Unable to find a matching class for object: {!s}'.format(d))
+
+            clsself.mapped_keys[keys] = cls
+
+        return cls(**d)
      
+    @classmethod
+    def _public_dict(clsself, obj):
+        """ Attributes starting with an underscore are private to the object (e.g. look ups built from its
+            data) and are never written. """
+        return {key: val for key, val in obj.__dict__.items() if not key.startswith('_')}
+
     @classmethod
     def complex_handler(clsself, Obj):
         if hasattr(Obj, '__dict__'):
-            return Obj.__dict__
+            return clsself._public_dict(Obj)
         else:
             raise TypeError('Object of type %s with value of %s is not JSON serializable' % (type(Obj), repr(Obj)))
  
     @classmethod
     def register(clsself, cls):
-        clsself.mappings[frozenset(tuple([attr for attr,val in cls().__dict__.items()]))] = cls
+        clsself.unmapped.append(cls)
+        clsself.mapped_keys = {}
         return cls
+
+    @classmethod
+    def _map_registered(clsself):
+        while len(clsself.unmapped) > 0:
+            cls = clsself.unmapped.pop(0)
+            clsself.mappings[frozenset(tuple([attr for attr,val in clsself._public_dict(cls()).items()]))] = cls
+
+    @classmethod
+    def register_schema(clsself, pattern: str, schema: JsonSchema):
+        """ Decodes files whose path matches the pattern (e.g. "issue.json" or "comments/*.json") with the schema. """
+        clsself.file_schemas.append((pattern, schema))
+
+    @classmethod
+    def get_schema(clsself, path) -> JsonSchema or None:
+        if path is None:
+            return None
+
+        # Matched from the end of the path, one part at a time, as this is done for every file read
+        parts = str(path).replace("\\", "/").split("/")
+        for pattern, schema in clsself.file_schemas:
+            pattern_parts = pattern.split("/")
+            tail = parts[-len(pattern_parts):]
+
+            if len(tail) == len(pattern_parts) and all(fnmatchcase(p, pat) for p, pat in zip(tail, pattern_parts)):
+                return schema
+
+        return None
  
     @classmethod
     def ToJSON(clsself, obj):
-        return json.dumps(obj.__dict__, default=clsself.complex_handler, indent=4)
+        # Each field is kept on a line of its own so that GIT can merge changes to different fields of the same
+        # file (e.g. one side changing the status and the other the assignee) without a conflict
+        return json.dumps(clsself._public_dict(obj), default=clsself.complex_handler, indent=4)
  
     @classmethod
-    def FromJSON(clsself, json_str):
+    def FromJSON(clsself, json_str, path=None):
+        """ Decodes the JSON. If the path of the file it came from is given and has a schema, the objects are
+            built from the schema; otherwise (or if the file doesn't fit its schema) each object is matched
+            against the registered classes by its keys. """
+        schema = clsself.get_schema(path)
+
+        if schema is not None:
+            try:
+                if clsself.use_fast_backend and not schema.big_ints:
+                    data = orjson.loads(json_str)
+                else:
+                    data = json.loads(json_str)
+
+                return schema.decode(data)
+            except (TypeError, AttributeError, ValueError):
+                pass
+
         return json.loads(json_str, object_hook=clsself.class_mapper)
      
     @classmethod
@@ -42,7 +150,7 @@ class JsonConvert(object):
             clsself._create_dir(path.parent)
 
 
-        with open(path, 'w') as jfile:
+        with Tracer.span("json write", "json", path=path), open(path, 'w') as jfile:
             jfile.writelines([clsself.ToJSON(obj)])
         return path
  
@@ -55,6 +163,6 @@ class JsonConvert(object):
     @classmethod
     def FromFile(clsself, filepath):
         result = None
-        with open(filepath, 'r') as jfile:
-            result = clsself.FromJSON(jfile.read())
+        with Tracer.span("json read", "json", path=filepath), open(filepath, 'r') as jfile:
+            result = clsself.FromJSON(jfile.read(), filepath)
         return result
\ No newline at end of file
@@ -0,0 +1,177 @@
+from threading import Lock
+from typing import Callable
+
+from git_issue.utils.trace_utils import Span, Tracer
+
+
+class Histogram(object):
+    """ Counts observations into cumulative buckets by their upper bound, as Prometheus does. """
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    labels = labels + extra
+    if len(labels) == 0:
+        return ""
+
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metrics(object):
+    """
+        Keeps counters, histograms and gauges, and writes them out in Prometheus' text format.
+
+        Once installed, every span the Tracer hands out is observed: workflow phases, GIT commands, JSON reads
+        and writes, handler calls and lock waits each have a histogram of their durations, labelled by the
+        span's name, which also gives how often each happened. How often the tree cache and the derived caches
+        were hit is collected whenever the metrics are written out.
+    """
+
+    # Seconds, from a cached read up to a large merge
+    DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    # The histogram each category of span is observed in, with its help text and the label its name is kept in
+    SPAN_METRICS = {
+        "phase": ("git_issue_workflow_phase_seconds", "Time spent in each phase of the git and tree workflows.",
+                  "phase"),
+        "git": ("git_issue_git_command_seconds", "Time spent running each GIT command.", "command"),
+        "json": ("git_issue_json_seconds", "Time spent reading and writing JSON files.", "operation"),
+        "handler": ("git_issue_handler_seconds", "Time spent in each issue and comment handler call.", "operation"),
+        "lock": ("git_issue_lock_wait_seconds", "Time spent waiting for a lock or for the writer.", "lock"),
+        "command": ("git_issue_command_seconds", "Time spent running each command of the CLI.", "command"),
+    }
+
+    def __init__(self, buckets: tuple = None):
+        self.buckets = buckets if buckets is not None else self.DEFAULT_BUCKETS
+        self.help = {}
+        self.types = {}
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self._lock = Lock()
+
+        for name, help, _ in self.SPAN_METRICS.values():
+            self.describe(name, "histogram", help)
+
+        self.add_gauge("git_issue_tree_cache_hits_total", "Objects found in the tree cache.", "counter",
+                       lambda: self._get_tree_cache_statistics()[0])
+        self.add_gauge("git_issue_tree_cache_misses_total", "Objects that had to be read into the tree cache.",
+                       "counter", lambda: self._get_tree_cache_statistics()[1])
+        self.add_gauge("git_issue_tree_cache_hit_ratio", "The share of tree cache lookups that were hits.",
+                       "gauge", lambda: self._get_ratio(*self._get_tree_cache_statistics()))
+        self.add_gauge("git_issue_derived_cache_hits_total", "Derived caches found in memory and up to date.",
+                       "counter", lambda: {(("cache", c.NAME),): c.hits for c in self._get_derived_caches()})
+        self.add_gauge("git_issue_derived_cache_misses_total", "Derived caches that had to be loaded or caught up.",
+                       "counter", lambda: {(("cache", c.NAME),): c.misses for c in self._get_derived_caches()})
+        self.add_gauge("git_issue_derived_cache_hit_ratio", "The share of derived cache lookups that were hits.",
+                       "gauge", lambda: {(("cache", c.NAME),): self._get_ratio(c.hits, c.misses)
+                                         for c in self._get_derived_caches()})
+
+    def describe(self, name: str, type: str, help: str):
+        """ Gives the help text and type written out with a metric. """
+        self.types[name] = type
+        self.help[name] = help
+
+    @staticmethod
+    def _get_ratio(hits: int, misses: int) -> float:
+        return hits / (hits + misses) if hits + misses > 0 else 0.0
+
+    @staticmethod
+    def _get_tree_cache_statistics() -> (int, int):
+        from git_issue.git_utils.tree_utils import TreeCache
+        return TreeCache.get_statistics()
+
+    @staticmethod
+    def _get_derived_caches() -> list:
+        from git_issue.issue.handler import DERIVED_CACHES
+        from git_issue.issue.search_index import SearchIndex
+        return DERIVED_CACHES + [SearchIndex]
+
+    def install(self):
+        """ Observes every span from now on. """
+        Tracer.add_listener(self.observe_span)
+        return self
+
+    def uninstall(self):
+        Tracer.remove_listener(self.observe_span)
+
+    def observe_span(self, span: Span):
+        if span.category not in self.SPAN_METRICS:
+            return
+
+        # A span may name what it's labelled with itself, e.g. the lock that was waited for
+        name, _, label = self.SPAN_METRICS[span.category]
+        self.observe(name, span.get_duration(), **{label: span.args.get(label, span.name)})
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+
+            histogram.observe(value)
+
+    def increment(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def add_gauge(self, name: str, help: str, type: str, get_value: Callable[[], float or dict]):
+        """ Adds a value that's read whenever the metrics are written out. get_value returns either the value,
+            or the value for each set of labels as a dict of ((label, value), ...) -> value. """
+        self.describe(name, type, help)
+        self.gauges[name] = get_value
+
+    def to_prometheus(self) -> str:
+        """ Writes out every metric in Prometheus' text exposition format. """
+        samples = {}
+
+        with self._lock:
+            for (name, labels), value in self.counters.items():
+                samples.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                lines = samples.setdefault(name, [])
+
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f"{name}_bucket{_format_labels(labels, (('le', _format_value(bound)),))} {count}")
+
+                lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+        for name, get_value in self.gauges.items():
+            value = get_value()
+            values = value if isinstance(value, dict) else {(): value}
+            samples[name] = [f"{name}{_format_labels(labels)} {_format_value(v)}" for labels, v in values.items()]
+
+        output = []
+        for name, lines in samples.items():
+            if name in self.help:
+                output.append(f"# HELP {name} {self.help[name]}")
+                output.append(f"# TYPE {name} {self.types[name]}")
+
+            output.extend(lines)
+
+        return "\n".join(output) + "\n"
@@ -0,0 +1,286 @@
+import json
+import os
+import threading
+import time
+from functools import wraps
+
+
+class Span(object):
+    """ One timed piece of work, e.g. a GIT command, a JSON file being read or a phase of a workflow. Spans
+        started while another is open on the same thread are its children. """
+
+    def __init__(self, name: str, category: str, args: dict = None, parent=None):
+        self.name = name
+        self.category = category
+        self.args = args if args is not None else {}
+        self.parent = parent
+        self.thread = threading.get_ident()
+        self.start = None
+        self.end = None
+
+    def get_duration(self) -> float:
+        """ The span's wall time in seconds, or how long it has been open so far. """
+        end = self.end if self.end is not None else time.perf_counter()
+        return end - self.start
+
+    def get_path(self) -> tuple:
+        """ The names of the span and every span it's nested in, outermost first. """
+        path = []
+        span = self
+
+        while span is not None:
+            path.append(span.name)
+            span = span.parent
+
+        return tuple(reversed(path))
+
+    def __enter__(self):
+        Tracer._open(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+
+        Tracer._close(self)
+        return False
+
+
+class _NoSpan(object):
+    """ Stands in for a span while nothing is tracing, so that tracing costs next to nothing when it's off. """
+
+    @property
+    def args(self) -> dict:
+        return {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Tracer(object):
+    """
+        Collects spans for whoever is interested in them. Spans are only made while something is listening,
+        either a recording (e.g. for --profile) or a listener added with add_listener, which is handed every
+        span as it ends.
+
+        Every GIT command run through GitPython is traced as a span of the "git" category once tracing starts.
+    """
+
+    _local = threading.local()
+    _lock = threading.Lock()
+    _listeners = []
+    _recording = None
+    _git_instrumented = False
+
+    @classmethod
+    def is_active(cls) -> bool:
+        return cls._recording is not None or len(cls._listeners) > 0
+
+    @classmethod
+    def span(cls, name: str, category: str = "phase", **args):
+        """ Returns a context manager timing whatever it wraps as a span. """
+        if not cls.is_active():
+            return _NO_SPAN
+
+        return Span(name, category, args, cls.get_current_span())
+
+    @classmethod
+    def record(cls, name: str, category: str, start: float, end: float, **args):
+        """ Hands on a span for something timed elsewhere, e.g. how long a write waited in a queue before
+            another thread picked it up. start and end are time.perf_counter() readings. """
+        if not cls.is_active():
+            return
+
+        span = Span(name, category, args, cls.get_current_span())
+        span.start = start
+        span.end = end
+        cls._publish(span)
+
+    @classmethod
+    def get_current_span(cls) -> Span or None:
+        stack = getattr(cls._local, "stack", None)
+        return stack[-1] if stack else None
+
+    @classmethod
+    def _open(cls, span: Span):
+        if not hasattr(cls._local, "stack"):
+            cls._local.stack = []
+
+        cls._local.stack.append(span)
+        span.start = time.perf_counter()
+
+    @classmethod
+    def _close(cls, span: Span):
+        span.end = time.perf_counter()
+        stack = cls._local.stack
+
+        if span in stack:
+            del stack[stack.index(span):]
+
+        cls._publish(span)
+
+    @classmethod
+    def _publish(cls, span: Span):
+        recording = cls._recording
+        if recording is not None:
+            with cls._lock:
+                recording.append(span)
+
+        for listener in cls._listeners:
+            listener(span)
+
+    @classmethod
+    def add_listener(cls, listener):
+        """ Hands listener every span as it ends, on the thread that ended it. """
+        with cls._lock:
+            cls._listeners = cls._listeners + [listener]
+
+        cls._instrument_git()
+
+    @classmethod
+    def remove_listener(cls, listener):
+        with cls._lock:
+            cls._listeners = [l for l in cls._listeners if l != listener]
+
+    @classmethod
+    def start_recording(cls):
+        cls._recording = []
+        cls._instrument_git()
+
+    @classmethod
+    def stop_recording(cls) -> [Span]:
+        """ Stops recording, returning the spans that ended while it was on. """
+        recording = cls._recording if cls._recording is not None else []
+        cls._recording = None
+        return recording
+
+    @staticmethod
+    def get_git_span_name(command) -> str:
+        """ Names a GIT command by its subcommand, along with the next argument for commands made up of two
+            words (e.g. "git worktree add"). """
+        if isinstance(command, str):
+            command = command.split(" ")
+
+        words = [str(word) for word in command[1:] if not str(word).startswith("-")]
+
+        if len(words) == 0:
+            return "git"
+
+        if words[0] in ("worktree", "stash", "remote") and len(words) > 1:
+            return f"git {words[0]} {words[1]}"
+
+        return f"git {words[0]}"
+
+    @classmethod
+    def _instrument_git(cls):
+        """ Wraps GitPython's execute, through which every GIT command it runs passes, so each is a span. GitPython
+            is only imported here, so that tracing can be set up without the cost of loading it. """
+        import git.cmd
+
+        with cls._lock:
+            if cls._git_instrumented:
+                return
+
+            execute = git.cmd.Git.execute
+
+            def traced_execute(self, command, *args, **kwargs):
+                if not cls.is_active():
+                    return execute(self, command, *args, **kwargs)
+
+                words = command.split(" ") if isinstance(command, str) else command
+                with cls.span(cls.get_git_span_name(words), "git",
+                              command_line=" ".join(str(word) for word in words)):
+                    return execute(self, command, *args, **kwargs)
+
+            git.cmd.Git.execute = traced_execute
+            cls._git_instrumented = True
+
+
+def traced(name: str, category: str = "handler"):
+    """ Times every call of the decorated function as a span. """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with Tracer.span(name, category):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def format_profile(spans: [Span]) -> str:
+    """ Lays the spans out as a tree, merging spans with the same name under the same parent into one line
+        showing their total wall time and how many there were. Totals for each category follow the tree. """
+    totals = {}
+    order = []
+
+    for span in sorted(spans, key=lambda s: s.start):
+        path = span.get_path()
+
+        if path not in totals:
+            totals[path] = [0.0, 0]
+            order.append(path)
+
+        totals[path][0] += span.get_duration()
+        totals[path][1] += 1
+
+    # Children are listed under their parent, in the order they first started
+    children = {}
+    for path in order:
+        children.setdefault(path[:-1], []).append(path)
+
+    lines = [f"{'Wall time':>12} {'Calls':>7}  Span"]
+
+    def add_lines(parent: tuple):
+        for path in children.get(parent, []):
+            duration, calls = totals[path]
+            lines.append(f"{duration * 1000:>9.1f} ms {calls:>7}  {'  ' * (len(path) - 1)}{path[-1]}")
+            add_lines(path)
+
+    add_lines(())
+
+    categories = {}
+    for span in spans:
+        # Time spent within a span of the same category is already counted by the outer span
+        if span.parent is not None and _has_category_above(span, span.category):
+            continue
+
+        duration, calls = categories.get(span.category, (0.0, 0))
+        categories[span.category] = (duration + span.get_duration(), calls + 1)
+
+    lines.append("")
+    for category, (duration, calls) in sorted(categories.items()):
+        lines.append(f"{duration * 1000:>9.1f} ms {calls:>7}  all {category} spans")
+
+    return "\n".join(lines)
+
+
+def _has_category_above(span: Span, category: str) -> bool:
+    parent = span.parent
+
+    while parent is not None:
+        if parent.category == category:
+            return True
+        parent = parent.parent
+
+    return False
+
+
+def write_chrome_trace(spans: [Span], path):
+    """ Writes the spans as a Chrome trace event file, which can be opened in chrome://tracing or Perfetto. """
+    origin = min((span.start for span in spans), default=0.0)
+    pid = os.getpid()
+    events = [{"name": span.name, "cat": span.category, "ph": "X", "pid": pid, "tid": span.thread,
+               "ts": (span.start - origin) * 1e6, "dur": span.get_duration() * 1e6,
+               "args": {key: str(value) for key, value in span.args.items()}}
+              for span in spans]
+
+    with open(path, "w") as file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
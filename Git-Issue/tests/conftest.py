@@ -0,0 +1,33 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.joinpath("..")))
+import pytest
+import git
+import os
+from git_issue.git_manager import GitManager
+
+
+@pytest.fixture
+def test_repo(tmpdir):
+    repo = git.Repo.init(tmpdir.mkdir("test_repo"))
+
+    fake_file_dir = Path(repo.working_dir + "/fake-file.pla")
+    open(fake_file_dir, 'w').close()
+    repo.index.add([str(fake_file_dir)])
+    repo.index.commit("Blah")
+
+    os.chdir(repo.working_dir)
+    gm = GitManager()
+    setattr(gm, "get_choice_from_user", lambda x: True)
+    gm.load_issue_branch()
+
+    return repo
+
+@pytest.fixture
+def unloaded_repo(test_repo):
+    """ A repository with an issue branch but no issue worktree, as is left behind by every command that doesn't
+        keep the worktree loaded. """
+    GitManager().unload_issue_branch()
+    os.chdir(test_repo.working_dir)
+    return test_repo
@@ -0,0 +1,40 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.joinpath("..")))
+from git_issue.comment.comment import Comment
+from git_issue.comment.index import Index, IndexEntry
+import json
+from git_issue.utils.json_utils import JsonConvert
+
+
+def comment_at(date):
+    return Comment("comment", date=date)
+
+def test_entries_are_kept_in_date_order():
+    index = Index([IndexEntry("b.json", "2018-02-25T22:50:00"), IndexEntry("a.json", "2018-02-25T22:33:00")])
+    index.add_entry(Path("c.json"), comment_at("2018-02-25T22:40:00"))
+    index.add_entry(Path("d.json"), comment_at("2018-02-25T23:00:00"))
+
+    assert ["a.json", "c.json", "b.json", "d.json"] == [e.path for e in index.get_entries()]
+
+def test_look_up_entries():
+    index = Index()
+    entry = index.add_entry(Path("a.json"), comment_at("2018-02-25T22:33:00"))
+
+    assert index.has_entry(Path("a.json")) and entry == index.get_entry(Path("a.json"))
+    assert not index.has_entry("b.json") and index.get_entry("b.json") is None
+
+def test_get_entries_between():
+    index = Index([IndexEntry(f"{i}.json", f"2018-02-2{i}T00:00:00") for i in range(5)])
+
+    assert ["1.json", "2.json"] == [e.path for e in index.get_entries_between("2018-02-21T00:00:00", "2018-02-23")]
+    assert ["3.json", "4.json"] == [e.path for e in index.get_entries_between("2018-02-23")]
+
+def test_format_is_unchanged():
+    index = Index([IndexEntry("a.json", "2018-02-25T22:33:00")])
+    data = JsonConvert.ToJSON(index)
+
+    assert {"entries": [{"path": "a.json", "date": "2018-02-25T22:33:00"}]} == json.loads(data)
+    assert index == JsonConvert.FromJSON(data)
+    assert JsonConvert.FromJSON(data).has_entry("a.json")
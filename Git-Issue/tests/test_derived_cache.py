@@ -0,0 +1,201 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.joinpath("..")))
+import pytest
+import git_issue.issue.handler as handler
+from git_issue.issue.handler import IssueHandler
+from git_issue.git_utils.tree_utils import IssueTree, IssueTreeWriter
+from git_issue.issue.secondary_index import SecondaryIndex
+from git_issue.issue.search_index import SearchIndex
+from git_issue.issue.issue_manifest import IssueManifest
+from git_issue.issue.issue_summaries import IssueSummaries
+from git_issue.comment.handler import CommentHandler
+from git_issue.comment.comment import Comment
+from git_issue.issue.issue import Issue
+from git_issue.gituser import GitUser
+
+
+@pytest.fixture
+def issues(unloaded_repo):
+    liam = GitUser("liam", "liam@test.com")
+    bob = GitUser("bob", "bob@test.com")
+
+    created = [Issue(summary="first", status="open", assignee=liam, reporter=bob, subscribers=[bob]),
+               Issue(summary="second", status="closed", assignee=liam, reporter=liam, subscribers=[liam]),
+               Issue(summary="third", status="open", assignee=bob, reporter=liam, subscribers=[liam, bob])]
+
+    return [IssueHandler().store_issue(i, "create", generate_id=True, store_tracker=True) for i in created]
+
+def test_find_by_fields(issues):
+    index = SecondaryIndex.obtain()
+
+    assert ["ISSUE-1", "ISSUE-3"] == index.find(status="open")
+    assert ["ISSUE-1"] == index.find(status="Open", assignee="LIAM@test.com")
+    assert ["ISSUE-2", "ISSUE-3"] == index.find(reporter="liam@test.com")
+    assert ["ISSUE-1", "ISSUE-3"] == index.find(subscriber="bob@test.com")
+    assert [] == index.find(status="in progress")
+
+def test_store_issue_updates_index_incrementally(issues):
+    SecondaryIndex.obtain()
+
+    issue = handler.get_issue("ISSUE-2")
+    issue.status = "open"
+    IssueHandler().store_issue(issue, "edit")
+
+    # The index was moved on by the write itself rather than being caught up from the branch
+    index = SecondaryIndex()
+    index.load()
+    assert IssueTree().commit.hexsha == index.commit_sha
+    assert ["ISSUE-1", "ISSUE-2", "ISSUE-3"] == index.find(status="open")
+
+def test_write_journals_only_changed_issues(issues, monkeypatch):
+    SecondaryIndex.obtain()
+    size = SecondaryIndex().path.stat().st_size
+
+    # The index in memory is moved on, so nothing is read back or stored as a whole
+    monkeypatch.setattr(SecondaryIndex, "load", lambda self: pytest.fail("the index was loaded"))
+    monkeypatch.setattr(SecondaryIndex, "store", lambda self: pytest.fail("the index was stored"))
+    issue = handler.get_issue("ISSUE-2")
+    issue.status = "open"
+    IssueHandler().store_issue(issue, "edit")
+    monkeypatch.undo()
+
+    index = SecondaryIndex()
+    assert size == index.path.stat().st_size
+    assert 1 == len(index._get_journal_path().read_text().splitlines())
+
+    index.load()
+    assert IssueTree().commit.hexsha == index.commit_sha
+    assert ["ISSUE-1", "ISSUE-2", "ISSUE-3"] == index.find(status="open")
+
+def test_journal_stored_once_full(issues, monkeypatch):
+    monkeypatch.setattr(IssueManifest, "JOURNAL_LIMIT", 2)
+    manifest = IssueManifest.obtain()
+
+    for summary in ["fourth", "fifth", "sixth"]:
+        IssueHandler().store_issue(Issue(summary=summary), "create", generate_id=True, store_tracker=True)
+
+    # The third write found the journal full, so stored everything
+    assert not manifest._get_journal_path().exists()
+
+    loaded = IssueManifest()
+    loaded.load()
+    assert IssueTree().commit.hexsha == loaded.commit_sha
+    assert ["ISSUE-1", "ISSUE-2", "ISSUE-3", "ISSUE-4", "ISSUE-5", "ISSUE-6"] == loaded.ids
+
+def test_index_catches_up_with_branch(issues, unloaded_repo):
+    SecondaryIndex.obtain()
+
+    # Change an issue behind the index's back, e.g. as a pull would
+    issue = handler.get_issue("ISSUE-3")
+    issue.status = "closed"
+    writer = IssueTreeWriter()
+    writer.write_json("ISSUE-3/issue.json", issue)
+    writer.commit_changes("Edit behind the index's back")
+
+    assert ["ISSUE-2", "ISSUE-3"] == SecondaryIndex.obtain().find(status="closed")
+
+def test_find_issues(issues):
+    result = handler.find_issues(status="open", assignee="bob@test.com")
+    assert [issues[2]] == result
+
+def test_search(issues):
+    CommentHandler(Path("ISSUE-2"), "ISSUE-2").add_comment(Comment("The login page crashes"))
+
+    assert ["ISSUE-1"] == handler.search_issue_ids("FIRST")
+    assert ["ISSUE-2"] == handler.search_issue_ids("login")
+    assert ["ISSUE-2"] == handler.search_issue_ids("log*")
+    assert [] == handler.search_issue_ids("login first")
+    assert [] == handler.search_issue_ids('"')
+
+def test_search_index_catches_up_with_branch(issues):
+    index = SearchIndex.obtain()
+    commit_sha = index.commit_sha
+    index.close()
+
+    issue = handler.get_issue("ISSUE-3")
+    issue.description = "Renamed the widget"
+    IssueHandler().store_issue(issue, "edit")
+    CommentHandler(Path("ISSUE-1"), "ISSUE-1").add_comment(Comment("Another widget"))
+
+    index = SearchIndex.obtain()
+    assert commit_sha != index.commit_sha
+    assert ["ISSUE-1", "ISSUE-3"] == sorted(index.search("widget"))
+    assert ["ISSUE-3"] == index.search("third widget")
+    index.close()
+
+    assert [i.id for i in handler.search_issues("second")] == ["ISSUE-2"]
+
+def test_search_index_rebuilt_for_other_sqlite(issues, monkeypatch):
+    if not SearchIndex._is_fts_available():
+        pytest.skip("SQLite was built without FTS5")
+
+    # Built by an SQLite without FTS5, then opened by one with it, as happens when switching Pythons
+    monkeypatch.setattr(SearchIndex, "_fts_available", False)
+    index = SearchIndex.obtain()
+    assert not index.has_fts and ["ISSUE-2"] == index.search("second")
+    index.close()
+
+    monkeypatch.setattr(SearchIndex, "_fts_available", True)
+    index = SearchIndex.obtain()
+    assert index.has_fts and ["ISSUE-2"] == index.search("second")
+    index.close()
+
+    # And back again, which can't even drop the FTS5 tables
+    monkeypatch.setattr(SearchIndex, "_fts_available", False)
+    index = SearchIndex.obtain()
+    assert not index.has_fts and ["ISSUE-3"] == index.search("third")
+    index.close()
+
+def test_issue_range_is_sorted(issues):
+    # Enough issues that ordering by name would put ISSUE-10 before ISSUE-2
+    IssueHandler().store_issue(Issue(summary="fourth"), "create", generate_id=True, store_tracker=True)
+    writer = IssueTreeWriter()
+    for i in range(5, 12):
+        writer.write_json(f"ISSUE-{i}/issue.json", Issue(id=f"ISSUE-{i}", summary=str(i), date=f"2000-01-{i:02}"))
+    writer.commit_changes("Add issues behind the manifest's back")
+
+    issues, count = IssueHandler().get_issue_range(1, 3)
+    assert 11 == count and ["ISSUE-1", "ISSUE-2", "ISSUE-3"] == [i.id for i in issues]
+
+    issues, count = IssueHandler().get_issue_range(4, 3)
+    assert ["ISSUE-10", "ISSUE-11"] == [i.id for i in issues]
+
+    issues, count = IssueHandler().get_issue_range(1, 2, by_date=True)
+    assert ["ISSUE-5", "ISSUE-6"] == [i.id for i in issues]
+
+def test_manifest_is_kept_in_memory(issues):
+    manifest = IssueManifest.obtain()
+    assert manifest is IssueManifest.obtain()
+    assert ["ISSUE-1", "ISSUE-2", "ISSUE-3"] == manifest.ids
+
+    IssueHandler().store_issue(Issue(summary="fourth"), "create", generate_id=True, store_tracker=True)
+
+    # The branch has moved on, so a caught up manifest replaces the one in memory
+    updated = IssueManifest.obtain()
+    assert updated is not manifest and ["ISSUE-1", "ISSUE-2", "ISSUE-3", "ISSUE-4"] == updated.ids
+    assert 3 == manifest.get_count()
+
+def test_issue_summaries(issues, monkeypatch):
+    handler.refresh_derived_caches()
+    summaries = handler.get_issue_summaries()
+    assert ["first", "second", "third"] == [s.summary for s in summaries]
+    assert GitUser("liam", "liam@test.com") == summaries[0].assignee and "open" == summaries[0].status
+
+    # Once the caches are up to date, listing only reads them, never the issues themselves
+    monkeypatch.setattr(IssueTree, "read_json", lambda *args: pytest.fail("an issue was read"))
+    assert ["ISSUE-3"] == [s.id for s in handler.get_issue_summaries(assignee="bob@test.com")]
+
+def test_store_issue_updates_summaries(issues):
+    handler.get_issue_summaries()
+
+    issue = handler.get_issue("ISSUE-2")
+    issue.summary = "renamed"
+    issue.assignee = None
+    IssueHandler().store_issue(issue, "edit")
+
+    summaries = IssueSummaries()
+    summaries.load()
+    assert IssueTree().commit.hexsha == summaries.commit_sha
+    assert "renamed" == summaries.get_summary("ISSUE-2").summary and summaries.get_summary("ISSUE-2").assignee is None
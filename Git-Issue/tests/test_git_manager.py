@@ -0,0 +1,299 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.joinpath("..")))
+import pytest
+import git
+import os
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+import git_issue.issue.handler as handler
+from git_issue.issue.handler import IssueHandler
+from git_issue.git_utils.tree_utils import IssueTree, IssueTreeWriter, TreeUpdateConflictError, TreeCache
+from git_issue.comment import Comment
+from git_issue.comment.handler import CommentHandler
+from git_issue.git_manager import GitManager, RepoHandler
+from git_issue.issue.issue import Issue
+from git_issue.gituser import GitUser
+from git_issue.utils.json_utils import JsonConvert
+
+
+@pytest.fixture
+def regular_issue():
+    issue = Issue()
+    issue.id = "ISSUE-30"
+    issue.description = "description"
+    issue.summary = "summary"
+    return issue
+
+@pytest.fixture
+def keep_loaded(monkeypatch):
+    monkeypatch.setattr("git_issue.git_manager.GitManager.keep_loaded", True)
+
+def test_keep_loaded_leaves_worktree(regular_issue, test_repo, keep_loaded):
+    os.chdir(test_repo.working_dir)
+    IssueHandler().store_issue(regular_issue, "test")
+
+    assert Path(f"{test_repo.working_dir}/issue/{regular_issue.id}/issue.json").exists()
+
+def test_keep_loaded_syncs_moved_branch(regular_issue, test_repo, keep_loaded):
+    IssueHandler().store_issue(regular_issue, "test")
+    issue_path = Path(f"{test_repo.working_dir}/issue/{regular_issue.id}")
+
+    # Move the branch back from outside of the worktree, leaving the worktree's files stale
+    test_repo.git.update_ref(f"refs/heads/{GitManager.ISSUE_BRANCH}", f"{GitManager.ISSUE_BRANCH}~1")
+    assert issue_path.exists()
+
+    os.chdir(test_repo.working_dir)
+    GitManager().load_issue_branch()
+
+    assert not issue_path.exists()
+
+def test_forced_unload_removes_kept_worktree(regular_issue, test_repo, keep_loaded):
+    gm = GitManager()
+    gm.unload_issue_branch()
+    assert Path(f"{test_repo.working_dir}/issue").exists()
+
+    gm.unload_issue_branch(force=True)
+    assert not Path(f"{test_repo.working_dir}/issue").exists()
+
+def test_batch_creates_single_commit(test_repo):
+    os.chdir(test_repo.working_dir)
+    commits = len(list(test_repo.iter_commits(GitManager.ISSUE_BRANCH)))
+
+    handler = IssueHandler()
+    with GitManager().batch("import"):
+        for i in range(3):
+            handler.store_issue(Issue(summary=f"batched-{i}"), "create", generate_id=True, store_tracker=True)
+
+    os.chdir(test_repo.working_dir)
+    assert len(list(test_repo.iter_commits(GitManager.ISSUE_BRANCH))) == commits + 1
+
+    tree = test_repo.commit(GitManager.ISSUE_BRANCH).tree
+    for i in range(1, 4):
+        assert f"ISSUE-{i}" in tree
+    assert "tracker.json" in tree
+
+def test_batch_discards_writes_on_error(test_repo):
+    os.chdir(test_repo.working_dir)
+    head = test_repo.commit(GitManager.ISSUE_BRANCH).hexsha
+
+    with pytest.raises(RuntimeError):
+        with GitManager().batch("import"):
+            IssueHandler().store_issue(Issue(summary="discarded"), "create", generate_id=True)
+            raise RuntimeError()
+
+    os.chdir(test_repo.working_dir)
+    assert head == test_repo.commit(GitManager.ISSUE_BRANCH).hexsha
+    assert not Path(f"{test_repo.working_dir}/issue/ISSUE-1").exists()
+
+def test_tree_workflow_needs_no_worktree(unloaded_repo):
+    issue = IssueHandler().store_issue(Issue(summary="plumbing"), "create", generate_id=True, store_tracker=True)
+
+    assert "ISSUE-1" == issue.id
+    assert not Path(f"{unloaded_repo.working_dir}/issue").exists()
+    assert issue == handler.get_issue(issue.id)
+    assert 1 == IssueTree().read_json("tracker.json").issue_count
+
+def test_tree_workflow_keeps_untouched_files(unloaded_repo):
+    first = IssueHandler().store_issue(Issue(summary="first"), "create", generate_id=True, store_tracker=True)
+    second = IssueHandler().store_issue(Issue(summary="second"), "create", generate_id=True, store_tracker=True)
+
+    assert "ISSUE-2" == second.id
+    assert first == handler.get_issue(first.id)
+    assert second == handler.get_issue(second.id)
+
+def test_tree_writer_rejects_moved_branch(unloaded_repo):
+    writer = IssueTreeWriter()
+    writer.write("first.txt", "first")
+
+    other = IssueTreeWriter()
+    other.write("second.txt", "second")
+    other.commit_changes("Moves the branch")
+
+    with pytest.raises(TreeUpdateConflictError):
+        writer.commit_changes("Loses the race")
+
+    assert IssueTree().read("second.txt") == "second"
+    assert not IssueTree().exists("first.txt")
+
+def test_tree_workflow_retries_after_lost_race(unloaded_repo):
+    attempts = []
+
+    def action(writer):
+        if len(attempts) == 0:
+            other = IssueTreeWriter()
+            other.write("other.txt", "other")
+            other.commit_changes("Moves the branch")
+
+        attempts.append(writer)
+        writer.write("mine.txt", "mine")
+
+    GitManager().perform_tree_workflow(action, "test")
+
+    assert 2 == len(attempts)
+    assert IssueTree().read("other.txt") == "other"
+    assert IssueTree().read("mine.txt") == "mine"
+
+def test_tree_cache_reuses_parsed_issues(unloaded_repo):
+    issue = IssueHandler().store_issue(Issue(summary="cached"), "create", generate_id=True, store_tracker=True)
+    cache = TreeCache.obtain_cache(unloaded_repo)
+
+    first = handler.get_issue(issue.id)
+    misses = cache.misses
+    first.summary = "changed by the caller"
+    first.subscribers.append(GitUser("test", "test@test.com"))
+    second = handler.get_issue(issue.id)
+
+    assert misses == cache.misses
+    assert "cached" == second.summary
+    assert [] == second.subscribers
+
+def test_tree_cache_hit_cheaper_than_parsing(unloaded_repo):
+    issue = Issue(summary="cached", description="description " * 20, reporter=GitUser("test", "test@test.com"),
+                  subscribers=[GitUser("test", "test@test.com") for i in range(5)])
+    issue = IssueHandler().store_issue(issue, "create", generate_id=True, store_tracker=True)
+    tree = IssueTree()
+    path = f"{issue.id}/issue.json"
+    data = tree.read(path)
+    cache = TreeCache.obtain_cache(unloaded_repo)
+    sha = tree._get_object(path).hexsha
+    load = lambda: JsonConvert.FromJSON(data, path)
+
+    # The fastest of several runs, so that a pause in the middle of one doesn't decide the outcome
+    parse = min(timeit.repeat(load, number=200, repeat=5))
+    cache.get_object(sha, load)
+    hit = min(timeit.repeat(lambda: cache.get_object(sha, load), number=200, repeat=5))
+
+    assert hit < parse
+
+def test_tree_cache_dropped_when_branch_moves(unloaded_repo):
+    issue = IssueHandler().store_issue(Issue(summary="before"), "create", generate_id=True, store_tracker=True)
+    assert "before" == handler.get_issue(issue.id).summary
+
+    issue.summary = "after"
+    IssueHandler().store_issue(issue, "edit")
+
+    assert "after" == handler.get_issue(issue.id).summary
+
+def test_tree_cache_ignores_reads_of_older_commit(unloaded_repo):
+    issue = IssueHandler().store_issue(Issue(summary="before"), "create", generate_id=True, store_tracker=True)
+    older = IssueTree()
+
+    issue.summary = "after"
+    IssueHandler().store_issue(issue, "edit")
+    newer = IssueTree()
+
+    # A tree still reading the older commit once the cache has moved on mustn't store what it found
+    assert "before" == older.read_json(f"{issue.id}/issue.json").summary
+    assert "after" == newer.read_json(f"{issue.id}/issue.json").summary
+    assert TreeCache.obtain_cache(unloaded_repo).get_entries(older.commit.hexsha) is None
+
+def test_comments_read_from_tree(unloaded_repo):
+    issue = IssueHandler().store_issue(Issue(summary="commented"), "create", generate_id=True, store_tracker=True)
+    CommentHandler(Path(issue.id), issue.id).add_comment(Comment("first", GitUser("test", "test@test.com")))
+    CommentHandler(Path(issue.id), issue.id).add_comment(Comment("second", GitUser("test", "test@test.com")))
+
+    comments = handler.get_comment_range(issue.id, 10)
+
+    assert ["first", "second"] == [c.comment for c in comments]
+    assert not Path(f"{unloaded_repo.working_dir}/issue").exists()
+
+def test_root_is_used_instead_of_current_directory(test_repo, tmpdir):
+    GitManager().unload_issue_branch()
+    os.chdir(str(tmpdir))
+
+    with RepoHandler.using_root(test_repo.working_dir):
+        created = IssueHandler().store_issue(Issue(summary="rooted"), "create", generate_id=True, store_tracker=True)
+
+        # The worktree is only entered by the thread's root; the process never changes directory
+        gm = GitManager()
+        gm.load_issue_branch()
+        assert Path(test_repo.working_dir).joinpath("issue") == RepoHandler.get_root()
+        assert Path(str(tmpdir)) == Path.cwd()
+        assert created == IssueHandler().get_issue_from_issue_id(created.id)
+
+        gm.unload_issue_branch()
+        assert Path(test_repo.working_dir) == RepoHandler.get_root()
+
+    assert Path.cwd() == RepoHandler.get_root()
+
+def test_threads_work_in_their_own_roots(tmpdir):
+    roots = []
+    for i in range(4):
+        repo = git.Repo.init(tmpdir.mkdir(f"repo-{i}"))
+        repo.index.commit("Blah")
+        repo.git.branch(GitManager.ISSUE_BRANCH)
+        roots.append(repo.working_dir)
+
+    def create_issues(root):
+        with RepoHandler.using_root(root):
+            for i in range(5):
+                IssueHandler().store_issue(Issue(summary=root), "create", generate_id=True, store_tracker=True)
+
+            return [issue.summary for issue in handler.get_all_issues()]
+
+    with ThreadPoolExecutor(len(roots)) as executor:
+        results = list(executor.map(create_issues, roots))
+
+    assert [[root] * 5 for root in roots] == results
+
+def test_threads_share_tree_cache(unloaded_repo):
+    created = [IssueHandler().store_issue(Issue(summary=f"shared {i}"), "create", generate_id=True, store_tracker=True)
+               for i in range(20)]
+    root = unloaded_repo.working_dir
+
+    def read_issues(_):
+        with RepoHandler.using_root(root):
+            return [handler.get_issue(issue.id).summary for issue in created]
+
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(read_issues, range(16)))
+
+    assert all(result == [issue.summary for issue in created] for result in results)
+
+def test_tree_workflow_handed_to_tree_writer(unloaded_repo, monkeypatch):
+    class Writer(object):
+        def __init__(self):
+            self.writes = []
+
+        def is_writer_thread(self):
+            return False
+
+        def perform(self, action, commit_type, commit_id):
+            writer = IssueTreeWriter()
+            result = action(writer)
+            self.writes.append(commit_type)
+            return result, writer.commit_changes(commit_type)
+
+    tree_writer = Writer()
+    monkeypatch.setattr(GitManager, "tree_writer", tree_writer)
+
+    gm = GitManager()
+    assert "mine" == gm.perform_tree_workflow(lambda writer: writer.write("mine.txt", "mine") or "mine", "test")
+
+    assert ["test"] == tree_writer.writes
+    assert unloaded_repo.commit(GitManager.ISSUE_BRANCH).hexsha == gm.last_commit_sha
+    assert IssueTree().read("mine.txt") == "mine"
+
+def test_tree_writes_only_bypasses_kept_worktree(regular_issue, test_repo, keep_loaded, monkeypatch):
+    IssueHandler().store_issue(regular_issue, "test")
+    monkeypatch.setattr(GitManager, "tree_writes_only", True)
+
+    assert not GitManager().is_worktree_required()
+
+    regular_issue.summary = "changed through the tree"
+    IssueHandler().store_issue(regular_issue, "edit")
+
+    # Only the branch has the change until the worktree is next loaded
+    assert "changed through the tree" == IssueTree().read_json(f"{regular_issue.id}/issue.json").summary
+    assert "changed through the tree" not in \
+        Path(f"{test_repo.working_dir}/issue/{regular_issue.id}/issue.json").read_text()
+
+def test_released_repos_are_reopened(unloaded_repo):
+    with RepoHandler.using_root(unloaded_repo.working_dir):
+        repo = RepoHandler.obtain_repo()
+        assert repo is RepoHandler.obtain_repo()
+
+        RepoHandler.release_repos()
+        assert repo is not RepoHandler.obtain_repo()
@@ -0,0 +1,68 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.joinpath("..")))
+import pytest
+import git
+import os
+from git_issue.gituser import GitUser
+from git_issue.git_utils.contributor_utils import ContributorDirectory
+
+
+def commit_as(repo, name, email):
+    actor = git.Actor(name, email)
+    repo.index.commit(f"Commit by {name}", author=actor, committer=actor)
+
+@pytest.fixture
+def contributor_repo(tmpdir, monkeypatch):
+    repo = git.Repo.init(tmpdir.mkdir("contributor_repo"))
+    commit_as(repo, "liam", "liam@test.com")
+    commit_as(repo, "bob", "bob@test.com")
+
+    monkeypatch.setattr(ContributorDirectory, "_directories", {})
+    os.chdir(repo.working_dir)
+    return repo
+
+def test_from_email(contributor_repo):
+    assert GitUser("liam", "liam@test.com") == GitUser.from_email("liam@test.com")
+    assert "bob" == GitUser(email="bob@test.com").user
+    assert GitUser.from_email("nobody@test.com") is None
+
+def test_directory_catches_up_with_new_commits(contributor_repo):
+    directory = ContributorDirectory.obtain()
+    assert directory.get_name("alice@test.com") is None
+
+    commit_as(contributor_repo, "alice", "alice@test.com")
+    assert directory.refresh()
+    assert "alice" == directory.get_name("alice@test.com")
+    assert 2 == len(directory.tips)
+
+def test_directory_is_stored(contributor_repo):
+    ContributorDirectory.obtain()
+    assert Path(contributor_repo.git_dir).joinpath("git-issue", ContributorDirectory.FILE_NAME).exists()
+
+    directory = ContributorDirectory(contributor_repo)
+    directory.load()
+    assert [contributor_repo.head.commit.hexsha] == directory.tips
+    assert "liam" == directory.get_name("liam@test.com")
+
+    # Nothing needs reading while HEAD hasn't moved
+    assert not directory.refresh()
+
+def test_current_user_is_cached(contributor_repo, monkeypatch):
+    with contributor_repo.config_writer() as writer:
+        writer.set_value("user", "name", "liam")
+        writer.set_value("user", "email", "liam@test.com")
+
+    assert GitUser("liam", "liam@test.com") == GitUser()
+
+    # The config isn't read again while it's unchanged
+    with monkeypatch.context() as m:
+        m.setattr(git.Repo, "config_reader", lambda *args: pytest.fail("config was read again"))
+        assert "liam" == GitUser().user
+
+    with contributor_repo.config_writer() as writer:
+        writer.set_value("user", "email", "bob@test.com")
+    os.utime(Path(contributor_repo.git_dir).joinpath("config"), ns=(0, 0))
+
+    assert "bob@test.com" == GitUser().email
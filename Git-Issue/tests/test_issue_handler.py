@@ -77,22 +77,6 @@ def create_tmp_file(dir, issue):
 
     return new_dir
 
-@pytest.fixture
-def test_repo(tmpdir):
-    repo = git.Repo.init(tmpdir.mkdir("test_repo"))
-
-    fake_file_dir = Path(repo.working_dir + "/fake-file.pla")
-    open(fake_file_dir, 'w').close()
-    repo.index.add([str(fake_file_dir)])
-    repo.index.commit("Blah")
-
-    os.chdir(repo.working_dir)
-    gm = GitManager()
-    setattr(gm, "get_choice_from_user", lambda x: True)
-    gm.load_issue_branch()
-
-    return repo
-
 def test_tracker_increment(tracker):
     tracker.increment_issue_count()
     assert tracker.issue_count == 11
@@ -116,14 +100,31 @@ def test_store_issue_has_correct_path(regular_issue, test_repo):
     gm.load_issue_branch()
     assert Path(f"{root}/{regular_issue.id}/issue.json").exists()
 
-def test_get_issue(monkeypatch, tmpdir, regular_issue):
-    dir = create_tmp_file(tmpdir, regular_issue)
+def commit_tmp_files(root, paths):
+    worktree = git.Repo(root)
+    worktree.git.add(*[str(p) for p in paths])
+    worktree.git.commit("-m", "Add test issues")
 
-    monkeypatch.setattr("pathlib.Path.joinpath", lambda x, y: Path(dir))
+def test_get_issue(regular_issue, test_repo):
+    ih = IssueHandler()
+    ih.store_issue(regular_issue, None)
 
     result = handler.get_issue(regular_issue.id)
-    assert regular_issue.id == result.id
+    assert regular_issue == result
+
+def test_get_issue_does_not_load_worktree(regular_issue, test_repo):
+    ih = IssueHandler()
+    ih.store_issue(regular_issue, None)
+    os.chdir(test_repo.working_dir)
+
+    result = handler.get_issue(regular_issue.id)
+
+    assert regular_issue == result
+    assert not Path(f"{test_repo.working_dir}/issue").exists()
 
+def test_get_issue_missing(test_repo):
+    assert handler.get_issue("ISSUE-404") is None
+    assert not handler.does_issue_exist("ISSUE-404")
 
 def test_get_all_issues(monkeypatch, tmpdir, regular_issue, test_repo):
     expected = [regular_issue, Issue("ISSUE-NA")]
@@ -133,6 +134,7 @@ def test_get_all_issues(monkeypatch, tmpdir, regular_issue, test_repo):
     root = f"{test_repo.working_dir}/issue"
     dirs.append(create_tmp_file(root, expected[0]))
     dirs.append(create_tmp_file(root, expected[1]))
+    commit_tmp_files(root, dirs)
     
     print(dirs)
     
@@ -142,4 +144,4 @@ def test_get_all_issues(monkeypatch, tmpdir, regular_issue, test_repo):
     result.sort(key=lambda x: x.id)
     
     assert len(expected) == len(result)
-    assert expected[0].id == result[0].id and expected[1].id == result[1].id
\ No newline at end of file
+    assert expected[0].id == result[0].id and expected[1].id == result[1].id
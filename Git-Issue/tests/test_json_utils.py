@@ -0,0 +1,69 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.joinpath("..")))
+import pytest
+from git_issue.utils.json_utils import JsonConvert, JsonSchema
+from git_issue.issue.issue import Issue
+from git_issue.issue.tracker import Tracker
+from git_issue.comment.comment import Comment
+from git_issue.comment.index import Index, IndexEntry
+from git_issue.gituser import GitUser
+
+
+@pytest.fixture(params=[True, False])
+def fast_backend(request, monkeypatch):
+    monkeypatch.setattr(JsonConvert, "use_fast_backend", request.param and JsonConvert.use_fast_backend)
+    return request.param
+
+@pytest.fixture
+def issue():
+    user = GitUser("liam", "liam@test.com")
+    return Issue(id="ISSUE-1", summary="summary", assignee=user, reporter=user, subscribers=[user])
+
+def test_schema_is_chosen_from_path():
+    assert JsonConvert.get_schema("ISSUE-1/issue.json").cls is Issue
+    assert JsonConvert.get_schema(Path("ISSUE-1/comments/123456.json")).cls is Comment
+    assert JsonConvert.get_schema("ISSUE-1\\index.json").cls is Index
+    assert JsonConvert.get_schema("tracker.json").cls is Tracker
+    assert JsonConvert.get_schema("ISSUE-1/other.json") is None
+    assert JsonConvert.get_schema(None) is None
+
+def test_decode_with_schema(issue, fast_backend):
+    decoded = JsonConvert.FromJSON(JsonConvert.ToJSON(issue), "ISSUE-1/issue.json")
+
+    # uuids are 128 bit, so must never be parsed by a backend that would turn them into floats
+    assert issue == decoded and type(decoded.uuid) is int
+    assert type(decoded.assignee) is GitUser and [GitUser] == [type(s) for s in decoded.subscribers]
+
+def test_schema_matches_class_mapper(fast_backend):
+    index = Index([IndexEntry("ISSUE-1/comments/1.json", "2018-02-25T22:33:56"),
+                   IndexEntry("ISSUE-1/comments/2.json", "2018-02-25T22:40:00")])
+    tracker = Tracker(1, [])
+    tracker.track_or_update_uuid(2 ** 100, "ISSUE-1")
+    comment = Comment("a comment", GitUser("liam", "liam@test.com"))
+
+    for obj, path in [(index, "ISSUE-1/index.json"), (tracker, "tracker.json"), (comment, "ISSUE-1/comments/1.json")]:
+        json = JsonConvert.ToJSON(obj)
+        decoded = JsonConvert.FromJSON(json, path)
+
+        assert type(obj) is type(decoded)
+        assert JsonConvert.ToJSON(JsonConvert.FromJSON(json)) == JsonConvert.ToJSON(decoded) == json
+
+def test_file_not_matching_schema_falls_back(issue):
+    json = JsonConvert.ToJSON(issue)
+
+    # e.g. an issue written where a comment is expected
+    assert issue == JsonConvert.FromJSON(json, "ISSUE-1/comments/1.json")
+
+def test_register_schema(monkeypatch):
+    class Thing(object):
+        def __init__(self, value=None, user=None):
+            self.value = value
+            self.user = user
+
+    monkeypatch.setattr(JsonConvert, "file_schemas", [])
+    JsonConvert.register_schema("things/*.json", JsonSchema(Thing, {"user": JsonSchema(GitUser)}))
+
+    thing = JsonConvert.FromJSON('{"value": 1, "user": {"user": "liam", "email": "liam@test.com"}}', "a/things/1.json")
+    assert 1 == thing.value and GitUser("liam", "liam@test.com") == thing.user
@@ -12,7 +12,8 @@ from git_issue.comment.handler import CommentHandler
 from git_issue.comment.index import Index, IndexEntry
 from git_issue.git_manager import GitManager
 from git_issue.git_utils.merge_utils import CreateConflictResolver, CreateResolutionTool, ConflictInfo, ConflictType, GitMerge, \
-    CommentIndexConflictResolver, CommentIndexResolutionTool, DivergenceConflictResolver, DivergenceResolutionTool
+    CommentIndexConflictResolver, CommentIndexResolutionTool, DivergenceConflictResolver, DivergenceResolutionTool, \
+    IssueSnapshot
 from git_issue.issue.tracker import UUIDTrack, Tracker
 from git_issue.utils.json_utils import JsonConvert
 from git_issue.git_utils.sync_utils import GitSynchronizer
@@ -375,3 +376,67 @@ def test_unmerged_conflicts(issue_1: Issue, issue_2: Issue, issue_3: Issue, firs
     expected = [ConflictInfo("ISSUE-10/issue.json", [issue_1, issue_1_second_repo, issue_1_first_repo])]
     assert expected == result
     GitSynchronizer().merge(GitMerge(second_repo))
+
+@pytest.fixture
+def conflicted_repo(tmpdir):
+    repo = git.Repo.init(tmpdir.mkdir("conflicted_repo"))
+    repo.index.commit("Blah")
+    repo.git.branch("theirs")
+
+    def write_issues(summary):
+        for i in range(1, 6):
+            path = Path(repo.working_dir).joinpath(f"ISSUE-{i}/issue.json")
+            path.parent.mkdir(exist_ok=True)
+            path.write_text(JsonConvert.ToJSON(Issue(id=f"ISSUE-{i}", summary=summary)))
+            repo.git.add(str(path))
+        repo.git.commit("-m", summary)
+
+    write_issues("ours")
+    repo.git.checkout("theirs")
+    write_issues("theirs")
+    repo.git.checkout("-")
+
+    with pytest.raises(git.GitCommandError):
+        repo.git.merge("theirs")
+
+    return repo
+
+def test_parse_unmerged_conflicts_in_bulk(conflicted_repo):
+    merger = GitMerge(conflicted_repo)
+    result = merger.parse_unmerged_conflicts()
+
+    assert 5 == len(result)
+    assert all(ConflictType.CREATE is conflict.type for conflict in result)
+    assert all(["ours", "theirs"] == [issue.summary for issue in conflict.conflicts] for conflict in result)
+    assert ["index", "read", "decode", "classify"] == list(merger.timings.keys())
+
+def test_snapshot_from_index(conflicted_repo):
+    clean = Issue(id="ISSUE-9", summary="clean")
+    path = Path(conflicted_repo.working_dir).joinpath("ISSUE-9/issue.json")
+    path.parent.mkdir()
+    path.write_text(JsonConvert.ToJSON(clean))
+    conflicted_repo.git.add(str(path))
+
+    snapshot = IssueSnapshot.from_index(conflicted_repo)
+
+    assert {f"ISSUE-{i}" for i in [1, 2, 3, 4, 5, 9]} == snapshot.ids
+    assert clean == snapshot.get_issue("ISSUE-9")
+    assert snapshot.get_issue("ISSUE-1") is None
+    assert snapshot.get_issue("ISSUE-6") is None
+
+def test_create_resolver_uses_snapshot(monkeypatch):
+    existing = Issue(id="ISSUE-10", summary="existing", date="2018-02-25T22:33:52.00000")
+    first = Issue(id="ISSUE-9", summary="first", date="2018-02-25T22:33:50.00000")
+    second = Issue(id="ISSUE-9", summary="second", date="2018-02-25T22:33:51.00000")
+
+    # The worktree must never be loaded to look up an ID
+    monkeypatch.setattr(GitManager, "load_issue_branch", lambda self: pytest.fail("worktree loaded"))
+
+    resolver = CreateConflictResolver()
+    resolver.conflicts = [ConflictInfo("ISSUE-9/issue.json", [first, second])]
+    resolver.tracker = Tracker()
+    resolver.snapshot = IssueSnapshot({"ISSUE-9", "ISSUE-10"}, lambda id: existing if id == "ISSUE-10" else None)
+    resolution = resolver.generate_resolution()
+
+    assert [("first", "ISSUE-9"), ("second", "ISSUE-10"), ("existing", "ISSUE-11")] == \
+        [(issue.summary, issue.id) for issue in resolution.resolved_issues]
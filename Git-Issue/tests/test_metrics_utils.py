@@ -0,0 +1,58 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.joinpath("..")))
+import pytest
+from git_issue.issue.handler import IssueHandler
+import git_issue.issue.handler as handler
+from git_issue.issue.issue import Issue
+from git_issue.utils.metrics_utils import Metrics
+from git_issue.utils.trace_utils import Tracer
+
+
+@pytest.fixture
+def metrics():
+    metrics = Metrics(buckets=(0.1, 1.0)).install()
+    yield metrics
+    metrics.uninstall()
+
+
+def test_histogram_exposition(metrics):
+    metrics.observe("request_seconds", 0.05, route="/issues")
+    metrics.observe("request_seconds", 0.5, route="/issues")
+    metrics.observe("request_seconds", 5, route="/issues")
+
+    lines = metrics.to_prometheus().splitlines()
+
+    assert 'request_seconds_bucket{route="/issues",le="0.1"} 1' in lines
+    assert 'request_seconds_bucket{route="/issues",le="1"} 2' in lines
+    assert 'request_seconds_bucket{route="/issues",le="+Inf"} 3' in lines
+    assert 'request_seconds_count{route="/issues"} 3' in lines
+    assert 'request_seconds_sum{route="/issues"} 5.55' in lines
+
+def test_labels_escaped(metrics):
+    metrics.increment("errors_total", reason='a "quoted"\nreason')
+
+    assert 'errors_total{reason="a \\"quoted\\"\\nreason"} 1' in metrics.to_prometheus().splitlines()
+
+def test_spans_observed(unloaded_repo, metrics):
+    IssueHandler().store_issue(Issue(summary="summary"), "create", generate_id=True, store_tracker=True)
+    handler.get_issue("ISSUE-1")
+    handler.get_issue("ISSUE-1")
+
+    output = metrics.to_prometheus()
+
+    assert "# TYPE git_issue_workflow_phase_seconds histogram" in output
+    assert 'git_issue_workflow_phase_seconds_count{phase="tree workflow"} 1' in output
+    assert 'git_issue_git_command_seconds_count{command="git update-ref"} 1' in output
+    assert 'git_issue_handler_seconds_count{operation="get issue"} 2' in output
+    assert 'git_issue_lock_wait_seconds_count{lock="secondary_index"}' in output
+    assert "git_issue_tree_cache_hit_ratio " in output
+
+def test_nothing_observed_once_uninstalled(unloaded_repo, metrics):
+    metrics.uninstall()
+
+    with Tracer.span("action"):
+        pass
+
+    assert "git_issue_workflow_phase_seconds_count" not in metrics.to_prometheus()
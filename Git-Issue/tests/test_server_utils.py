@@ -0,0 +1,148 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.joinpath("..")))
+import pytest
+import git
+import io
+import os
+import socket
+import threading
+import git_issue.gitissue as gitissue
+import git_issue.issue.handler as handler
+from git_issue.git_utils.server_utils import IssueClient, IssueServer, find_common_dir, get_socket_path
+from git_issue.issue.handler import IssueHandler
+from git_issue.issue.issue import Issue
+
+
+@pytest.fixture
+def server(unloaded_repo):
+    server = IssueServer(lambda argv: gitissue.run(gitissue.parser.parse_args(argv)), unloaded_repo.working_dir).start()
+    thread = threading.Thread(target=server.serve, daemon=True)
+    thread.start()
+
+    yield server
+
+    IssueClient(server.socket_path).stop()
+    thread.join(10)
+
+def bind_stale_socket():
+    """ Leaves a socket behind as a server that's no longer running would. """
+    socket_path = get_socket_path(find_common_dir())
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(socket_path))
+    stale.close()
+
+
+def test_commands_run_by_server(server, capsys):
+    IssueHandler().store_issue(Issue(summary="served summary"), "create", generate_id=True, store_tracker=True)
+    client = IssueClient.find()
+
+    assert client is not None
+    assert client.run(["show", "-i", "ISSUE-1"]) == 0
+    assert "served summary" in capsys.readouterr().out
+    assert server.commands_run == 1
+
+def test_answers_piped_in(server, capsys):
+    IssueHandler().store_issue(Issue(summary="summary"), "create", generate_id=True, store_tracker=True)
+
+    assert IssueClient.find().run(["create", "--summary", "piped summary"], "Y\n") == 0
+
+    assert "ID of newly created issue: ISSUE-2" in capsys.readouterr().out
+    assert handler.get_issue("ISSUE-2").summary == "piped summary"
+
+def test_answers_piped_in_without_server(unloaded_repo, monkeypatch, capsys):
+    IssueHandler().store_issue(Issue(summary="summary"), "create", generate_id=True, store_tracker=True)
+    monkeypatch.setattr("sys.stdin", io.StringIO("Y\n"))
+
+    gitissue.main(["create", "--summary", "piped summary"])
+
+    assert "ID of newly created issue: ISSUE-2" in capsys.readouterr().out
+    assert handler.get_issue("ISSUE-2").summary == "piped summary"
+
+def test_answers_kept_when_socket_stale(unloaded_repo, monkeypatch, capsys):
+    IssueHandler().store_issue(Issue(summary="summary"), "create", generate_id=True, store_tracker=True)
+    monkeypatch.setattr("sys.stdin", io.StringIO("Y\n"))
+    bind_stale_socket()
+
+    gitissue.main(["create", "--summary", "piped summary"])
+
+    assert "ID of newly created issue: ISSUE-2" in capsys.readouterr().out
+    assert handler.get_issue("ISSUE-2").summary == "piped summary"
+
+def test_exit_status_returned(server, capsys):
+    assert IssueClient.find().run(["show", "--unknown"]) == 2
+    assert "unrecognized arguments: --unknown" in capsys.readouterr().err
+
+def test_stopped_server_removes_socket(unloaded_repo):
+    server = IssueServer(lambda argv: None, unloaded_repo.working_dir).start()
+    thread = threading.Thread(target=server.serve, daemon=True)
+    thread.start()
+
+    assert IssueClient.find().stop()
+    thread.join(10)
+
+    assert not thread.is_alive()
+    assert not server.socket_path.exists()
+    assert IssueClient.find() is None
+
+def test_stale_socket_falls_back(unloaded_repo):
+    bind_stale_socket()
+
+    assert IssueClient.find().run(["list"]) is None
+
+    # A new server takes its place
+    server = IssueServer(lambda argv: print("served"), unloaded_repo.working_dir).start()
+    thread = threading.Thread(target=server.serve, daemon=True)
+    thread.start()
+
+    try:
+        assert IssueClient.find().request({"argv": ["list"]})["stdout"] == "served\n"
+    finally:
+        IssueClient(server.socket_path).stop()
+        thread.join(10)
+
+def test_command_not_run_again_when_server_stops(unloaded_repo, monkeypatch, capsys):
+    IssueHandler().store_issue(Issue(summary="summary"), "create", generate_id=True, store_tracker=True)
+    monkeypatch.setattr("sys.stdin", io.StringIO("Y\n"))
+
+    # A server that dies once it has been sent a command, which it may or may not have run
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(str(get_socket_path(find_common_dir())))
+    listener.listen()
+
+    def die():
+        connection, _ = listener.accept()
+        connection.recv(65536)
+        connection.close()
+
+    thread = threading.Thread(target=die, daemon=True)
+    thread.start()
+
+    try:
+        with pytest.raises(SystemExit) as e:
+            gitissue.main(["create", "--summary", "piped summary"])
+    finally:
+        thread.join(10)
+        listener.close()
+
+    assert 1 == e.value.code
+    assert "stopped answering" in capsys.readouterr().err
+    assert handler.get_issue("ISSUE-2") is None
+
+def test_prompting_commands_not_handed_over(tmpdir):
+    repo = git.Repo.init(tmpdir.mkdir("no_issue_branch"))
+    os.chdir(repo.working_dir)
+    server = IssueServer(lambda argv: None, repo.working_dir).start()
+
+    try:
+        # Creating the issue branch asks for confirmation, which the server can't
+        assert server.socket_path.exists()
+        assert IssueClient.find() is None
+    finally:
+        server.close()
+
+def test_server_found_from_issue_worktree(test_repo):
+    assert find_common_dir(Path(test_repo.working_dir).joinpath("issue")) == Path(test_repo.git_dir).resolve()
@@ -0,0 +1,214 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.joinpath("..")))
+import pytest
+import git
+import os
+import git_issue.issue.handler as handler
+from git_issue.git_manager import GitManager, RepoHandler
+from git_issue.git_utils.daemon_utils import SyncDaemon
+from git_issue.git_utils.tree_utils import IssueTree
+from git_issue.issue.handler import IssueHandler
+from git_issue.issue.issue import Issue
+
+
+@pytest.fixture
+def origin(tmpdir):
+    origin = git.Repo.init(tmpdir.mkdir("origin"), bare=True)
+
+    seed = git.Repo.init(tmpdir.mkdir("seed"))
+    open(Path(seed.working_dir).joinpath("fake-file.pla"), 'w').close()
+    seed.index.add(["fake-file.pla"])
+    seed.index.commit("Blah")
+    seed.git.push(origin.git_dir, "HEAD:refs/heads/master")
+
+    os.chdir(str(tmpdir))
+    return origin
+
+def clone(origin, tmpdir, name):
+    return git.Repo.clone_from(origin.git_dir, str(tmpdir.join(name)))
+
+def create_issue(repo, summary):
+    with RepoHandler.using_root(repo.working_dir):
+        return IssueHandler().store_issue(Issue(summary=summary), "create", generate_id=True, store_tracker=True)
+
+def get_summaries(repo):
+    with RepoHandler.using_root(repo.working_dir):
+        return sorted((issue.id, issue.summary) for issue in handler.get_all_issues())
+
+def step(repo, daemon, now=0):
+    with RepoHandler.using_root(repo.working_dir):
+        daemon.step(now)
+
+def test_push_is_debounced(origin, tmpdir):
+    repo = clone(origin, tmpdir, "first")
+    daemon = SyncDaemon(repo, fetch_interval=60, push_delay=5, max_push_delay=20)
+
+    create_issue(repo, "first")
+    step(repo, daemon, 0)
+    create_issue(repo, "second")
+    step(repo, daemon, 3)
+
+    assert 0 == daemon.metrics.pushes
+    assert 2 == daemon.metrics.ahead
+    assert 3 == daemon.metrics.push_lag
+
+    step(repo, daemon, 8)
+
+    assert 1 == daemon.metrics.pushes
+    assert 0 == daemon.metrics.ahead
+    assert repo.commit(GitManager.ISSUE_BRANCH) == origin.commit(GitManager.ISSUE_BRANCH)
+
+def test_pushed_once_without_tracking_branch(origin, tmpdir):
+    # A single branch clone's remote tracking refs aren't moved by a push of the issue branch
+    repo = git.Repo.clone_from(origin.git_dir, str(tmpdir.join("first")), single_branch=True, branch="master")
+    daemon = SyncDaemon(repo, fetch_interval=60, push_delay=0)
+
+    create_issue(repo, "first")
+    for now in [0, 1, 2]:
+        step(repo, daemon, now)
+
+    assert 1 == daemon.metrics.pushes
+    assert 0 == daemon.metrics.ahead
+    assert repo.commit(GitManager.ISSUE_BRANCH) == repo.commit(daemon.remote_ref)
+
+def test_steady_commits_pushed_by_max_delay(origin, tmpdir):
+    repo = clone(origin, tmpdir, "first")
+    daemon = SyncDaemon(repo, fetch_interval=60, push_delay=5, max_push_delay=10)
+
+    for now in [0, 4, 8, 12]:
+        create_issue(repo, f"at {now}")
+        step(repo, daemon, now)
+
+    assert 1 == daemon.metrics.pushes
+
+def test_behind_fast_forwards(origin, tmpdir):
+    first = clone(origin, tmpdir, "first")
+    second = clone(origin, tmpdir, "second")
+    first_daemon = SyncDaemon(first, push_delay=0)
+    second_daemon = SyncDaemon(second, push_delay=0)
+
+    create_issue(first, "first")
+    step(first, first_daemon)
+    step(second, second_daemon)
+
+    create_issue(first, "second")
+    step(first, first_daemon)
+    step(second, second_daemon, 60)
+
+    assert 2 == second_daemon.metrics.fast_forwards
+    assert 0 == second_daemon.metrics.merges
+    assert 0 == second_daemon.metrics.pushes
+    assert get_summaries(first) == get_summaries(second)
+
+def test_divergence_merged_and_pushed(origin, tmpdir, monkeypatch):
+    monkeypatch.setattr("builtins.input", lambda x: 'Y')
+    first = clone(origin, tmpdir, "first")
+    second = clone(origin, tmpdir, "second")
+    first_daemon = SyncDaemon(first, push_delay=0)
+    second_daemon = SyncDaemon(second, push_delay=0)
+
+    create_issue(first, "shared")
+    step(first, first_daemon)
+    step(second, second_daemon)
+
+    # Both create the next issue, so both take the same ID
+    create_issue(first, "first")
+    create_issue(second, "second")
+    step(first, first_daemon, 60)
+    step(second, second_daemon, 60)
+
+    assert 1 == second_daemon.metrics.merges
+    assert 1 == second_daemon.metrics.pushes
+
+    step(first, first_daemon, 120)
+
+    assert 1 == first_daemon.metrics.fast_forwards
+    assert get_summaries(first) == get_summaries(second)
+    assert ["first", "second", "shared"] == sorted(summary for id, summary in get_summaries(first))
+    assert 3 == len(set(id for id, summary in get_summaries(first)))
+
+def edit_summary(repo, id, summary):
+    with RepoHandler.using_root(repo.working_dir):
+        issue = handler.get_issue(id)
+        issue.summary = summary
+        IssueHandler().store_issue(issue, "edit")
+
+def test_manual_conflict_pauses_syncing(origin, tmpdir):
+    first = clone(origin, tmpdir, "first")
+    second = clone(origin, tmpdir, "second")
+    first_daemon = SyncDaemon(first, push_delay=0)
+    second_daemon = SyncDaemon(second, push_delay=0)
+
+    create_issue(first, "shared")
+    step(first, first_daemon)
+    step(second, second_daemon)
+
+    # Both edit the same field of the same issue, which only a person can resolve
+    edit_summary(first, "ISSUE-1", "first's")
+    edit_summary(second, "ISSUE-1", "second's")
+    step(first, first_daemon, 60)
+    pushed = origin.commit(GitManager.ISSUE_BRANCH)
+    step(second, second_daemon, 60)
+
+    assert second_daemon.conflicted
+    assert 1 == second_daemon.metrics.conflicts
+    assert 0 == second_daemon.metrics.merges
+    assert 0 == second_daemon.metrics.pushes
+    assert pushed == origin.commit(GitManager.ISSUE_BRANCH)
+
+    # Nothing is fetched or pushed while the merge is waiting to be resolved
+    fetches = second_daemon.metrics.fetches
+    step(second, second_daemon, 120)
+
+    assert second_daemon.conflicted
+    assert fetches == second_daemon.metrics.fetches
+    assert 0 == second_daemon.metrics.failures
+
+    worktree = git.Repo(Path(second.working_dir).joinpath(GitManager.ISSUE_BRANCH))
+    worktree.git.checkout("--theirs", "ISSUE-1/issue.json")
+    worktree.git.add("ISSUE-1/issue.json")
+    worktree.git.commit("--no-edit")
+    step(second, second_daemon, 180)
+
+    assert not second_daemon.conflicted
+    assert 1 == second_daemon.metrics.pushes
+    assert second.commit(GitManager.ISSUE_BRANCH) == origin.commit(GitManager.ISSUE_BRANCH)
+    assert [("ISSUE-1", "first's")] == get_summaries(second)
+
+def missing_blobs(repo):
+    listing = repo.git.rev_list("--objects", "--no-walk", "--missing=print", GitManager.ISSUE_BRANCH)
+    return [line for line in listing.splitlines() if line.startswith("?")]
+
+def test_only_issue_branch_fetched(origin, tmpdir):
+    first = clone(origin, tmpdir, "first")
+    create_issue(first, "first")
+    step(first, SyncDaemon(first, push_delay=0))
+
+    second = git.Repo.init(str(tmpdir.join("second")))
+    second.create_remote("origin", origin.git_dir)
+    step(second, SyncDaemon(second, push_delay=0))
+
+    assert ["origin/issue"] == [ref.name for ref in second.remotes.origin.refs]
+    assert get_summaries(first) == get_summaries(second)
+
+def test_partial_fetch_reads_blobs_lazily(origin, tmpdir):
+    origin.git.config("uploadpack.allowFilter", "true")
+    first = clone(origin, tmpdir, "first")
+    for i in range(3):
+        create_issue(first, f"issue {i}")
+    step(first, SyncDaemon(first, push_delay=0))
+
+    second = git.Repo.init(str(tmpdir.join("second")))
+    second.create_remote("origin", origin.git_dir)
+    step(second, SyncDaemon(second, push_delay=0, partial=True))
+
+    assert 4 == len(missing_blobs(second))
+
+    IssueTree(second).prefetch(["ISSUE-1/issue.json", "ISSUE-2/issue.json"])
+    assert 2 == len(missing_blobs(second))
+
+    assert get_summaries(first) == get_summaries(second)
+    # Only the tracker is left, as reading every issue fetched their blobs together
+    assert 1 == len(missing_blobs(second))
@@ -0,0 +1,78 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.joinpath("..")))
+import pytest
+import json
+from git_issue.git_manager import GitManager
+from git_issue.issue.handler import IssueHandler
+from git_issue.issue.issue import Issue
+from git_issue.utils.trace_utils import Tracer, format_profile, write_chrome_trace
+
+
+@pytest.fixture
+def recording():
+    Tracer.start_recording()
+    yield
+    Tracer.stop_recording()
+
+
+def test_no_spans_while_inactive():
+    with Tracer.span("outer") as span:
+        span.args["ignored"] = True
+
+    assert Tracer.span("outer").args == {}
+    assert Tracer.stop_recording() == []
+
+def test_spans_nest(recording):
+    with Tracer.span("outer"):
+        with Tracer.span("inner", "json"):
+            pass
+        with Tracer.span("inner", "json"):
+            pass
+
+    spans = Tracer.stop_recording()
+    outer = [s for s in spans if s.name == "outer"][0]
+
+    assert [s.get_path() for s in spans] == [("outer", "inner"), ("outer", "inner"), ("outer",)]
+    assert all(s.parent is outer for s in spans if s.name == "inner")
+    assert "   2    inner" in format_profile(spans)
+
+def test_listener_sees_spans():
+    seen = []
+    listener = lambda span: seen.append(span.name)
+    Tracer.add_listener(listener)
+
+    try:
+        with Tracer.span("phase"):
+            pass
+    finally:
+        Tracer.remove_listener(listener)
+
+    with Tracer.span("after"):
+        pass
+
+    assert seen == ["phase"]
+
+def test_git_commands_traced(unloaded_repo, recording):
+    issue = Issue(summary="summary")
+    GitManager().perform_tree_workflow(lambda writer: writer.write_json("ISSUE-1/issue.json", issue),
+                                       "create", "ISSUE-1")
+
+    names = {span.get_path() for span in Tracer.stop_recording()}
+
+    assert ("tree workflow", "commit", "git commit-tree") in names
+    assert ("tree workflow", "commit", "git update-ref") in names
+    assert ("tree workflow", "action", "json write") in names
+
+def test_chrome_trace_written(unloaded_repo, recording, tmpdir):
+    IssueHandler().store_issue(Issue(summary="summary"), "create", generate_id=True, store_tracker=True)
+
+    spans = Tracer.stop_recording()
+    path = tmpdir.join("trace.json")
+    write_chrome_trace(spans, str(path))
+
+    events = json.loads(path.read())["traceEvents"]
+    assert len(events) == len(spans)
+    assert all(e["ph"] == "X" and e["dur"] >= 0 for e in events)
+    assert any(e["cat"] == "git" and e["name"] == "git update-ref" for e in events)
@@ -0,0 +1,51 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.joinpath("..")))
+from git_issue.issue.tracker import Tracker, UUIDTrack
+from git_issue.utils.json_utils import JsonConvert
+
+
+def test_track_and_look_up():
+    tracker = Tracker()
+    tracker.track_or_update_uuid(1, "ISSUE-1")
+    tracker.track_or_update_uuid(2, "ISSUE-2")
+
+    assert 2 == tracker.issue_count
+    assert "ISSUE-2" == tracker.get_issue_from_uuid(2)
+    assert 1 == tracker.get_uuid_from_issue("ISSUE-1")
+    assert tracker.get_issue_from_uuid(3) is None
+    assert tracker.get_uuid_from_issue("ISSUE-3") is None
+
+def test_update_uuid():
+    tracker = Tracker()
+    tracker.track_or_update_uuid(1, "ISSUE-1")
+    tracker.track_or_update_uuid(1, "ISSUE-5")
+
+    assert 1 == tracker.issue_count
+    assert [UUIDTrack(1, "ISSUE-5")] == tracker.tracked_uuids
+    assert "ISSUE-5" == tracker.get_issue_from_uuid(1)
+    assert 1 == tracker.get_uuid_from_issue("ISSUE-5")
+    assert tracker.get_uuid_from_issue("ISSUE-1") is None
+
+def test_look_ups_follow_changes_to_the_list():
+    tracker = Tracker(1, [UUIDTrack(1, "ISSUE-1")])
+    assert "ISSUE-1" == tracker.get_issue_from_uuid(1)
+
+    tracker.tracked_uuids.append(UUIDTrack(2, "ISSUE-2"))
+    assert "ISSUE-2" == tracker.get_issue_from_uuid(2)
+
+    # A copy of the tracker shares its UUIDTracks
+    copy = Tracker(tracker.issue_count, tracker.tracked_uuids.copy())
+    copy.track_or_update_uuid(1, "ISSUE-3")
+    assert tracker.get_uuid_from_issue("ISSUE-1") is None
+    assert 1 == tracker.get_uuid_from_issue("ISSUE-3")
+
+def test_look_ups_are_not_stored():
+    tracker = Tracker()
+    tracker.track_or_update_uuid(1, "ISSUE-1")
+
+    json = JsonConvert.ToJSON(tracker)
+    assert "_by_uuid" not in json and "_lookup" not in json
+    assert tracker == JsonConvert.FromJSON(json)
+    assert 1 == JsonConvert.FromJSON(json).get_uuid_from_issue("ISSUE-1")
@@ -0,0 +1,79 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.joinpath("..")))
+sys.path.append(str(Path(__file__).parent.joinpath("..", "..", "issue_web_gui")))
+import pytest
+from git_issue.git_manager import GitManager, RepoHandler
+from git_issue.git_utils.tree_utils import IssueTree, IssueTreeWriter
+from git_issue.utils.trace_utils import Tracer
+
+
+@pytest.fixture
+def WriteQueue(monkeypatch):
+    """ The queue is part of the web app, whose package can't be imported without its dependencies (e.g. Flask).
+        Importing the app sets up its own root, writer and metrics for the whole process, which are put back
+        once the test is done. """
+    monkeypatch.setattr(RepoHandler, "default_root", RepoHandler.default_root)
+    monkeypatch.setattr(GitManager, "tree_writer", GitManager.tree_writer)
+    monkeypatch.setattr(GitManager, "tree_writes_only", GitManager.tree_writes_only)
+    monkeypatch.setattr(Tracer, "_listeners", Tracer._listeners)
+
+    return pytest.importorskip("issue_web_gui.write_queue").WriteQueue
+
+def write_file(path, text):
+    return lambda writer: writer.write(path, text) or text
+
+def test_queued_writes_share_a_commit(unloaded_repo, WriteQueue):
+    queue = WriteQueue(unloaded_repo.working_dir)
+    head = unloaded_repo.commit("issue").hexsha
+
+    # Nothing is taken until the writer starts, so all three are waiting for it at once
+    futures = [queue.submit(write_file(f"file-{i}.txt", f"text {i}"), "create", f"ISSUE-{i}") for i in range(3)]
+    queue.start()
+
+    assert [("text 0", None), ("text 1", None), ("text 2", None)] == [future.result(10) for future in futures]
+    assert 1 == queue.commit_count
+    assert [head] == [parent.hexsha for parent in unloaded_repo.commit("issue").parents]
+    assert all(IssueTree().read(f"file-{i}.txt") == f"text {i}" for i in range(3))
+
+def test_failed_write_only_fails_its_own_caller(unloaded_repo, WriteQueue):
+    queue = WriteQueue(unloaded_repo.working_dir)
+
+    def fail(writer):
+        writer.write("failed.txt", "never committed")
+        raise ValueError("failed")
+
+    first = queue.submit(write_file("first.txt", "first"), "create", "ISSUE-1")
+    failed = queue.submit(fail, "create", "ISSUE-2")
+    last = queue.submit(write_file("last.txt", "last"), "create", "ISSUE-3")
+    queue.start()
+
+    with pytest.raises(ValueError):
+        failed.result(10)
+
+    assert "first" == first.result(10)[0]
+    assert "last" == last.result(10)[0]
+    assert 1 == queue.commit_count
+    assert IssueTree().read("failed.txt") is None
+    assert "first" == IssueTree().read("first.txt") and "last" == IssueTree().read("last.txt")
+
+def test_group_retried_when_branch_moves(unloaded_repo, WriteQueue):
+    queue = WriteQueue(unloaded_repo.working_dir).start()
+    runs = []
+
+    def action(writer):
+        # Another writer (e.g. the CLI) moves the branch on while the first attempt is running
+        if len(runs) == 0:
+            other = IssueTreeWriter()
+            other.write("other.txt", "other")
+            other.commit_changes("Moves the branch")
+
+        runs.append(writer)
+        writer.write("mine.txt", "mine")
+
+    queue.perform(action, "create", "ISSUE-1")
+
+    assert 2 == len(runs)
+    assert "other" == IssueTree().read("other.txt")
+    assert "mine" == IssueTree().read("mine.txt")
@@ -2,11 +2,37 @@
 The flask application package.
 """
 
+import os
+
 from flask import Flask, url_for
+from git_issue.git_manager import GitManager, RepoHandler
 from issue_web_gui.api import bp
+from issue_web_gui.write_queue import WriteQueue
+
+# Requests are served by many threads at once, so every one of them works against the repository the app was
+# started in rather than the process's current directory. Issues are read and written through GIT's object
+# database, so no request needs the issue worktree
+RepoHandler.set_root(os.environ.get("GIT_ISSUE_REPO", os.getcwd()))
+
+# Writes never go through the issue worktree either, even one the CLI has kept loaded, as only the tree workflow is
+# serialised by the write queue and protected against the branch moving underneath it
+GitManager.tree_writes_only = True
+
+# Writes are committed one group at a time by a single writer, so concurrent requests share commits instead of
+# racing each other to move the issue branch
+write_queue = WriteQueue(RepoHandler.get_root()).install()
 
 app = Flask(__name__)
 app.register_blueprint(bp, url_prefix="/api/v1")
 
+
+@app.teardown_request
+def release_repos(error=None):
+    # Each request may be served by a thread of its own, which would otherwise leave its Repo (and the GIT
+    # processes it keeps running) open once it ends
+    RepoHandler.release_repos()
+
+
 import issue_web_gui.views
-import issue_web_gui.api.issue.requests
\ No newline at end of file
+import issue_web_gui.api.issue.requests
+import issue_web_gui.metrics
\ No newline at end of file
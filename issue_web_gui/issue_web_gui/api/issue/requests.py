@@ -4,8 +4,8 @@ Routes and views for the flask application.
 from flask_restplus import Resource
 
 from git_issue.comment.handler import CommentHandler
-from git_issue.git_manager import GitManager
 from git_issue.issue.handler import IssueHandler
+import git_issue.issue.handler as issue_handler
 from issue_web_gui.api import api
 from flask import render_template, request, abort
 from flask_restplus_marshmallow import Schema
@@ -15,6 +15,7 @@ from webargs.flaskparser import use_args
 from werkzeug.exceptions import BadRequest
 
 from http import HTTPStatus
+from pathlib import Path
 import hashlib
 
 from issue_web_gui.api.issue.schemas import comment_list_payload, comment_payload, comment_response_fields
@@ -31,6 +32,17 @@ page_args = {
     'limit': fields.Integer()
 }
 
+search_args = {
+    'q': fields.Str(required=True)
+}
+
+filter_args = {
+    'status': fields.Str(),
+    'assignee': fields.Str(),
+    'reporter': fields.Str(),
+    'subscriber': fields.Str()
+}
+
 
 class IssueList(object):
     def __init__(self, count: int, issues: Issue):
@@ -40,18 +52,27 @@ class IssueList(object):
 @api.route('/issues')
 class IssueListAPI(Resource):
 
-    @use_args(page_args)
+    @use_args({**page_args, **filter_args})
     @api.doc(description="Retrieves a range of issues based on the given parameters.")
     @api.param('page', 'The page to retrieve. The start position of a page is page * limit.'\
             'Default page is 1.')
-    @api.param('limit', 'The amount of comments per page. Default limit of comments is 10.')
+    @api.param('limit', 'The amount of issues per page. Default limit of issues is 10.')
+    @api.param('status', 'Only retrieves issues with the given status.')
+    @api.param('assignee', 'Only retrieves issues assigned to the given email.')
+    @api.param('reporter', 'Only retrieves issues reported by the given email.')
+    @api.param('subscriber', 'Only retrieves issues the given email is subscribed to.')
     @api.response(200, 'Success', issue_list_payload)
     def get(self, args):
         page = args.get("page", 1)
-        limit = 1000 # args.get("limit", 1000)
+        limit = args.get("limit", 10)
+        filters = [args.get(f) for f in filter_args.keys()]
 
         handler = IssueHandler()
-        issues, count = handler.get_issue_range(page, limit)
+        if any(f is not None for f in filters):
+            issues, count = handler.find_issue_range(page, limit, *filters)
+        else:
+            issues, count = handler.get_issue_range(page, limit)
+
         response = IssueList(count, issues)
 
         result = to_payload(GitUser(), response, IssueListSchema)
@@ -76,14 +97,35 @@ class IssueListAPI(Resource):
         if issue.assignee is not None and issue.assignee not in issue.subscribers:
             issue.subscribers.append(issue.assignee)
 
-        gm = GitManager()
-        handler = gm.perform_git_workflow(lambda: IssueHandler())
+        handler = IssueHandler()
         created_issue = handler.store_issue(issue, "create", generate_id=True, store_tracker=True)
         result = to_payload(GitUser(), issue, IssueSchema)
 
         return result.data, HTTPStatus.CREATED, {'location': f'issues/${created_issue.id}'}
 
 
+@api.route('/issues/search')
+class IssueSearchAPI(Resource):
+
+    @use_args({**page_args, **search_args})
+    @api.doc(description="Retrieves a range of the issues whose summary, description or comments contain every word "
+                         "of the query, best matches first.")
+    @api.param('q', 'The words to search for. End a word with "*" to match any word starting with it.')
+    @api.param('page', 'The page to retrieve. The start position of a page is page * limit.'\
+            'Default page is 1.')
+    @api.param('limit', 'The amount of issues per page. Default limit of issues is 10.')
+    @api.response(200, 'Success', issue_list_payload)
+    def get(self, args):
+        page = args.get("page", 1)
+        limit = args.get("limit", 10)
+
+        issues, count = IssueHandler().search_issue_range(args["q"], page, limit)
+        response = IssueList(count, issues)
+
+        result = to_payload(GitUser(), response, IssueListSchema)
+        return result.data
+
+
 @api.route('/issues/<string:id>')
 @api.doc(params={'id': 'The issue ID in question'})
 class IssueAPI(Resource):
@@ -91,11 +133,10 @@ class IssueAPI(Resource):
     @api.doc(description="Retrieves a single issue that matches the given ID")
     @api.response(200, 'Success', issue_payload)
     def get(self, id):
-        handler = IssueHandler()
-        if (not handler.does_issue_exist(id)):
+        issue = issue_handler.get_issue(id)
+        if (issue is None):
             abort(HTTPStatus.NOT_FOUND)
 
-        issue = handler.get_issue_from_issue_id(id)
         result = to_payload(GitUser(), issue, IssueSchema)
         return result.data
 
@@ -119,7 +160,7 @@ class IssueAPI(Resource):
         headers = {}
 
         handler = IssueHandler()
-        if (not handler.does_issue_exist(id)):
+        if (not issue_handler.does_issue_exist(id)):
             issue = handler.store_issue(updated_issue, "create", True)
 
             hash = hashlib.sha256(b"{regular_schema.dump(issue).data}").hexdigest()
@@ -128,7 +169,7 @@ class IssueAPI(Resource):
             httpStatus = HTTPStatus.CREATED
 
         else:
-            current_issue = handler.get_issue_from_issue_id(id)
+            current_issue = issue_handler.get_issue(id)
 
             if (updated_issue.id != id):
                 return "Given issue ID does not match url", 416
@@ -151,7 +192,6 @@ class CommentListAPI(Resource):
     @api.param('limit', 'The amount of comments per page. Default limit of comments is 10.')
     @api.response(200, 'Success', comment_list_payload)
     def get(self, args, id):
-        issue_handler = IssueHandler()
         if not issue_handler.does_issue_exist(id):
             raise BadRequest(f"Issue with id {id} does not exist.")
         
@@ -161,12 +201,7 @@ class CommentListAPI(Resource):
         # Each page is limit amount of comments, therefore start_pos
         # is the limit of comments per page, times by the page number
         start_pos = limit * (page - 1)
-        gm = GitManager()
-        def action():
-            path = issue_handler.get_issue_folder_path(id)
-            comment_handler = CommentHandler(path, id)
-            return comment_handler.get_comment_range(limit, start_pos)
-        comments = gm.perform_git_workflow(action)
+        comments = issue_handler.get_comment_range(id, limit, start_pos)
         schema = CommentSchema()
         result = schema.dump(comments, many=True)
 
@@ -176,9 +211,7 @@ class CommentListAPI(Resource):
     @api.param('payload', 'The comment to be added')
     @api.response(201, 'Created', comment_response_fields)
     def post(self, id):
-        ih = IssueHandler()
-
-        if (not ih.does_issue_exist(id)):
+        if (not issue_handler.does_issue_exist(id)):
             raise BadRequest(f"Issue with id {id} does not exist.")
         
         comment = request.get_json().get("comment")
@@ -187,9 +220,7 @@ class CommentListAPI(Resource):
             raise BadRequest(f"No comment given.")
 
         comment = Comment(comment)
-        gm = GitManager()
-        path = gm.perform_git_workflow(lambda: ih.get_issue_folder_path(id))
-        handler = CommentHandler(path, id)
+        handler = CommentHandler(Path(id), id)
         created_comment = handler.add_comment(comment)
         
         schema = CommentSchema()
@@ -0,0 +1,40 @@
+"""
+Serves the app's metrics at /metrics, in Prometheus' text format.
+"""
+
+import time
+
+from flask import Response, g, request
+from git_issue.utils.metrics_utils import Metrics
+from issue_web_gui import app, write_queue
+
+# Every span traced while serving a request (workflow phases, GIT commands, handler calls, lock waits...) is
+# observed, along with how long each route took to answer
+metrics = Metrics().install()
+metrics.describe("git_issue_http_request_seconds", "histogram", "Time taken to answer requests to each route.")
+metrics.add_gauge("git_issue_write_queue_depth", "Writes waiting for the writer.", "gauge", write_queue.get_depth)
+metrics.add_gauge("git_issue_writer_commits_total", "Commits made by the writer.", "counter",
+                  lambda: write_queue.commit_count)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_time(response):
+    start = g.get("request_start")
+
+    if start is not None:
+        # Labelled by the route's rule rather than its URL, so every issue shares the same series
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics.observe("git_issue_http_request_seconds", time.perf_counter() - start, route=route,
+                        method=request.method, status=str(response.status_code))
+
+    return response
+
+
+@app.route('/metrics')
+def serve_metrics():
+    return Response(metrics.to_prometheus(), mimetype="text/plain; version=0.0.4; charset=utf-8")
@@ -14,8 +14,7 @@ from .forms import CreateForm, EditForm
 @app.route('/')
 @app.route('/issue/all')
 def all_issues():
-    issues = handler.get_all_issues()
-    print (issues)
+    issues = handler.get_issue_summaries()
     return render_template(
         'all_issues.html',
         issues=issues
@@ -0,0 +1,160 @@
+"""
+Serialises the app's writes to the issue branch through a single writer thread.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+from git_issue.git_manager import GitManager, RepoHandler
+from git_issue.git_utils.tree_utils import IssueTreeWriter, TreeUpdateConflictError
+from git_issue.utils.trace_utils import Tracer
+
+
+class _Write(object):
+    def __init__(self, action: Callable[[IssueTreeWriter], object], commit_type: str,
+                 commit_id: Callable[[], str] or str):
+        self.action = action
+        self.commit_type = commit_type
+        self.commit_id = commit_id
+        self.future = Future()
+        self.queued = time.perf_counter()
+        self.result = None
+        self.error = None
+
+    def get_id(self) -> str:
+        return self.commit_id() if callable(self.commit_id) else self.commit_id
+
+
+class WriteQueue(object):
+    """ Hands every write to the issue branch to one writer thread, rather than each request committing on its
+        own and racing the others to move the branch.
+
+        The writer takes whatever writes have been queued, runs them one after another against a single
+        IssueTreeWriter and commits them all at once. Writes that arrive while a commit is being made are
+        folded into the next one, so the busier the app is the more writes share each commit. A write that
+        fails is left out of the commit without affecting the others, and every request is handed back the
+        result (or the error) of its own write.
+
+        Once installed, GitManager.perform_tree_workflow submits its actions here, so handlers need no changes
+        to take part. """
+
+    # The most writes folded into one commit, so that a flood of requests still sees commits go through
+    MAX_GROUP_SIZE = 100
+
+    def __init__(self, root=None, window: float = 0.0):
+        """ window is how long the writer waits for more writes after the first arrives. By default it waits
+            for nothing, as whatever queues up during a commit is picked up by the next one anyway. """
+        self.root = root
+        self.window = window
+        self.commit_count = 0
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="issue-writer", daemon=True)
+            self._thread.start()
+
+        return self
+
+    def install(self):
+        """ Starts the writer and routes every worktree-free write of the process through it. """
+        GitManager.tree_writer = self.start()
+        return self
+
+    def is_writer_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def get_depth(self) -> int:
+        """ The number of writes waiting for the writer. """
+        return self._queue.qsize()
+
+    def submit(self, action: Callable[[IssueTreeWriter], object], commit_type: str = None,
+               commit_id: Callable[[], str] or str = None) -> Future:
+        """ Queues an action to be run against the writer, returning a future for the action's result and the
+            commit it went into. The commit is None if nothing was written, or if the commit also holds other
+            writes. """
+        write = _Write(action, commit_type, commit_id)
+        self._queue.put(write)
+        return write.future
+
+    def perform(self, action: Callable[[IssueTreeWriter], object], commit_type: str = None,
+                commit_id: Callable[[], str] or str = None):
+        """ Queues an action and waits for it to be committed. """
+        return self.submit(action, commit_type, commit_id).result()
+
+    def _take_group(self) -> [_Write]:
+        group = [self._queue.get()]
+
+        while len(group) < self.MAX_GROUP_SIZE:
+            try:
+                group.append(self._queue.get(timeout=self.window) if self.window > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return group
+
+    def _run(self):
+        root = self.root if self.root is not None else RepoHandler.get_root()
+
+        with RepoHandler.using_root(root):
+            while True:
+                group = self._take_group()
+
+                taken = time.perf_counter()
+                for write in group:
+                    Tracer.record("wait for writer", "lock", write.queued, taken)
+
+                try:
+                    commit_sha = self._commit_group(group)
+                except Exception as e:
+                    for write in group:
+                        if write.error is None:
+                            write.error = e
+                    commit_sha = None
+
+                for write in group:
+                    if write.error is not None:
+                        write.future.set_exception(write.error)
+                    else:
+                        write.future.set_result((write.result, commit_sha if len(group) == 1 else None))
+
+    def _apply(self, writer: IssueTreeWriter, write: _Write):
+        """ Runs one write, dropping whatever it wrote if it fails. """
+        changes = dict(writer.changes)
+        write.error = None
+
+        try:
+            write.result = write.action(writer)
+        except Exception as e:
+            writer.changes = changes
+            write.error = e
+
+    def _commit_group(self, group: [_Write]) -> str or None:
+        for attempt in range(GitManager.MAX_TREE_WRITE_ATTEMPTS):
+            # Everything is run again should the branch have been moved on by a writer outside the app (e.g.
+            # the CLI), as what each write wrote may depend on what it read
+            writer = IssueTreeWriter(RepoHandler.obtain_repo())
+
+            for write in group:
+                self._apply(writer, write)
+
+            try:
+                commit_sha = writer.commit_changes(self._generate_commit_message(group))
+                self.commit_count += 1 if commit_sha is not None else 0
+                return commit_sha
+            except TreeUpdateConflictError:
+                if attempt == GitManager.MAX_TREE_WRITE_ATTEMPTS - 1:
+                    raise
+
+    @staticmethod
+    def _generate_commit_message(group: [_Write]) -> str:
+        written = [write for write in group if write.error is None]
+
+        if len(written) == 1:
+            return GitManager._generate_commit_message(written[0].commit_type, written[0].get_id())
+
+        return GitManager._generate_commit_message("batch", ", ".join(str(write.get_id()) for write in written))